@@ -0,0 +1,227 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, update, insert, delete, func, event
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import ActivityLog, ActivityRollup, Worker
+from record_cache import invalidate_after_commit
+
+DAY = "day"
+WEEK = "week"
+
+# Raw activity logs older than this are compacted into their rollups.
+DEFAULT_RETENTION_DAYS = 365
+DEFAULT_BATCH_SIZE = 5000
+SUMMARY_WEEKS = 8
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def _as_date(value) -> date:
+    # ActivityLog.date defaults to datetime.utcnow
+    return value.date() if isinstance(value, datetime) else value
+
+
+# Incremental maintenance
+
+def _bump(connection, worker_id, period, period_start, activity_type, minutes, entries):
+    table = ActivityRollup.__table__
+    match = (
+        (table.c.worker_id == worker_id) & (table.c.period == period)
+        & (table.c.period_start == period_start) & (table.c.activity_type == activity_type)
+    )
+    changes = dict(total_minutes=table.c.total_minutes + minutes, entries=table.c.entries + entries)
+    result = connection.execute(update(table).where(match).values(**changes))
+    if entries < 0:
+        connection.execute(delete(table).where(match, table.c.entries <= 0))
+        return
+    if result.rowcount:
+        return
+    try:
+        # Savepoint so losing an insert race does not abort the activity's transaction
+        with connection.begin_nested():
+            connection.execute(insert(table).values(
+                worker_id=worker_id, period=period, period_start=period_start,
+                activity_type=activity_type, total_minutes=minutes, entries=entries
+            ))
+    except IntegrityError:
+        connection.execute(update(table).where(match).values(**changes))
+
+
+def _record(connection, worker_id, day, activity_type, minutes, sign):
+    if worker_id is None or day is None:
+        return
+    day = _as_date(day)
+    activity_type = (activity_type or "")[:100]
+    for period, period_start in ((DAY, day), (WEEK, week_start(day))):
+        _bump(connection, worker_id, period, period_start, activity_type, sign * (minutes or 0), sign)
+
+
+def _stored(connection, log):
+    # Old values come from the row itself (see outbreak._count_changed_positives)
+    table = ActivityLog.__table__
+    return connection.execute(
+        select(table.c.worker_id, table.c.date, table.c.activity_type, table.c.duration_minutes)
+        .where(table.c.id == log.id)
+    ).first()
+
+
+@event.listens_for(ActivityLog, "after_insert")
+def _roll_up_new(mapper, connection, log):
+    _record(connection, log.worker_id, log.date, log.activity_type, log.duration_minutes, 1)
+
+
+@event.listens_for(ActivityLog, "before_update")
+def _roll_up_changed(mapper, connection, log):
+    state = db.inspect(log)
+    if not any(state.attrs[key].history.has_changes() for key in ("worker_id", "date", "activity_type", "duration_minutes")):
+        return
+    stored = _stored(connection, log)
+    if stored is not None:
+        _record(connection, *stored, -1)
+    _record(connection, log.worker_id, log.date, log.activity_type, log.duration_minutes, 1)
+
+
+@event.listens_for(ActivityLog, "before_delete")
+def _roll_up_deleted(mapper, connection, log):
+    stored = _stored(connection, log)
+    if stored is not None:
+        _record(connection, *stored, -1)
+
+
+def merge_rollups(keep_id: int, duplicate_id: int, executor=None):
+    """Adds the duplicate worker's rollups to the kept worker's (see linkage.merge_workers)."""
+    executor = executor or db.session.connection()
+    table = ActivityRollup.__table__
+    rows = executor.execute(select(table).where(table.c.worker_id == duplicate_id)).all()
+    for row in rows:
+        _bump(executor, keep_id, row.period, row.period_start, row.activity_type, row.total_minutes, row.entries)
+    executor.execute(delete(ActivityRollup).where(ActivityRollup.worker_id == duplicate_id))
+
+
+# Bulk jobs
+
+def rebuild_rollups(batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Recomputes the rollups of every period that still has raw logs (after
+    bulk loads that bypass the ORM hooks). Compaction cuts at a week
+    boundary, so periods that only survive as rollups are left alone.
+    Returns the number of rollups written.
+    """
+    oldest = db.session.scalar(select(func.min(ActivityLog.date)))
+    if oldest is None:
+        return 0
+    since = week_start(_as_date(oldest))
+    last_id, written = 0, 0
+    while True:
+        worker_ids = db.session.scalars(
+            select(Worker.id).where(Worker.id > last_id).order_by(Worker.id).limit(batch_size)
+        ).all()
+        if not worker_ids:
+            logging.info(f"Rebuilt {written} activity rollups since {since}.")
+            return written
+        totals = defaultdict(lambda: [0, 0])
+        for worker_id, day, activity_type, minutes, entries in db.session.execute(
+            select(ActivityLog.worker_id, ActivityLog.date, ActivityLog.activity_type,
+                   func.sum(ActivityLog.duration_minutes), func.count())
+            .where(ActivityLog.worker_id.in_(worker_ids), ActivityLog.date >= since)
+            .group_by(ActivityLog.worker_id, ActivityLog.date, ActivityLog.activity_type)
+        ):
+            day, activity_type = _as_date(day), (activity_type or "")[:100]
+            for key in ((worker_id, DAY, day, activity_type), (worker_id, WEEK, week_start(day), activity_type)):
+                totals[key][0] += minutes or 0
+                totals[key][1] += entries
+
+        db.session.execute(delete(ActivityRollup).where(
+            ActivityRollup.worker_id.in_(worker_ids), ActivityRollup.period_start >= since
+        ))
+        if totals:
+            db.session.execute(insert(ActivityRollup), [
+                dict(worker_id=worker_id, period=period, period_start=period_start, activity_type=activity_type,
+                     total_minutes=minutes, entries=entries)
+                for (worker_id, period, period_start, activity_type), (minutes, entries) in totals.items()
+            ])
+        db.session.commit()
+        written += len(totals)
+        last_id = worker_ids[-1]
+
+
+def compaction_cutoff(older_than_days: int, today: date | None = None) -> date:
+    """Logs dated before this are compacted: the Monday on or before today - older_than_days."""
+    today = today or date.today()
+    return week_start(today - timedelta(days=older_than_days))
+
+
+def compact_activity_logs(older_than_days: int = DEFAULT_RETENTION_DAYS,
+                          batch_size: int = DEFAULT_BATCH_SIZE,
+                          today: date | None = None) -> int:
+    """
+    Deletes raw activity logs older than the retention period, keeping
+    only their daily and weekly rollups. The rollups already count them
+    (they are maintained on write), so this is a plain delete that bypasses
+    the ORM hooks; run `flask rebuild-activity-rollups` first if logs were
+    bulk loaded. Works in id-ordered batches, one commit per batch.
+    Returns the number of logs removed.
+    """
+    cutoff = compaction_cutoff(older_than_days, today)
+    compacted = 0
+    while True:
+        log_ids = db.session.scalars(
+            select(ActivityLog.id).where(ActivityLog.date < cutoff).order_by(ActivityLog.id).limit(batch_size)
+        ).all()
+        if not log_ids:
+            return compacted
+        # The medical records page lists each worker's latest logs
+        invalidate_after_commit(db.session, db.session.scalars(
+            select(ActivityLog.worker_id).where(ActivityLog.id.in_(log_ids)).distinct()
+        ))
+        db.session.execute(delete(ActivityLog).where(ActivityLog.id.in_(log_ids)))
+        db.session.commit()
+        compacted += len(log_ids)
+        logging.info(f"Compacted {compacted} activity logs older than {cutoff}.")
+
+
+# Reads
+
+def activity_summary(worker_id: int, weeks: int = SUMMARY_WEEKS, today: date | None = None) -> dict:
+    """
+    A worker's activity from the rollups alone: minutes per type this
+    week, minutes per day over the last 7 days and per week over the last
+    `weeks` weeks (oldest first, empty periods included).
+    """
+    today = today or date.today()
+    this_week = week_start(today)
+    first_week = this_week - timedelta(weeks=weeks - 1)
+    first_day = today - timedelta(days=6)
+
+    weekly, by_type = defaultdict(int), defaultdict(int)
+    for period_start, activity_type, minutes in db.session.execute(
+        select(ActivityRollup.period_start, ActivityRollup.activity_type, ActivityRollup.total_minutes)
+        .where(ActivityRollup.worker_id == worker_id, ActivityRollup.period == WEEK,
+               ActivityRollup.period_start.between(first_week, this_week))
+    ):
+        weekly[period_start] += minutes
+        if period_start == this_week:
+            by_type[activity_type or "Other"] += minutes
+
+    daily = defaultdict(int)
+    for period_start, minutes in db.session.execute(
+        select(ActivityRollup.period_start, func.sum(ActivityRollup.total_minutes))
+        .where(ActivityRollup.worker_id == worker_id, ActivityRollup.period == DAY,
+               ActivityRollup.period_start.between(first_day, today))
+        .group_by(ActivityRollup.period_start)
+    ):
+        daily[period_start] = int(minutes or 0)
+
+    return dict(
+        this_week_minutes=weekly[this_week],
+        this_week_by_type=sorted(by_type.items(), key=lambda item: item[1], reverse=True),
+        days=[dict(day=first_day + timedelta(days=i), minutes=daily[first_day + timedelta(days=i)]) for i in range(7)],
+        weeks=[dict(week_start=first_week + timedelta(weeks=i), minutes=weekly[first_week + timedelta(weeks=i)])
+               for i in range(weeks)],
+    )
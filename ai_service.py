@@ -1,5 +1,7 @@
-import ollama
 from models import Worker, MedicalCheckup, LabResults, DoctorEvaluation, Vaccination, MedicalVisit
+from database import db
+from snapshot import snapshot_for
+from sqlalchemy import select
 import logging
 import os
 from datetime import datetime
@@ -7,6 +9,18 @@ from datetime import datetime
 # Configure basic logging
 logging.basicConfig(level=logging.INFO)
 
+# The ollama client (and httpx/pydantic behind it) is imported on the first report, not at boot
+ollama = None
+
+
+def _ollama():
+    global ollama
+    if ollama is None:
+        import ollama as client
+        ollama = client
+    return ollama
+
+
 def _safe(v, default='N/A'):
     return v if v not in (None, "", []) else default
 
@@ -30,23 +44,27 @@ def generate_health_report(worker: Worker):
     if not worker:
         return "Error: Worker not found."
 
-    # Latest medical checkup with labs and evaluation
+    # Latest medical checkup with labs and evaluation, found through the
+    # worker's health snapshot instead of loading every checkup
+    snapshot = snapshot_for(worker.id)
     latest_checkup: MedicalCheckup | None = None
-    if hasattr(worker, 'medical_checkups') and worker.medical_checkups:
-        latest_checkup = sorted(worker.medical_checkups, key=lambda c: (c.date_of_checkup or datetime.min), reverse=True)[0]
+    if snapshot and snapshot.latest_checkup_id:
+        latest_checkup = db.session.get(MedicalCheckup, snapshot.latest_checkup_id)
 
     lab: LabResults | None = latest_checkup.lab_results if latest_checkup else None
     ev: DoctorEvaluation | None = latest_checkup.doctor_evaluation if latest_checkup else None
 
     # Recent vaccinations (last 3)
-    vaccinations = []
-    if hasattr(worker, 'vaccinations') and worker.vaccinations:
-        vaccinations = sorted(worker.vaccinations, key=lambda v: (v.date_administered or datetime.min), reverse=True)[:3]
+    vaccinations = db.session.scalars(
+        select(Vaccination).where(Vaccination.worker_id == worker.id)
+        .order_by(Vaccination.date_administered.desc()).limit(3)
+    ).all()
 
     # Recent medical visits (last 3)
-    visits = []
-    if hasattr(worker, 'medical_visits') and worker.medical_visits:
-        visits = sorted(worker.medical_visits, key=lambda v: (v.visit_date or datetime.min), reverse=True)[:3]
+    visits = db.session.scalars(
+        select(MedicalVisit).where(MedicalVisit.worker_id == worker.id)
+        .order_by(MedicalVisit.visit_date.desc()).limit(3)
+    ).all()
 
     profile_data = f"""
     - Full Name: {_safe(f"{_safe(worker.first_name, '')} {_safe(worker.last_name, '')}".strip())}
@@ -167,7 +185,7 @@ def generate_health_report(worker: Worker):
     try:
         model_name = os.getenv("OLLAMA_MODEL", "llama3")
         logging.info("Sending prompt to Ollama...")
-        response = ollama.chat(
+        response = _ollama().chat(
             model=model_name,
             messages=[{'role': 'user', 'content': prompt}]
         )
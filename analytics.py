@@ -0,0 +1,312 @@
+import logging
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import select, union_all
+
+from database import db
+from models import (
+    Worker, MedicalCheckup, LabResults, ArchivedMedicalCheckup, ArchivedLabResults,
+    OccupationEnum, AccommodationEnum, SanitationEnum, GenderEnum
+)
+from sharding import shard_router
+
+# Dimensions a query can slice on. Enum dimensions use the enum's members in
+# order, home_state is dictionary-encoded from the data. Index 0 is always
+# "not recorded".
+ENUM_DIMENSIONS = {
+    "occupation": OccupationEnum,
+    "accommodation": AccommodationEnum,
+    "sanitation": SanitationEnum,
+}
+DIMENSIONS = ["occupation", "home_state", "accommodation", "sanitation"]
+
+# Measures stored in the rollup cubes
+MEASURES = ["screened", "hypertension", "diabetes", "anaemia", "obesity"]
+
+UNKNOWN = "Unknown"
+
+
+def classify(systolic, diastolic, sugar_fasting, hemoglobin, bmi, is_female):
+    """Vectorised screening flags (NaN compares False, so missing values never count)."""
+    with np.errstate(invalid="ignore"):
+        hypertension = (systolic >= 140) | (diastolic >= 90)
+        diabetes = sugar_fasting >= 126
+        anaemia = hemoglobin < np.where(is_female, 12.0, 13.0)
+        obesity = bmi >= 30
+    return np.stack([np.ones_like(hypertension), hypertension, diabetes, anaemia, obesity], axis=1).astype(np.int64)
+
+
+class PopulationAnalytics:
+    """
+    Columnar snapshot of every screened worker's latest vitals plus rollup
+    cubes over occupation x home_state x accommodation x sanitation (and
+    year), so slice-and-dice questions are answered by summing a small NumPy
+    array instead of joining workers, checkups and lab results.
+
+    Two cubes are kept:
+      - current: one contribution per worker, from their latest checkup
+      - yearly: one contribution per worker per year, from their latest
+        checkup in that year
+    New checkups are folded in incrementally by id high-water mark (one per
+    shard: each mints ids in its own block); a full
+    rebuild happens on first use, when an unseen home_state shows up, or
+    every `rebuild_interval` seconds to pick up profile edits.
+    """
+
+    def __init__(self, refresh_interval: float = 60, rebuild_interval: float = 6 * 3600):
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._lock = threading.Lock()
+        self._built_at = 0.0
+        self._refreshed_at = 0.0
+        self.last_checkup_ids = {}
+        self.states = []
+        self.years = []
+
+    # Loading
+
+    def _rows_query(self, min_checkup_id=0):
+        def part(checkup_model, lab_model):
+            return (
+                select(
+                    checkup_model.id.label("checkup_id"),
+                    checkup_model.worker_id,
+                    checkup_model.date_of_checkup,
+                    checkup_model.blood_pressure_systolic,
+                    checkup_model.blood_pressure_diastolic,
+                    checkup_model.bmi,
+                    lab_model.blood_sugar_fasting,
+                    lab_model.hemoglobin_g_dl,
+                    Worker.gender,
+                    Worker.occupation,
+                    Worker.home_state,
+                    Worker.accommodation_type,
+                    Worker.sanitation_quality,
+                )
+                .select_from(checkup_model)
+                .join(Worker, Worker.id == checkup_model.worker_id)
+                .outerjoin(lab_model, lab_model.checkup_id == checkup_model.id)
+                .where(checkup_model.id > min_checkup_id)
+            )
+        if min_checkup_id:
+            # Archived rows keep their ids and only ever move out of the hot table
+            return part(MedicalCheckup, LabResults)
+        return union_all(part(MedicalCheckup, LabResults), part(ArchivedMedicalCheckup, ArchivedLabResults))
+
+    def _fetch(self, min_checkup_ids):
+        return db.session.execute(self._rows_query(min_checkup_ids.get(shard_router.current(), 0))).all()
+
+    def _load(self, min_checkup_ids=None):
+        """Rows above each shard's high-water mark in `min_checkup_ids` (all rows if none)."""
+        per_shard = shard_router.fan_out(self._fetch, min_checkup_ids or {})
+        rows = [row for shard_rows in per_shard.values() for row in shard_rows]
+        n = len(rows)
+        cols = list(zip(*rows)) if rows else [()] * 13
+
+        def floats(values):
+            return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+
+        def enum_codes(values, enum_cls):
+            index = {member: i + 1 for i, member in enumerate(enum_cls)}
+            return np.array([index.get(v, 0) for v in values], dtype=np.int64)
+
+        state_codes = []
+        for state in cols[10]:
+            state = (state or "").strip().title()
+            state_codes.append(self._state_index.get(state, -1) if state else 0)
+
+        return dict(
+            n=n,
+            last_ids={shard: max(row[0] for row in shard_rows) for shard, shard_rows in per_shard.items() if shard_rows},
+            checkup_id=np.array(cols[0], dtype=np.int64),
+            worker_id=np.array(cols[1], dtype=np.int64),
+            day=np.array([d.toordinal() for d in cols[2]], dtype=np.int64),
+            year=np.array([d.year for d in cols[2]], dtype=np.int64),
+            flags=classify(floats(cols[3]), floats(cols[4]), floats(cols[6]), floats(cols[7]), floats(cols[5]),
+                           np.array([g == GenderEnum.FEMALE for g in cols[8]], dtype=bool)),
+            dims=np.stack([
+                enum_codes(cols[9], OccupationEnum),
+                np.array(state_codes, dtype=np.int64),
+                enum_codes(cols[11], AccommodationEnum),
+                enum_codes(cols[12], SanitationEnum),
+            ], axis=1) if n else np.zeros((0, 4), dtype=np.int64),
+        )
+
+    @staticmethod
+    def _fetch_states():
+        return db.session.scalars(select(Worker.home_state).distinct()).all()
+
+    def _load_states(self):
+        states = [s for shard_states in shard_router.fan_out(self._fetch_states).values() for s in shard_states]
+        normalised = sorted({s.strip().title() for s in states if s and s.strip()})
+        self.states = [UNKNOWN] + normalised
+        self._state_index = {s: i for i, s in enumerate(self.states)}
+
+    # Building
+
+    @staticmethod
+    def _latest_per_key(keys, day, checkup_id):
+        """Index of the latest row (by date, then id) for each distinct key."""
+        order = np.lexsort((checkup_id, day, keys))
+        if not len(order):
+            return order
+        sorted_keys = keys[order]
+        last = np.r_[sorted_keys[1:] != sorted_keys[:-1], True]
+        return order[last]
+
+    def _shape(self, with_year):
+        shape = [len(OccupationEnum) + 1, len(self.states), len(AccommodationEnum) + 1, len(SanitationEnum) + 1]
+        if with_year:
+            shape.append(len(self.years))
+        return tuple(shape) + (len(MEASURES),)
+
+    def _apply(self, cube, winners, sign, with_year):
+        if not len(winners["worker_id"]):
+            return
+        index = [winners["dims"][:, i] for i in range(4)]
+        if with_year:
+            index.append(np.searchsorted(self.years, winners["year"]))
+        np.add.at(cube, tuple(index), sign * winners["flags"])
+
+    @staticmethod
+    def _take(rows, idx):
+        return {k: rows[k][idx] for k in ("checkup_id", "worker_id", "day", "year", "flags", "dims")}
+
+    def rebuild(self):
+        started = time.perf_counter()
+        self._load_states()
+        rows = self._load()
+
+        self.years = sorted(set(rows["year"].tolist()))
+        self.current = np.zeros(self._shape(False), dtype=np.int64)
+        self.yearly = np.zeros(self._shape(True), dtype=np.int64)
+
+        self._current_rows = self._take(rows, self._latest_per_key(rows["worker_id"], rows["day"], rows["checkup_id"]))
+        yearly_keys = rows["worker_id"] * 10000 + rows["year"]
+        self._yearly_rows = self._take(rows, self._latest_per_key(yearly_keys, rows["day"], rows["checkup_id"]))
+
+        self._apply(self.current, self._current_rows, 1, False)
+        self._apply(self.yearly, self._yearly_rows, 1, True)
+
+        self.last_checkup_ids = rows["last_ids"]
+        self._built_at = self._refreshed_at = time.time()
+        logging.info(f"Population analytics rebuilt from {rows['n']} checkups in {time.perf_counter() - started:.2f}s")
+
+    def _merge(self, cube, winners, new_rows, key_fn, with_year):
+        """Replace the winning rows for the keys touched by new_rows, updating the cube by difference."""
+        old_keys = key_fn(winners)
+        new_keys = key_fn(new_rows)
+        touched = np.isin(old_keys, new_keys)
+
+        displaced = self._take(winners, touched)
+        self._apply(cube, displaced, -1, with_year)
+
+        candidates = {k: np.concatenate([displaced[k], new_rows[k]]) for k in displaced}
+        best = self._take(candidates, self._latest_per_key(key_fn(candidates), candidates["day"], candidates["checkup_id"]))
+        self._apply(cube, best, 1, with_year)
+
+        kept = self._take(winners, ~touched)
+        return {k: np.concatenate([kept[k], best[k]]) for k in kept}
+
+    def refresh(self):
+        """Folds in checkups saved since the last build or refresh."""
+        self._refreshed_at = time.time()
+        rows = self._load(self.last_checkup_ids)
+        if not rows["n"]:
+            return 0
+        # A new state or year changes the cube shape; rebuild instead of resizing
+        if (rows["dims"][:, 1] < 0).any() or not np.isin(rows["year"], self.years).all():
+            self.rebuild()
+            return rows["n"]
+
+        self._current_rows = self._merge(self.current, self._current_rows, rows,
+                                         lambda r: r["worker_id"], False)
+        self._yearly_rows = self._merge(self.yearly, self._yearly_rows, rows,
+                                        lambda r: r["worker_id"] * 10000 + r["year"], True)
+        self.last_checkup_ids.update(rows["last_ids"])
+        return rows["n"]
+
+    def invalidate(self):
+        """Forces a full rebuild on next use (after changes the incremental path cannot see)."""
+        self._built_at = 0.0
+
+    def ensure_fresh(self):
+        with self._lock:
+            now = time.time()
+            if not self._built_at or now - self._built_at > self.rebuild_interval:
+                self.rebuild()
+            elif now - self._refreshed_at > self.refresh_interval:
+                self.refresh()
+
+    # Querying
+
+    def _dimension_values(self, dimension):
+        if dimension == "home_state":
+            return self.states
+        return [UNKNOWN] + [m.value for m in ENUM_DIMENSIONS[dimension]]
+
+    def _resolve(self, dimension, wanted):
+        values = self._dimension_values(dimension)
+        lookup = {v.lower(): i for i, v in enumerate(values)}
+        if dimension in ENUM_DIMENSIONS:
+            lookup.update({m.name.lower(): i + 1 for i, m in enumerate(ENUM_DIMENSIONS[dimension])})
+        indices = []
+        for value in wanted:
+            if value.strip().lower() not in lookup:
+                raise ValueError(f"Unknown {dimension}: {value}")
+            indices.append(lookup[value.strip().lower()])
+        return indices
+
+    def query(self, filters: dict | None = None, year: int | None = None, group_by: str | None = None) -> dict:
+        """
+        Sums the rollup cube over the selected slice. `filters` maps a
+        dimension to a list of accepted values (enum value or name, or state
+        name); `year` switches to the per-year cube; `group_by` breaks the
+        result down by one dimension.
+        """
+        self.ensure_fresh()
+        filters = filters or {}
+        for dimension in list(filters) + ([group_by] if group_by else []):
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {dimension}")
+
+        cube = self.current
+        if year is not None:
+            if year not in self.years:
+                cube = np.zeros(self._shape(False), dtype=np.int64)
+            else:
+                cube = self.yearly[..., self.years.index(year), :]
+
+        for axis, dimension in enumerate(DIMENSIONS):
+            if dimension in filters:
+                cube = np.take(cube, self._resolve(dimension, filters[dimension]), axis=axis)
+            elif dimension != group_by:
+                cube = cube.sum(axis=axis, keepdims=True)
+
+        def summarise(counts):
+            screened = int(counts[0])
+            result = {"screened": screened}
+            for i, measure in enumerate(MEASURES[1:], start=1):
+                result[measure] = int(counts[i])
+                result[f"{measure}_prevalence"] = round(float(counts[i]) / screened, 4) if screened else None
+            return result
+
+        response = {
+            "filters": filters,
+            "year": year,
+            "as_of_checkup_id": max(self.last_checkup_ids.values(), default=0),
+            "total": summarise(cube.reshape(-1, len(MEASURES)).sum(axis=0)),
+        }
+        if group_by:
+            axis = DIMENSIONS.index(group_by)
+            labels = self._dimension_values(group_by)
+            if group_by in filters:
+                labels = [labels[i] for i in self._resolve(group_by, filters[group_by])]
+            per_group = np.moveaxis(cube, axis, 0).reshape(len(labels), -1, len(MEASURES)).sum(axis=1)
+            response["groups"] = {label: summarise(counts) for label, counts in zip(labels, per_group) if counts[0]}
+        return response
+
+
+population_analytics = PopulationAnalytics()
@@ -0,0 +1,252 @@
+import base64
+import binascii
+import enum
+import gzip
+import hashlib
+import heapq
+import json
+from datetime import date, datetime
+
+from flask import request, current_app
+from sqlalchemy import select, or_
+
+from database import db
+from models import Worker, MedicalCheckup, LabResults, DoctorEvaluation, Vaccination, MedicalVisit
+from sharding import shard_router, DEFAULT
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+COMPRESS_MIN_BYTES = 1024
+
+# Resource name -> model. `fields=` picks the columns of the requested
+# resource, `fields[<name>]=` those of an included one.
+RESOURCES = {
+    "workers": Worker,
+    "checkups": MedicalCheckup,
+    "lab_results": LabResults,
+    "evaluations": DoctorEvaluation,
+    "vaccinations": Vaccination,
+    "visits": MedicalVisit,
+}
+# What a checkup can embed with ?include=
+CHECKUP_INCLUDES = ("lab_results", "evaluations")
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+# Encoding
+
+def encode_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def row_dict(row) -> dict:
+    return {key: encode_value(value) for key, value in row._mapping.items()}
+
+
+def serialize(obj) -> dict:
+    """Every column of a model instance as JSON-ready values."""
+    return {column.key: encode_value(getattr(obj, column.key)) for column in obj.__table__.columns}
+
+
+def json_response(body: dict, status: int = 200):
+    """
+    Compact JSON response. GETs carry a weak ETag of the uncompressed body
+    and answer a matching If-None-Match with an empty 304; bodies worth it
+    are gzipped when the client accepts gzip.
+    """
+    data = json.dumps(body, separators=(",", ":")).encode()
+    response = current_app.response_class(data, status=status, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if request.method == "GET" and status == 200:
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.set_etag(hashlib.sha1(data).hexdigest(), weak=True)
+        response.make_conditional(request)
+        if response.status_code == 304:
+            return response
+    if len(data) >= COMPRESS_MIN_BYTES and "gzip" in request.accept_encodings:
+        response.set_data(gzip.compress(data, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+# Sparse fieldsets and cursors
+
+def selected_columns(resource: str, primary: bool = True):
+    """Columns named in fields[resource] (or fields= for the primary resource); id is always included."""
+    table = RESOURCES[resource].__table__
+    spec = request.args.get(f"fields[{resource}]")
+    if spec is None and primary:
+        spec = request.args.get("fields")
+    if not spec:
+        return list(table.columns)
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in table.columns]
+    if unknown:
+        raise ApiError(f"Unknown {resource} fields: {', '.join(unknown)}")
+    return [table.c.id] + [table.c[name] for name in names if name != "id"]
+
+
+def encode_cursor(last_id: int | dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"after": last_id}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None, per_shard: bool = False) -> int | dict:
+    """The last id a page ended on, or with per_shard the last id on each shard ({name: id})."""
+    if not cursor:
+        return {} if per_shard else 0
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["after"]
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        raise ApiError("Invalid cursor.")
+    if per_shard:
+        if isinstance(after, int):
+            # Handed out before sharding, when every row was in the main database
+            after = {DEFAULT: after}
+        if isinstance(after, dict) and all(isinstance(v, int) for v in after.values()):
+            return after
+    elif isinstance(after, int):
+        return after
+    raise ApiError("Invalid cursor.")
+
+
+def page_limit() -> int:
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ApiError(f"limit must be between 1 and {MAX_LIMIT}.")
+    return limit
+
+
+def _page(resource, *criteria):
+    """
+    One keyset page of `resource` in id order. New rows always land after
+    the last cursor, so a client that keeps it only ever fetches new records.
+    """
+    table = RESOURCES[resource].__table__
+    limit = page_limit()
+    rows = db.session.execute(
+        select(*selected_columns(resource))
+        .where(*criteria, table.c.id > decode_cursor(request.args.get("cursor")))
+        .order_by(table.c.id)
+        .limit(limit + 1)
+    ).all()
+    items = [row_dict(row) for row in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1].id) if len(rows) > limit else None
+    return dict(data=items, next_cursor=next_cursor, limit=limit)
+
+
+def _sharded_page(resource, *criteria):
+    """
+    _page over every shard. The cursor keeps the last id seen on each one:
+    new rows land after it on their own shard, not after the last id overall.
+    """
+    table = RESOURCES[resource].__table__
+    limit = page_limit()
+    columns = selected_columns(resource)
+    after = decode_cursor(request.args.get("cursor"), per_shard=True)
+
+    def fetch():
+        shard = shard_router.current()
+        rows = db.session.execute(
+            select(*columns)
+            .where(*criteria, table.c.id > after.get(shard, 0))
+            .order_by(table.c.id)
+            .limit(limit + 1)
+        ).all()
+        return [(row.id, shard, row) for row in rows]
+
+    rows = list(heapq.merge(*shard_router.fan_out(fetch).values()))
+    for _, shard, row in rows[:limit]:
+        after[shard] = row.id
+    items = [row_dict(row) for _, _, row in rows[:limit]]
+    next_cursor = encode_cursor(after) if len(rows) > limit else None
+    return dict(data=items, next_cursor=next_cursor, limit=limit)
+
+
+def _includes():
+    names = [name.strip() for name in request.args.get("include", "").split(",") if name.strip()]
+    unknown = [name for name in names if name not in CHECKUP_INCLUDES]
+    if unknown:
+        raise ApiError(f"Checkups can include: {', '.join(CHECKUP_INCLUDES)}")
+    return names
+
+
+def _embed(checkups: list[dict]):
+    """Adds the requested lab results/evaluations to a list of checkups, one query per include."""
+    ids = [checkup["id"] for checkup in checkups]
+    for name in _includes():
+        table = RESOURCES[name].__table__
+        columns = selected_columns(name, primary=False)
+        if table.c.checkup_id not in columns:
+            columns.append(table.c.checkup_id)
+        by_checkup = {
+            row.checkup_id: row_dict(row)
+            for row in db.session.execute(select(*columns).where(table.c.checkup_id.in_(ids)))
+        } if ids else {}
+        for checkup in checkups:
+            checkup[name] = by_checkup.get(checkup["id"])
+
+
+def _worker_exists(worker_id: int):
+    if db.session.get(Worker, worker_id) is None:
+        raise ApiError("Worker not found.", 404)
+
+
+# Endpoints
+
+def list_workers(q: str | None = None) -> dict:
+    """Workers in id order; `q` matches like /search-workers."""
+    criteria = []
+    if q:
+        criteria.append(or_(
+            Worker.first_name.ilike(f"%{q}%"),
+            Worker.last_name.ilike(f"%{q}%"),
+            Worker.phone.ilike(f"%{q}%"),
+            Worker.employment_id.ilike(f"%{q}%"),
+            Worker.migrant_id_number.ilike(f"%{q}%"),
+        ))
+    return (_sharded_page if shard_router.enabled else _page)("workers", *criteria)
+
+
+def get_worker(worker_id: int) -> dict:
+    row = db.session.execute(select(*selected_columns("workers")).where(Worker.id == worker_id)).first()
+    if row is None:
+        raise ApiError("Worker not found.", 404)
+    return dict(data=row_dict(row))
+
+
+def list_worker_records(worker_id: int, resource: str) -> dict:
+    """A worker's checkups (with ?include=), vaccinations or visits."""
+    _worker_exists(worker_id)
+    body = _page(resource, RESOURCES[resource].__table__.c.worker_id == worker_id)
+    if resource == "checkups":
+        _embed(body["data"])
+    return body
+
+
+def get_checkup(checkup_id: int) -> dict:
+    row = db.session.execute(select(*selected_columns("checkups")).where(MedicalCheckup.id == checkup_id)).first()
+    if row is None:
+        raise ApiError("Checkup not found.", 404)
+    checkup = row_dict(row)
+    _embed([checkup])
+    return dict(data=checkup)
+
+
+def get_checkup_part(checkup_id: int, resource: str) -> dict:
+    """The lab results or evaluation of one checkup."""
+    table = RESOURCES[resource].__table__
+    if db.session.get(MedicalCheckup, checkup_id) is None:
+        raise ApiError("Checkup not found.", 404)
+    row = db.session.execute(select(*selected_columns(resource)).where(table.c.checkup_id == checkup_id)).first()
+    if row is None:
+        raise ApiError(f"No {resource.replace('_', ' ')} recorded for this checkup.", 404)
+    return dict(data=row_dict(row))
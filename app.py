@@ -1,25 +1,52 @@
-import os
-from flask import Flask, render_template, redirect, flash, request, url_for, abort, send_file
-from dotenv import load_dotenv
+import click
+from flask import Flask, Blueprint, render_template, redirect, flash, request, url_for, abort, send_file, jsonify, current_app
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from sqlalchemy import select,func
 from sqlalchemy.exc import IntegrityError
 from flask_wtf.csrf import CSRFProtect
 from flask_wtf import FlaskForm
 # from sqlalchemy import func
-# from datetime import date
-from decorators import require_role
+from datetime import date
+from decorators import require_role, audited
+from audit import audit_writer, record_event, VIEW, CREATE, UPDATE
 from pdf_gen import create_report_pdf
 
 # from io import BytesIO
 # from weasyprint import HTML
 from ai_service import generate_health_report 
-
-
+from vitals import vitals_trend, VITALS_SERIES, DEFAULT_MAX_POINTS
+from analytics import population_analytics, DIMENSIONS
+from geo import checkups_within_radius, checkups_in_box, backfill_geo
+from outbreak import current_alerts, rebuild_counts
+from followups import follow_up_scheduler, due_list
+from vaccination_schedule import vaccination_schedule, OVERDUE, DUE_SOON, NOT_STARTED, UP_TO_DATE, COMPLETE
+from registration import register_workers, RegistrationError
+from sync import apply_batch, changes_since, decode_body, parse_cursor, SyncError
+from api import (
+    ApiError, json_response, list_workers, get_worker, list_worker_records, get_checkup, get_checkup_part
+)
+from linkage import open_candidates, merge_workers, review_candidate, find_duplicates, rebuild_blocking_keys, MATCH_THRESHOLD
+from i18n import (
+    bundle_manifest, build_bundles, bundle_response, current_language, translate, translation_catalog,
+    TranslateKeyExtension, LANGUAGE_COOKIE
+)
+from template_cache import fragment_cache
+from metrics import request_metrics, report_phase
+from slow_queries import slow_query_log
+from synthetic import generate as generate_synthetic_data, DEFAULT_CHUNK_SIZE, DEFAULT_PASSWORD
+from snapshot import snapshot_for, snapshots_for, rebuild_snapshots
+from sharding import shard_router
+from record_cache import record_cache, cached_worker, cached_records
+from clinical_search import search_clinical_text, rebuild_clinical_index
+from activity import activity_summary, compact_activity_logs, rebuild_rollups, DEFAULT_RETENTION_DAYS
+from archival import archive_checkups, checkups_for_worker, archived_checkup_count, DEFAULT_ARCHIVE_AFTER_YEARS
+
+
+from config import Config
 from database import db
 from models import (
     User, Worker, HealthcareFacility, ActivityLog, Vaccination, MedicalVisit,
-    MedicalCheckup, LabResults, DoctorEvaluation,
+    MedicalCheckup, LabResults, DoctorEvaluation, DuplicateCandidate,
     UserRoleEnum, GenderEnum, OccupationEnum, FrequencyEnum, DietTypeEnum,
     PPEUsageEnum, PhysicalStrainEnum, AccommodationEnum, SanitationEnum,
     # Added Enums needed for new route
@@ -39,52 +66,65 @@ from forms import (
 class EmptyForm(FlaskForm):
     pass
 
-load_dotenv()
-app = Flask(__name__)
-csrf = CSRFProtect(app)
-
-
-
-db_user = os.getenv("MYSQLUSER") or os.getenv("DB_USER")
-db_pass = os.getenv("MYSQLPASSWORD") or os.getenv("DB_PASS")
-db_host = os.getenv("MYSQLHOST") or os.getenv("DB_HOST")
-db_name = os.getenv("MYSQLDATABASE") or os.getenv("DB_NAME")
-db_port = os.getenv("MYSQLPORT")
-
-# Handle empty or missing port safely
-if db_port and db_port.strip():
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"mysql+pymysql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-else:
-    app.config["SQLALCHEMY_DATABASE_URI"] = f"mysql+pymysql://{db_user}:{db_pass}@{db_host}/{db_name}"
-#new seettings 
-
-# SQLAlchemy settings
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret-key")
-
-db.init_app(app)
-
+csrf = CSRFProtect()
 
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = "login"
+login_manager.login_view = "auth.login"
+
+# Routes by area; create_app() registers them all
+main_bp = Blueprint("main", __name__)
+auth_bp = Blueprint("auth", __name__)
+admin_bp = Blueprint("admin", __name__)
+facility_bp = Blueprint("facility", __name__)
+api_bp = Blueprint("api", __name__)
+# Commands stay top-level (flask archive-checkups, ...)
+maintenance_bp = Blueprint("maintenance", __name__, cli_group=None)
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
 # This makes the 'logout_form' available in all templates
-@app.context_processor
+@main_bp.app_context_processor
 def inject_forms():
     return dict(logout_form=EmptyForm())
 
 
+# Pages are rendered in the current language; the switcher swaps to another
+# one in place from that language's fingerprinted bundle.
+@main_bp.app_context_processor
+def inject_translation_bundles():
+    def translation_bundle_urls():
+        return {language: url_for("main.translation_bundle", filename=filename)
+                for language, filename in bundle_manifest.get().items()}
+    return dict(translation_bundle_urls=translation_bundle_urls, current_language=current_language)
+
+
+@main_bp.route("/i18n/<filename>")
+def translation_bundle(filename):
+    return bundle_response(filename)
+
+
+@main_bp.route("/language", methods=["POST"])
+def set_language():
+    """Remembers the switcher's choice so later pages render in it."""
+    language = request.form.get("language", "")
+    if language not in translation_catalog.languages():
+        return jsonify(error="Unsupported language."), 400
+    if current_user.is_authenticated and current_user.worker is not None:
+        current_user.worker.preferred_language = language
+        db.session.commit()
+    response = current_app.response_class(status=204)
+    response.set_cookie(LANGUAGE_COOKIE, language, max_age=365 * 24 * 3600, samesite="Lax")
+    return response
+
+
 #  AUTHENTICATION ROUTES 
 
-@app.route("/signup", methods=["GET", "POST"])
+@auth_bp.route("/signup", methods=["GET", "POST"])
 def signup():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     form = SignUpForm()
     if form.validate_on_submit():
         # Get role from form - security check: only allow NORMAL_USER or HEALTH_OFFICIAL
@@ -114,7 +154,7 @@ def signup():
             db.session.commit()
             role_name = "Healthcare Facility" if role == UserRoleEnum.HEALTH_OFFICIAL else "Worker"
             flash(f"Account created successfully as {role_name}! Please log in.", "success")
-            return redirect(url_for("login"))
+            return redirect(url_for("auth.login"))
         except IntegrityError as e:
             db.session.rollback()
             flash("That username or email is already taken, or license number already exists.", "error")
@@ -124,10 +164,10 @@ def signup():
                 flash(f"{field.replace('_', ' ').title()}: {error}", 'error')
     return render_template("signup.html.j2", form=form)
 
-@app.route("/login", methods=["POST", "GET"])
+@auth_bp.route("/login", methods=["POST", "GET"])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     form = LoginForm()
     if form.validate_on_submit():
@@ -136,7 +176,7 @@ def login():
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             flash(f"Welcome back, {user.username}!", "success")
-            return redirect(next_page or url_for('dashboard'))
+            return redirect(next_page or url_for('main.dashboard'))
         else:
             flash("Invalid username or password. Please try again.", "error")
     elif request.method == 'POST':
@@ -145,14 +185,14 @@ def login():
                 flash(f"{field.replace('_', ' ').title()}: {error}", 'error')
     return render_template('login.html.j2', form=form)
 
-@app.route("/logout", methods=["POST"])
+@auth_bp.route("/logout", methods=["POST"])
 @login_required
 def logout():
     logout_user()
     flash("You have been logged out successfully.", "info")
-    return redirect(url_for("home"))
+    return redirect(url_for("main.home"))
 
-@app.route("/admin_dashboard", methods=["GET", "POST"])
+@admin_bp.route("/admin_dashboard", methods=["GET", "POST"])
 @require_role(["admin"])
 def admin_dashboard():
     form = AdminAddUserForm()
@@ -170,7 +210,7 @@ def admin_dashboard():
             except IntegrityError:
                 db.session.rollback()
                 flash("That username or email is already taken.", "error")
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('admin.admin_dashboard'))
         else:
             # Form validation failed
             for field, errors in form.errors.items():
@@ -195,7 +235,7 @@ def admin_dashboard():
             except IntegrityError:
                 db.session.rollback()
                 flash("A facility with this license number already exists.", "danger")
-            return redirect(url_for("admin_dashboard"))
+            return redirect(url_for("admin.admin_dashboard"))
         else:
             # Form validation failed
             for field, errors in facility_form.errors.items():
@@ -222,34 +262,131 @@ def admin_dashboard():
                            search_results=search_results,
                            search_query=search_query)
 
+@admin_bp.route("/admin/audit/metrics")
+@require_role(["admin"])
+def audit_metrics():
+    """Backpressure and throughput counters of the background audit writer."""
+    return jsonify(audit_writer.metrics())
+
+@admin_bp.route("/metrics")
+def prometheus_metrics():
+    """Request latency, SQL and report phase histograms in Prometheus format (admins or METRICS_TOKEN)."""
+    return request_metrics.response()
+
+@admin_bp.route("/admin/slow-queries")
+@require_role(["admin"])
+def slow_queries():
+    """Slowest statement shapes seen by this process with their plans (?sort=total_ms|max_ms|mean_ms|count, ?limit=)"""
+    sort = request.args.get('sort', 'total_ms')
+    if sort not in ('total_ms', 'max_ms', 'mean_ms', 'count'):
+        return jsonify(error="sort must be one of total_ms, max_ms, mean_ms, count"), 400
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    return jsonify(
+        enabled=current_app.config["SLOW_QUERY_LOG_ENABLED"],
+        threshold_ms=current_app.config["SLOW_QUERY_THRESHOLD_MS"],
+        queries=slow_query_log.top(limit=limit, sort=sort)
+    )
+
+@admin_bp.route("/admin/analytics")
+@require_role(["admin"])
+def population_analytics_query():
+    """
+    Slice-and-dice screening prevalence, e.g.
+    /admin/analytics?occupation=Construction&home_state=Bihar&accommodation=Temporary Camp&group_by=sanitation
+    Each dimension accepts several comma-separated values.
+    """
+    filters = {}
+    for dimension in DIMENSIONS:
+        values = [v for raw in request.args.getlist(dimension) for v in raw.split(',') if v.strip()]
+        if values:
+            filters[dimension] = values
+    try:
+        result = population_analytics.query(
+            filters,
+            year=request.args.get('year', type=int),
+            group_by=request.args.get('group_by') or None
+        )
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(result)
+
+@admin_bp.route("/admin/duplicates")
+@require_role(["admin"])
+def duplicate_workers():
+    """Probable duplicate worker registrations, best match first (?status=open|dismissed|merged, ?min_score=)"""
+    status = request.args.get('status', 'open')
+    if status not in ('open', 'dismissed', 'merged'):
+        return jsonify(error="status must be one of open, dismissed, merged"), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    return jsonify(open_candidates(
+        min_score=request.args.get('min_score', MATCH_THRESHOLD, type=float),
+        status=status, page=page, per_page=per_page
+    ))
+
+@admin_bp.route("/admin/duplicates/<int:candidate_id>/merge", methods=["POST"])
+@require_role(["admin"])
+def merge_duplicate_workers(candidate_id):
+    """Merges a candidate pair; `keep_id` (form or JSON) picks the surviving worker, default the older record"""
+    candidate = DuplicateCandidate.query.get_or_404(candidate_id)
+    if candidate.status != 'open':
+        return jsonify(error=f"Candidate is already {candidate.status}."), 409
+    payload = request.get_json(silent=True) or request.form
+    try:
+        keep_id = int(payload.get('keep_id', candidate.worker_id))
+    except (TypeError, ValueError):
+        return jsonify(error="keep_id must be a worker id."), 400
+    if keep_id not in (candidate.worker_id, candidate.other_worker_id):
+        return jsonify(error="keep_id must be one of the pair."), 400
+    duplicate_id = candidate.other_worker_id if keep_id == candidate.worker_id else candidate.worker_id
+    try:
+        moved = merge_workers(keep_id, duplicate_id, reviewed_by_user_id=current_user.id)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    record_event(UPDATE, "worker", keep_id, remarks=f"Merged duplicate worker {duplicate_id}")
+    return jsonify(kept_worker_id=keep_id, removed_worker_id=duplicate_id, moved=moved)
+
+@admin_bp.route("/admin/duplicates/<int:candidate_id>/dismiss", methods=["POST"])
+@require_role(["admin"])
+def dismiss_duplicate_workers(candidate_id):
+    """Marks a candidate pair as distinct people so it is not suggested again"""
+    try:
+        candidate = review_candidate(candidate_id, 'dismissed', reviewed_by_user_id=current_user.id)
+    except ValueError:
+        abort(404)
+    return jsonify(id=candidate.id, status=candidate.status)
+
 # CORE APP ROUTES 
-@app.route("/")
+@main_bp.route("/")
 def home():
     return render_template('index.html.j2') 
 
-@app.route("/dashboard")
+@main_bp.route("/dashboard")
 @login_required
 def dashboard():
     # passing worker objetc to the template
     worker = current_user.worker
 
     if current_user.role == UserRoleEnum.ADMIN:
-        return redirect(url_for('admin_dashboard'))
-    
-    return render_template('dashboard.html.j2', worker=worker)
+        return redirect(url_for('admin.admin_dashboard'))
+
+    snapshot = snapshot_for(worker.id) if worker else None
+    activity = activity_summary(worker.id) if worker else None
+    return render_template('dashboard.html.j2', worker=worker, snapshot=snapshot, activity=activity)
 
-@app.route("/tos")
+@main_bp.route("/tos")
 def tos():
     return render_template('tos.html')
 
 # Worker Profile Routes 
 
-@app.route("/create-profile", methods=["GET", "POST"])
+@main_bp.route("/create-profile", methods=["GET", "POST"])
 @login_required
 def worker_details():
     if current_user.worker:
         flash("You have already created your profile. You can edit it instead.", "info")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     form = WorkerDetailsForm()
     if form.validate_on_submit():
@@ -282,22 +419,24 @@ def worker_details():
             stress_level=form.stress_level.data,
             has_social_support=form.has_social_support.data
         )
-        db.session.add(worker)
-        db.session.commit()
+        with shard_router.use(shard_router.place(worker)):
+            db.session.add(worker)
+            db.session.commit()
+            record_event(CREATE, "worker", worker.id)
         flash("Your profile has been created successfully!", "success")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     elif request.method == 'POST':
         flash("Please correct the errors below.", "error")
         
     return render_template('worker_details.html.j2', form=form, page_title="Create Your Profile")
 
-@app.route("/edit-profile", methods=["GET", "POST"])
+@main_bp.route("/edit-profile", methods=["GET", "POST"])
 @login_required
 def edit_details():
     worker = current_user.worker
     if not worker:
         flash("You need to create your profile first.", "warning")
-        return redirect(url_for('worker_details'))
+        return redirect(url_for('main.worker_details'))
 
     form = WorkerDetailsForm(obj=worker)
     if form.validate_on_submit():
@@ -317,8 +456,9 @@ def edit_details():
         worker.sanitation_quality = SanitationEnum(form.sanitation_quality.data)
 
         db.session.commit()
+        record_event(UPDATE, "worker", worker.id)
         flash("Your profile has been updated successfully!", "success")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     
     elif request.method == 'POST':
         flash("Please correct the errors below.", "error")
@@ -329,12 +469,12 @@ def edit_details():
 
  
 
-@app.route("/log-activity", methods=["GET", "POST"])
+@main_bp.route("/log-activity", methods=["GET", "POST"])
 @login_required
 def log_activity():
     if not current_user.worker:
         flash("Please create your profile first.", "warning")
-        return redirect(url_for('worker_details'))
+        return redirect(url_for('main.worker_details'))
         
     form = ActivityLogForm()
 
@@ -358,16 +498,16 @@ def log_activity():
         db.session.add(activity)
         db.session.commit()
         flash("Activity logged successfully!", "success")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     return render_template('log_activity.html.j2', form=form)
 
-@app.route("/add-vaccination", methods=["GET", "POST"])
+@main_bp.route("/add-vaccination", methods=["GET", "POST"])
 @login_required
 def add_vaccination():
     if not current_user.worker:
         flash("Please create your profile first.", "warning")
-        return redirect(url_for('worker_details'))
+        return redirect(url_for('main.worker_details'))
 
     form = VaccinationForm()
     
@@ -391,8 +531,9 @@ def add_vaccination():
         )
         db.session.add(vaccination)
         db.session.commit()
+        record_event(CREATE, "vaccination", vaccination.id)
         flash("Vaccination record added!", "success")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     return render_template('add_vaccination.html.j2', form=form)
 
@@ -405,7 +546,7 @@ def add_vaccination():
 #     # Restricting access
 #     if current_user.role != UserRoleEnum.HEALTH_OFFICIAL:
 #         flash("You do not have permission to register a facility.", "error")
-#         return redirect(url_for('dashboard'))
+#         return redirect(url_for('main.dashboard'))
 # 
 #     form = HealthcareFacilityForm()
 #     if form.validate_on_submit():
@@ -420,15 +561,15 @@ def add_vaccination():
 #         db.session.add(facility)
 #         db.session.commit()
 #         flash("Healthcare facility registered successfully!", "success")
-#         return redirect(url_for('dashboard'))
+#         return redirect(url_for('main.dashboard'))
 #         
 #     return render_template('healthcare_facility.html.j2', form=form, page_title="Register Facility")
 # --- END OF REMOVED ROUTE ---
 
 
 # --- NEW ROUTE FOR FACILITY TO REGISTER A WORKER ---
-@app.route("/facility/register-worker", methods=["GET", "POST"])
-@require_role(["HEALTH_OFFICIAL", "ADMIN"])
+@facility_bp.route("/facility/register-worker", methods=["GET", "POST"])
+@require_role(["health_official", "admin"])
 def register_worker_by_facility():
     form = HospitalRegisterWorkerForm()
     if form.validate_on_submit():
@@ -467,12 +608,16 @@ def register_worker_by_facility():
                 home_state=form.home_state.data,
                 occupation=OccupationEnum(form.occupation.data)
             )
-            db.session.add(worker)
-            db.session.commit()
-            
-            flash(f"Worker {worker.first_name} registered successfully!", "success")
+            # Read back on its shard: the commit expires the new row
+            with shard_router.use(shard_router.place(worker)):
+                db.session.add(worker)
+                db.session.commit()
+                record_event(CREATE, "worker", worker.id)
+                flash(f"Worker {worker.first_name} registered successfully!", "success")
+                worker_id = worker.id
+
             # Redirect straight to the new worker's medical record page
-            return redirect(url_for('view_worker_medical_records', worker_id=worker.id))
+            return redirect(url_for('facility.view_worker_medical_records', worker_id=worker_id))
 
         except IntegrityError:
             db.session.rollback()
@@ -485,7 +630,37 @@ def register_worker_by_facility():
 # --- END OF NEW ROUTE ---
 
 
-@app.route("/worker/<int:worker_id>/add-medical-visit", methods=["GET", "POST"])
+@facility_bp.route("/facility/register-workers", methods=["POST"])
+@csrf.exempt  # JSON-only, so a cross-site form cannot post here; the session still authenticates
+@require_role(["health_official", "admin"])
+def register_workers_by_facility():
+    """
+    Registers a camp's workers in one request. POST JSON
+    {"password": "default", "workers": [{first_name, last_name, phone, age,
+    gender, home_state, occupation, password?}, ...]}; each worker gets an
+    account with its phone as username, like the single registration form.
+    Every worker is reported back: created (with worker_id), conflict or error.
+    """
+    if request.mimetype != 'application/json':
+        return jsonify(error="Content-Type must be application/json"), 415
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error="Body must be a JSON object."), 400
+    try:
+        results = register_workers(payload.get('workers'), default_password=payload.get('password'))
+    except RegistrationError as e:
+        return jsonify(error=str(e)), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(error="Another registration used one of these phone numbers at the same time. Please resend the batch."), 409
+    for result in results:
+        if result['status'] == 'created':
+            record_event(CREATE, "worker", result['worker_id'])
+    created = sum(result['status'] == 'created' for result in results)
+    return jsonify(created=created, rejected=len(results) - created, results=results)
+
+
+@facility_bp.route("/worker/<int:worker_id>/add-medical-visit", methods=["GET", "POST"])
 @login_required
 def add_medical_visit(worker_id):
     # Restricting access
@@ -506,13 +681,31 @@ def add_medical_visit(worker_id):
         )
         db.session.add(visit)
         db.session.commit()
+        record_event(CREATE, "medical_visit", visit.id)
         flash(f"Medical visit for {worker.first_name} has been recorded.", "success")
-        return redirect(url_for('dashboard')) 
+        return redirect(url_for('main.dashboard')) 
 
     return render_template('add_medical_visit.html.j2', form=form, worker=worker)
 
 
-@app.route("/search-workers", methods=["GET", "POST"])
+def _search_workers(search_query):
+    """Workers matching by name, phone, employment or migrant id on the current shard, with their snapshots."""
+    filters = [
+        Worker.first_name.ilike(f"%{search_query}%"),
+        Worker.last_name.ilike(f"%{search_query}%"),
+        Worker.phone.ilike(f"%{search_query}%")
+    ]
+    # Add optional fields if they exist in the model
+    if hasattr(Worker, 'employment_id'):
+        filters.append(Worker.employment_id.ilike(f"%{search_query}%"))
+    if hasattr(Worker, 'migrant_id_number'):
+        filters.append(Worker.migrant_id_number.ilike(f"%{search_query}%"))
+
+    workers = Worker.query.filter(db.or_(*filters)).all()
+    return workers, snapshots_for(worker.id for worker in workers)
+
+
+@facility_bp.route("/search-workers", methods=["GET", "POST"])
 @require_role(["admin", "health_official"])
 def search_workers():
     """Search for workers by name, phone, or ID"""
@@ -520,72 +713,267 @@ def search_workers():
     workers = []
     
     if search_query:
-        # Search by name, phone, employment_id, or migrant_id_number
-        filters = [
-            Worker.first_name.ilike(f"%{search_query}%"),
-            Worker.last_name.ilike(f"%{search_query}%"),
-            Worker.phone.ilike(f"%{search_query}%")
-        ]
-        # Add optional fields if they exist in the model
-        if hasattr(Worker, 'employment_id'):
-            filters.append(Worker.employment_id.ilike(f"%{search_query}%"))
-        if hasattr(Worker, 'migrant_id_number'):
-            filters.append(Worker.migrant_id_number.ilike(f"%{search_query}%"))
-        
-        workers = Worker.query.filter(db.or_(*filters)).all()
-        
+        # Every shard is searched in parallel; results are merged by name
+        results = shard_router.fan_out(_search_workers, search_query)
+        workers = sorted((worker for found, _ in results.values() for worker in found),
+                         key=lambda worker: (worker.first_name.lower(), (worker.last_name or "").lower(), worker.id))
+        snapshots = {worker_id: snapshot for _, found in results.values() for worker_id, snapshot in found.items()}
+
         if not workers:
             flash(f"No workers found matching '{search_query}'.", "warning")
-    
-    return render_template('search_workers.html.j2', workers=workers, search_query=search_query)
+    else:
+        snapshots = {}
+
+    return render_template('search_workers.html.j2', workers=workers, snapshots=snapshots, search_query=search_query)
+
+
+def _worker_records(worker_id, full_history):
+    """The lists on a worker's medical records page, cached per worker (see record_cache.py)."""
+    return dict(
+        # Newest first; archived checkups only for the full history
+        checkups=checkups_for_worker(worker_id, full_history=full_history),
+        archived_count=archived_checkup_count(worker_id),
+        vaccinations=Vaccination.query.filter_by(worker_id=worker_id).order_by(Vaccination.date_administered.desc()).all(),
+        medical_visits=MedicalVisit.query.filter_by(worker_id=worker_id).order_by(MedicalVisit.visit_date.desc()).all(),
+        activity_logs=ActivityLog.query.filter_by(worker_id=worker_id).order_by(ActivityLog.date.desc()).limit(10).all(),
+    )
+
 
-@app.route("/worker/<int:worker_id>/medical-records")
+@facility_bp.route("/worker/<int:worker_id>/medical-records")
 @require_role(["admin", "health_official"])
+@audited(VIEW, "worker")
 def view_worker_medical_records(worker_id):
     """View all medical records for a specific worker"""
-    worker = Worker.query.get_or_404(worker_id)
-    
-    # Get all medical checkups ordered by date (newest first)
-    checkups = MedicalCheckup.query.filter_by(worker_id=worker.id).order_by(MedicalCheckup.date_of_checkup.desc()).all()
+    worker = cached_worker(worker_id) or abort(404)
     
-    # Get all vaccinations
-    vaccinations = Vaccination.query.filter_by(worker_id=worker.id).order_by(Vaccination.date_administered.desc()).all()
-    
-    # Get all medical visits
-    medical_visits = MedicalVisit.query.filter_by(worker_id=worker.id).order_by(MedicalVisit.visit_date.desc()).all()
-    
-    # Get all activity logs
-    activity_logs = ActivityLog.query.filter_by(worker_id=worker.id).order_by(ActivityLog.date.desc()).limit(10).all()
+    # Archived checkups are only read when the facility explicitly asks for the full history.
+    full_history = request.args.get('history') == 'full'
+    records = cached_records(worker.id, full_history, lambda: _worker_records(worker.id, full_history))
     
     return render_template(
         'worker_medical_records.html.j2',
         worker=worker,
-        checkups=checkups,
-        vaccinations=vaccinations,
-        medical_visits=medical_visits,
-        activity_logs=activity_logs
+        full_history=full_history,
+        **records
     )
 
-@app.route("/generate-report")
+@facility_bp.route("/worker/<int:worker_id>/vitals-trend")
+@require_role(["admin", "health_official"])
+@audited(VIEW, "worker")
+def worker_vitals_trend(worker_id):
+    """BP, BMI, sugar and Hb series for charts, downsampled server-side"""
+    worker = cached_worker(worker_id) or abort(404)
+
+    names = [n for n in request.args.get('metrics', '').split(',') if n]
+    unknown = [n for n in names if n not in VITALS_SERIES]
+    if unknown:
+        return jsonify(error=f"Unknown metrics: {', '.join(unknown)}", available=list(VITALS_SERIES)), 400
+
+    max_points = min(max(request.args.get('max_points', DEFAULT_MAX_POINTS, type=int), 1), 1000)
+    since = request.args.get('since', type=date.fromisoformat)
+    until = request.args.get('until', type=date.fromisoformat)
+
+    return jsonify(vitals_trend(worker.id, names or None, max_points=max_points, since=since, until=until))
+
+@facility_bp.route("/checkups/near")
+@require_role(["admin", "health_official"])
+def checkups_near():
+    """Checkups within radius_km of lat/lon, e.g. /checkups/near?lat=9.93&lon=76.26&radius_km=5"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius_km = request.args.get('radius_km', 5.0, type=float)
+    if lat is None or lon is None or not (0 < radius_km <= 500):
+        return jsonify(error="lat, lon and a radius_km between 0 and 500 are required"), 400
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+    results = checkups_within_radius(lat, lon, radius_km, limit=limit)
+    return jsonify(center=[lat, lon], radius_km=radius_km, count=len(results), checkups=results)
+
+
+@facility_bp.route("/checkups/within")
+@require_role(["admin", "health_official"])
+def checkups_within():
+    """Checkups inside a bounding box: /checkups/within?min_lat=..&min_lon=..&max_lat=..&max_lon=.."""
+    bounds = [request.args.get(k, type=float) for k in ('min_lat', 'min_lon', 'max_lat', 'max_lon')]
+    if None in bounds or bounds[0] > bounds[2] or bounds[1] > bounds[3]:
+        return jsonify(error="min_lat, min_lon, max_lat and max_lon are required"), 400
+    limit = min(max(request.args.get('limit', 500, type=int), 1), 5000)
+    results = checkups_in_box(*bounds, limit=limit)
+    return jsonify(bounds=bounds, count=len(results), checkups=results)
+
+@facility_bp.route("/clinical-search")
+@require_role(["admin", "health_official"])
+def clinical_search():
+    """Visits and evaluations mentioning every term, best first: /clinical-search?q=silicosis&page=2 (derm* for prefixes)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify(error="q is required"), 400
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
+    return jsonify(search_clinical_text(query, page=page, per_page=per_page))
+
+@facility_bp.route("/outbreaks/alerts")
+@require_role(["admin", "health_official"])
+def outbreak_alerts():
+    """Current spikes in positive TB/malaria/HIV/hepatitis results by location cell, work location or employer"""
+    dimension = request.args.get('dimension')
+    if dimension not in (None, 'cell', 'work_location', 'employer'):
+        return jsonify(error="dimension must be one of cell, work_location, employer"), 400
+    alerts = current_alerts(dimension=dimension)
+    return jsonify(count=len(alerts), alerts=alerts)
+
+@facility_bp.route("/facility/follow-ups")
+@require_role(["admin", "health_official"])
+def facility_follow_ups():
+    """Open follow-ups for the current facility (admins may pass ?facility_id=), ordered by due date"""
+    status = request.args.get('status', 'all')
+    if status not in ('all', 'due', 'overdue'):
+        return jsonify(error="status must be one of all, due, overdue"), 400
+
+    if current_user.role == UserRoleEnum.ADMIN:
+        facility_id = request.args.get('facility_id', type=int)
+    elif current_user.facility:
+        facility_id = current_user.facility.id
+    else:
+        abort(403)
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 200)
+    return jsonify(due_list(facility_id, status=status, page=page, per_page=per_page))
+
+@facility_bp.route("/vaccinations/overdue")
+@require_role(["admin", "health_official"])
+def vaccinations_overdue():
+    """Workers overdue (or not started, due soon, ... via ?status=a,b) against the vaccination schedule"""
+    statuses = tuple(request.args.get('status', f"{OVERDUE},{NOT_STARTED}").split(','))
+    valid = (OVERDUE, DUE_SOON, NOT_STARTED, UP_TO_DATE, COMPLETE)
+    if any(s not in valid for s in statuses):
+        return jsonify(error=f"status must be a comma-separated list of {', '.join(valid)}"), 400
+    vaccine = request.args.get('vaccine')
+    if vaccine and vaccine not in vaccination_schedule.catalog:
+        return jsonify(error=f"vaccine must be one of {', '.join(vaccination_schedule.catalog)}"), 400
+
+    summary, matches = vaccination_schedule.population_status(statuses=statuses, vaccine=vaccine)
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), 1000)
+    start = (page - 1) * per_page
+    return jsonify(
+        summary=summary,
+        total=len(matches),
+        page=page,
+        per_page=per_page,
+        has_next=start + per_page < len(matches),
+        items=matches[start:start + per_page]
+    )
+
+@facility_bp.route("/worker/<int:worker_id>/vaccination-status")
+@require_role(["admin", "health_official"])
+@audited(VIEW, "vaccination_status")
+def worker_vaccination_status(worker_id):
+    """Due/overdue status of one worker for every scheduled vaccine"""
+    worker = Worker.query.get_or_404(worker_id)
+    return jsonify(worker_id=worker.id, vaccines=vaccination_schedule.worker_status(worker.id))
+
+@api_bp.route("/api/sync", methods=["GET", "POST"])
+@csrf.exempt  # JSON-only, so a cross-site form cannot post here; the session still authenticates
+@require_role(["admin", "health_official"])
+def sync_offline_batch():
+    """
+    Offline sync for field camps. POST a JSON batch (optionally gzip
+    compressed, Content-Encoding: gzip) of workers, checkups, vaccinations
+    and visits, each with a client-generated `client_id`; records that point
+    at a worker created offline use `worker_client_id`. Re-sending a batch is
+    safe. The response reports every record and carries the server changes
+    since `cursor` (a number, or one per shard joined by "." once sharded).
+    GET ?cursor= only pulls changes.
+    """
+    if request.method == 'POST':
+        if request.mimetype != 'application/json':
+            return jsonify(error="Content-Type must be application/json"), 415
+        try:
+            payload = decode_body(request.get_data(), request.headers.get('Content-Encoding'))
+            device_id = str(payload.get('device_id') or '')[:100] or None
+            cursor = parse_cursor(payload.get('cursor'))
+            results = apply_batch(payload, current_user, device_id)
+        except (SyncError, ValueError, TypeError) as e:
+            db.session.rollback()
+            return jsonify(error=str(e)), 400
+        if results:
+            record_event(CREATE, "sync_batch", current_user.id,
+                         remarks=f"{sum(r['status'] == 'created' for r in results)}/{len(results)} records from {device_id}")
+    else:
+        results = []
+        device_id = request.args.get('device_id')
+        try:
+            cursor = parse_cursor(request.args.get('cursor'))
+        except SyncError as e:
+            return jsonify(error=str(e)), 400
+
+    delta = changes_since(cursor, current_user, device_id=device_id)
+    return json_response(dict(results=results, **delta))
+
+# JSON API (v1). Every endpoint takes ?fields=a,b for sparse fieldsets,
+# list endpoints page with ?limit= and the opaque ?cursor= they return, and
+# checkup endpoints embed ?include=lab_results,evaluations. Responses carry
+# ETags (If-None-Match -> 304) and are gzipped when the client accepts it.
+
+@api_bp.app_errorhandler(ApiError)
+def api_error(e):
+    return jsonify(error=str(e)), e.status
+
+@api_bp.route("/api/v1/workers")
+@require_role(["admin", "health_official"])
+def api_workers():
+    """Workers; ?q= searches like /search-workers"""
+    return json_response(list_workers(request.args.get('q', '').strip() or None))
+
+@api_bp.route("/api/v1/workers/<int:worker_id>")
+@require_role(["admin", "health_official"])
+@audited(VIEW, "worker")
+def api_worker(worker_id):
+    return json_response(get_worker(worker_id))
+
+@api_bp.route("/api/v1/workers/<int:worker_id>/<any(checkups, vaccinations, visits):resource>")
+@require_role(["admin", "health_official"])
+@audited(VIEW, "worker")
+def api_worker_records(worker_id, resource):
+    return json_response(list_worker_records(worker_id, resource))
+
+@api_bp.route("/api/v1/checkups/<int:checkup_id>")
+@require_role(["admin", "health_official"])
+@audited(VIEW, "medical_checkup", id_arg="checkup_id")
+def api_checkup(checkup_id):
+    return json_response(get_checkup(checkup_id))
+
+@api_bp.route("/api/v1/checkups/<int:checkup_id>/<any(lab_results, evaluations):resource>")
+@require_role(["admin", "health_official"])
+@audited(VIEW, "medical_checkup", id_arg="checkup_id")
+def api_checkup_part(checkup_id, resource):
+    return json_response(get_checkup_part(checkup_id, resource))
+
+@main_bp.route("/generate-report")
 @login_required
 def generate_report():
     worker = current_user.worker
     if not worker:
         flash("You must create a worker profile before generating a report.", "warning")
-        return redirect(url_for('worker_details'))
+        return redirect(url_for('main.worker_details'))
 
     
+    record_event(VIEW, "health_report", worker.id)
+
     # calling Ollama Llama3
-    report_content = generate_health_report(worker)
+    with report_phase("llm"):
+        report_content = generate_health_report(worker)
     report_content = report_content.replace("**","")
     
     if "Error:" in report_content:
         flash(report_content, "error")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
 
     worker_name = f"{worker.first_name} {worker.last_name or ''}".strip()
-    pdf_stream = create_report_pdf(report_content, worker_name)
+    with report_phase("pdf"):
+        pdf_stream = create_report_pdf(report_content, worker_name)
     
     # 3. Send file to user 
     return send_file(
@@ -596,13 +984,13 @@ def generate_report():
     )
 # Main Execution 
 
-@app.route("/add-medical-checkup", methods=["GET", "POST"])
+@main_bp.route("/add-medical-checkup", methods=["GET", "POST"])
 @login_required
 def add_medical_checkup():
     worker = current_user.worker
     if not worker:
         flash("Please create your profile before adding a medical checkup.", "warning")
-        return redirect(url_for('worker_details'))
+        return redirect(url_for('main.worker_details'))
 
     checkup_form = MedicalCheckupForm()
     lab_form = LabResultsForm()
@@ -742,15 +1130,16 @@ def add_medical_checkup():
 
         db.session.add(ev)
         db.session.commit()
+        record_event(CREATE, "medical_checkup", checkup.id)
         flash("Medical checkup saved successfully!", "success")
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     return render_template('medical_checkup.html.j2', checkup_form=checkup_form, lab_form=lab_form, eval_form=eval_form, page_title="Add Medical Checkup")
 
 
 # --- NEW ROUTE FOR FACILITY TO ADD CHECKUP FOR A WORKER ---
-@app.route("/worker/<int:worker_id>/add-checkup", methods=["GET", "POST"])
-@require_role(["HEALTH_OFFICIAL", "ADMIN"])
+@facility_bp.route("/worker/<int:worker_id>/add-checkup", methods=["GET", "POST"])
+@require_role(["health_official", "admin"])
 def add_checkup_for_worker(worker_id):
     worker = Worker.query.get_or_404(worker_id)
     
@@ -779,7 +1168,8 @@ def add_checkup_for_worker(worker_id):
             respiratory_rate=checkup_form.respiratory_rate.data,
             oxygen_saturation=checkup_form.oxygen_saturation.data,
             checkup_type=checkup_form.checkup_type.data,
-            geo_location=checkup_form.geo_location.data
+            geo_location=checkup_form.geo_location.data,
+            facility_id=current_user.facility.id if current_user.facility else None
         )
 
         checkup.hearing_test_result = HearingResultEnum(checkup.hearing_test_result) if checkup.hearing_test_result else None
@@ -835,10 +1225,11 @@ def add_checkup_for_worker(worker_id):
         db.session.add(ev)
         
         db.session.commit()
+        record_event(CREATE, "medical_checkup", checkup.id, remarks=f"worker {worker.id}")
         # --- End of copied logic ---
         
         flash(f"Medical checkup for {worker.first_name} saved successfully!", "success")
-        return redirect(url_for('view_worker_medical_records', worker_id=worker.id))
+        return redirect(url_for('facility.view_worker_medical_records', worker_id=worker.id))
 
     # Prefill on GET from the *specific worker's* latest checkup
     if request.method == 'GET':
@@ -858,7 +1249,178 @@ def add_checkup_for_worker(worker_id):
 # --- END OF NEW ROUTE ---
 
 
+# CLI Commands 
+
+def _on_every_shard(job, **kwargs) -> int:
+    """Runs a maintenance job on every shard (just the main database when unsharded) and adds up its counts."""
+    return sum(shard_router.fan_out(lambda: job(**kwargs)).values())
+
+
+@maintenance_bp.cli.command("archive-checkups")
+@click.option("--years", default=DEFAULT_ARCHIVE_AFTER_YEARS, show_default=True, help="Archive checkups older than this many years.")
+@click.option("--batch-size", default=1000, show_default=True)
+def archive_checkups_command(years, batch_size):
+    """Move archived and historical checkups into the cold *_archive tables."""
+    moved = _on_every_shard(archive_checkups, older_than_years=years, batch_size=batch_size)
+    click.echo(f"Archived {moved} checkups.")
+
+
+@maintenance_bp.cli.command("compact-activity-logs")
+@click.option("--days", default=DEFAULT_RETENTION_DAYS, show_default=True, help="Keep raw activity logs for this many days.")
+@click.option("--batch-size", default=5000, show_default=True)
+def compact_activity_logs_command(days, batch_size):
+    """Delete raw activity logs past the retention period, keeping their daily/weekly rollups."""
+    compacted = _on_every_shard(compact_activity_logs, older_than_days=days, batch_size=batch_size)
+    click.echo(f"Compacted {compacted} activity logs.")
+
+
+@maintenance_bp.cli.command("rebuild-activity-rollups")
+@click.option("--batch-size", default=5000, show_default=True, help="Workers per batch.")
+def rebuild_activity_rollups_command(batch_size):
+    """Recompute activity rollups from the raw logs still kept (after bulk loads)."""
+    rebuilt = _on_every_shard(rebuild_rollups, batch_size=batch_size)
+    click.echo(f"Rebuilt {rebuilt} activity rollups.")
+
+
+@maintenance_bp.cli.command("rebuild-clinical-index")
+@click.option("--batch-size", default=2000, show_default=True, help="Records per batch.")
+def rebuild_clinical_index_command(batch_size):
+    """Rebuild the full-text index of diagnoses, findings, recommendations and remarks."""
+    indexed = _on_every_shard(rebuild_clinical_index, batch_size=batch_size)
+    click.echo(f"Indexed {indexed} clinical records.")
+
+
+@maintenance_bp.cli.command("create-shards")
+def create_shards_command():
+    """Create the worker-data schema on every shard in SHARD_URLS."""
+    created = shard_router.create_schemas()
+    click.echo(f"Created shard schemas: {', '.join(created) or 'none (SHARD_URLS is not set)'}")
+
+
+@maintenance_bp.cli.command("distribute-workers")
+@click.option("--batch-size", default=200, show_default=True, help="Workers per batch.")
+def distribute_workers_command(batch_size):
+    """Move workers in the main database (and all their records) to their shards."""
+    moved = shard_router.distribute_workers(batch_size=batch_size)
+    click.echo(f"Moved workers: {moved or 'none'}")
+
+
+@maintenance_bp.cli.command("backfill-geo")
+@click.option("--batch-size", default=5000, show_default=True)
+def backfill_geo_command(batch_size):
+    """Parse geo_location into latitude/longitude/geohash for existing checkups."""
+    updated = _on_every_shard(backfill_geo, batch_size=batch_size)
+    click.echo(f"Indexed {updated} checkups.")
+
+
+@maintenance_bp.cli.command("rebuild-outbreak-counts")
+@click.option("--days", default=63, show_default=True, help="How many days of checkups to recount.")
+def rebuild_outbreak_counts_command(days):
+    """Recompute the daily positive result counts used by the outbreak detector."""
+    rebuilt = _on_every_shard(rebuild_counts, days=days)
+    click.echo(f"Rebuilt {rebuilt} daily counts.")
+
+
+@maintenance_bp.cli.command("rebuild-health-snapshots")
+@click.option("--batch-size", default=5000, show_default=True)
+def rebuild_health_snapshots_command(batch_size):
+    """Recompute every worker's latest-health snapshot (after bulk loads or upgrades)."""
+    rebuilt = _on_every_shard(rebuild_snapshots, batch_size=batch_size)
+    click.echo(f"Rebuilt {rebuilt} health snapshots.")
+
+
+@maintenance_bp.cli.command("send-follow-up-reminders")
+def send_follow_up_reminders_command():
+    """Emit reminder events for follow-ups that are due or overdue (run from cron)."""
+    emitted = follow_up_scheduler.emit_reminders()
+    click.echo(f"Emitted {emitted} follow-up reminders.")
+
+
+@maintenance_bp.cli.command("find-duplicate-workers")
+@click.option("--rebuild-index", is_flag=True, help="Rebuild the blocking index first (after bulk loads).")
+def find_duplicate_workers_command(rebuild_index):
+    """Score every pair of workers that share a blocking key and record probable duplicates."""
+    if rebuild_index:
+        indexed = _on_every_shard(rebuild_blocking_keys)
+        click.echo(f"Indexed {indexed} workers.")
+
+    def find():
+        found = find_duplicates()
+        db.session.commit()
+        return found
+
+    found = _on_every_shard(find)
+    click.echo(f"Found {found} new probable duplicates.")
+
+
+@maintenance_bp.cli.command("merge-workers")
+@click.argument("keep_id", type=int)
+@click.argument("duplicate_id", type=int)
+def merge_workers_command(keep_id, duplicate_id):
+    """Fold DUPLICATE_ID's records into KEEP_ID and remove the duplicate worker."""
+    with shard_router.for_worker(keep_id):
+        moved = merge_workers(keep_id, duplicate_id)
+    click.echo(f"Merged worker {duplicate_id} into {keep_id}: {moved}")
+
+
+@maintenance_bp.cli.command("generate-synthetic-data")
+@click.option("--workers", default=100000, show_default=True, help="Workers to add (each with a user account).")
+@click.option("--years", default=5, show_default=True, help="Years of history per worker.")
+@click.option("--seed", default=42, show_default=True, help="Same seed, same rows.")
+@click.option("--chunk-size", default=DEFAULT_CHUNK_SIZE, show_default=True)
+@click.option("--processes", type=int, default=None, help="Parallel writers (default: CPU count, 1 on SQLite).")
+@click.option("--password", default=DEFAULT_PASSWORD, show_default=True, help="Password of every generated account.")
+def generate_synthetic_data_command(workers, years, seed, chunk_size, processes, password):
+    """Bulk-load a reproducible synthetic population with multi-year medical histories (load testing only)."""
+    progress = lambda done, total: click.echo(f"  {done}/{total} workers", nl=done == total)
+    totals = generate_synthetic_data(workers, years=years, seed=seed, chunk_size=chunk_size, processes=processes,
+                                     password=password, progress=progress)
+    click.echo(", ".join(f"{count} {name}" for name, count in totals.items()))
+
+
+@maintenance_bp.cli.command("build-translations")
+def build_translations_command():
+    """Split translations.json into fingerprinted, precompressed per-language bundles."""
+    manifest = build_bundles()
+    click.echo(f"Built {len(manifest)} translation bundles: {', '.join(sorted(manifest.values()))}")
+
+
+# App factory
+
+def create_app(config=Config, **overrides):
+    """
+    Builds the application from a config object (see config.py) plus any
+    keyword overrides, e.g. create_app(TestingConfig) or
+    create_app(SQLALCHEMY_DATABASE_URI="sqlite://"). wsgi.py builds the
+    one gunicorn and the flask command serve.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config.update(overrides)
+
+    # data-translate-key strings are rendered server-side in the user's language
+    app.jinja_env.add_extension(TranslateKeyExtension)
+    app.jinja_env.globals["translate"] = translate
+    # Persistent bytecode for every template, {% cache %} for immutable fragments
+    fragment_cache.init_app(app)
+
+    csrf.init_app(app)
+    shard_router.init_app(app)  # adds the shards to SQLALCHEMY_BINDS
+    db.init_app(app)
+    login_manager.init_app(app)
+    audit_writer.init_app(app)
+    follow_up_scheduler.init_app(app)
+    request_metrics.init_app(app)
+    slow_query_log.init_app(app)
+    record_cache.init_app(app)
+
+    for blueprint in (main_bp, auth_bp, admin_bp, facility_bp, api_bp, maintenance_bp):
+        app.register_blueprint(blueprint)
+    return app
+
+
 if __name__ == "__main__":
+    app = create_app()
     with app.app_context():
         db.create_all()
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,166 @@
+import logging
+from datetime import date, datetime
+
+from sqlalchemy import select, insert, delete, exists, literal, or_
+from sqlalchemy.orm import aliased, selectinload
+
+from database import db
+from models import (
+    MedicalCheckup, LabResults, DoctorEvaluation,
+    ArchivedMedicalCheckup, ArchivedLabResults, ArchivedDoctorEvaluation,
+    MedicalCheckupColumns, LabResultsColumns, DoctorEvaluationColumns,
+    RecordStatusEnum, WorkerHealthSnapshot
+)
+from snapshot import refresh_snapshots
+from record_cache import invalidate_after_commit
+
+# Checkups older than this many years are moved to the *_archive tables.
+DEFAULT_ARCHIVE_AFTER_YEARS = 3
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _column_names(mixin):
+    return [name for name, value in vars(mixin).items() if isinstance(value, db.Column)]
+
+
+CHECKUP_COLUMNS = ["id", "worker_id"] + _column_names(MedicalCheckupColumns)
+LAB_COLUMNS = ["id", "checkup_id"] + _column_names(LabResultsColumns)
+EVALUATION_COLUMNS = ["id", "checkup_id"] + _column_names(DoctorEvaluationColumns)
+
+
+def archive_cutoff(years: int, today: date | None = None) -> date:
+    today = today or date.today()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # 29 February in a non leap year
+        return today.replace(year=today.year - years, day=28)
+
+
+def archivable_checkups_query(cutoff: date):
+    """
+    Ids of checkups that belong in cold storage: anything explicitly marked
+    ARCHIVED, plus checkups older than the cutoff that are not the worker's
+    latest one (the latest always stays hot for the dashboard and prefill).
+    """
+    newer = aliased(MedicalCheckup)
+    has_newer = exists().where(
+        newer.worker_id == MedicalCheckup.worker_id,
+        newer.date_of_checkup > MedicalCheckup.date_of_checkup
+    )
+    return (
+        select(MedicalCheckup.id)
+        .where(or_(
+            MedicalCheckup.record_status == RecordStatusEnum.ARCHIVED,
+            (MedicalCheckup.date_of_checkup < cutoff) & has_newer
+        ))
+        .order_by(MedicalCheckup.id)
+    )
+
+
+def _move_batch(checkup_ids):
+    """Copy one batch of checkups with their children into the archive and delete them from the hot tables."""
+    archived_on = datetime.utcnow()
+
+    # record_status is forced to ARCHIVED on the way into cold storage
+    checkup_values = [
+        literal(RecordStatusEnum.ARCHIVED, ArchivedMedicalCheckup.record_status.type) if c == "record_status"
+        else getattr(MedicalCheckup, c)
+        for c in CHECKUP_COLUMNS
+    ]
+    db.session.execute(
+        insert(ArchivedMedicalCheckup).from_select(
+            CHECKUP_COLUMNS + ["archived_on"],
+            select(*checkup_values, literal(archived_on, db.DateTime)).where(MedicalCheckup.id.in_(checkup_ids))
+        )
+    )
+    db.session.execute(
+        insert(ArchivedLabResults).from_select(
+            LAB_COLUMNS,
+            select(*[getattr(LabResults, c) for c in LAB_COLUMNS]).where(LabResults.checkup_id.in_(checkup_ids))
+        )
+    )
+    db.session.execute(
+        insert(ArchivedDoctorEvaluation).from_select(
+            EVALUATION_COLUMNS,
+            select(*[getattr(DoctorEvaluation, c) for c in EVALUATION_COLUMNS]).where(DoctorEvaluation.checkup_id.in_(checkup_ids))
+        )
+    )
+
+    invalidate_after_commit(db.session, db.session.scalars(
+        select(MedicalCheckup.worker_id).where(MedicalCheckup.id.in_(checkup_ids)).distinct()
+    ))
+    # Children first so the foreign keys on the hot tables stay valid
+    db.session.execute(delete(LabResults).where(LabResults.checkup_id.in_(checkup_ids)))
+    db.session.execute(delete(DoctorEvaluation).where(DoctorEvaluation.checkup_id.in_(checkup_ids)))
+    db.session.execute(delete(MedicalCheckup).where(MedicalCheckup.id.in_(checkup_ids)))
+
+    # Checkups marked Archived can be a worker's latest one
+    stale = db.session.scalars(
+        select(WorkerHealthSnapshot.worker_id).where(WorkerHealthSnapshot.latest_checkup_id.in_(checkup_ids))
+    ).all()
+    refresh_snapshots(stale)
+
+
+def archive_checkups(older_than_years: int = DEFAULT_ARCHIVE_AFTER_YEARS,
+                     batch_size: int = DEFAULT_BATCH_SIZE,
+                     today: date | None = None) -> int:
+    """
+    Moves archived or historical checkups (with their lab results and doctor
+    evaluations) out of the hot tables. Works in id-ordered batches, one
+    commit per batch, so it can be interrupted and re-run safely.
+    Returns the number of checkups moved.
+    """
+    cutoff = archive_cutoff(older_than_years, today)
+    query = archivable_checkups_query(cutoff).limit(batch_size)
+    moved = 0
+    last_id = 0
+
+    while True:
+        checkup_ids = db.session.scalars(query.where(MedicalCheckup.id > last_id)).all()
+        if not checkup_ids:
+            break
+        try:
+            _move_batch(checkup_ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(checkup_ids)
+        last_id = checkup_ids[-1]
+        logging.info(f"Archived {moved} checkups (up to id {last_id}).")
+
+    return moved
+
+
+def checkups_for_worker(worker_id: int, full_history: bool = False):
+    """
+    A worker's checkups, newest first. Only the hot table is read unless the
+    caller explicitly asks for the full history, in which case archived
+    checkups are read through and merged in. Archived rows expose the same
+    attributes (lab_results, doctor_evaluation, ...) as live ones.
+    """
+    checkups = db.session.scalars(
+        select(MedicalCheckup)
+        .where(MedicalCheckup.worker_id == worker_id)
+        .options(selectinload(MedicalCheckup.lab_results), selectinload(MedicalCheckup.doctor_evaluation))
+        .order_by(MedicalCheckup.date_of_checkup.desc())
+    ).all()
+
+    if not full_history:
+        return checkups
+
+    archived = db.session.scalars(
+        select(ArchivedMedicalCheckup)
+        .where(ArchivedMedicalCheckup.worker_id == worker_id)
+        .options(selectinload(ArchivedMedicalCheckup.lab_results), selectinload(ArchivedMedicalCheckup.doctor_evaluation))
+        .order_by(ArchivedMedicalCheckup.date_of_checkup.desc())
+    ).all()
+
+    return sorted(list(checkups) + list(archived), key=lambda c: c.date_of_checkup or date.min, reverse=True)
+
+
+def archived_checkup_count(worker_id: int) -> int:
+    return db.session.scalar(
+        select(db.func.count()).select_from(ArchivedMedicalCheckup).where(ArchivedMedicalCheckup.worker_id == worker_id)
+    )
@@ -0,0 +1,163 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context
+from flask_login import current_user
+from sqlalchemy import insert
+
+from database import db
+from models import AuditTrail
+
+# Actions written to AuditTrail.action
+VIEW = "view"
+CREATE = "create"
+UPDATE = "update"
+DENIED = "access_denied"
+
+
+class AuditWriter:
+    """
+    Buffers audit events in memory and writes them to the audit_trail table
+    in batched inserts from a background thread, so recording an event never
+    costs the request a commit.
+
+    At most `flush_interval` seconds of events (bounded by `queue_size`) can
+    be lost if the process dies without running its atexit hook. When the
+    queue is full new events are dropped and counted rather than blocking
+    the request; the counters are exposed through `metrics()`.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._flush_at_exit = False
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stats = dict(enqueued=0, written=0, dropped=0, failed=0, flushes=0,
+                           max_queue_depth=0, last_flush_ms=0.0, last_flush_at=None)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("AUDIT_ENABLED", True)
+        app.config.setdefault("AUDIT_BATCH_SIZE", 200)
+        app.config.setdefault("AUDIT_FLUSH_INTERVAL", 2.0)
+        app.config.setdefault("AUDIT_QUEUE_SIZE", 10000)
+        self.app = app
+        self.batch_size = app.config["AUDIT_BATCH_SIZE"]
+        self.flush_interval = app.config["AUDIT_FLUSH_INTERVAL"]
+        self._queue = queue.Queue(maxsize=app.config["AUDIT_QUEUE_SIZE"])
+        app.extensions["audit"] = self
+        # Once per process, however many apps are created (tests, benchmarks, CLI)
+        if not self._flush_at_exit:
+            atexit.register(self.flush)
+            self._flush_at_exit = True
+
+    def record(self, action: str, entity_type: str, entity_id: int, remarks: str | None = None, actor_user_id: int | None = None):
+        """Queues one audit event. Never blocks and never touches the database."""
+        if self.app is None or not self.app.config["AUDIT_ENABLED"]:
+            return
+        if actor_user_id is None and has_request_context() and current_user.is_authenticated:
+            actor_user_id = current_user.id
+
+        self._ensure_thread()
+        event = dict(
+            entity_type=entity_type,
+            entity_id=int(entity_id),
+            action=action,
+            actor_user_id=actor_user_id,
+            timestamp=datetime.utcnow(),
+            remarks=remarks
+        )
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats["enqueued"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Writes everything currently queued. Safe to call from any thread."""
+        written = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                return written
+            self._write(batch)
+            written += len(batch)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        stats["queue_capacity"] = self._queue.maxsize if self._queue is not None else 0
+        return stats
+
+    # Internals
+
+    def _ensure_thread(self):
+        # Threads do not survive a fork, so gunicorn workers each start their own.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Audit writer flush failed: {e}")
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(insert(AuditTrail), batch)
+        except Exception as e:
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            logging.error(f"Could not write {len(batch)} audit events: {e}")
+            return
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["flushes"] += 1
+            self._stats["last_flush_ms"] = (time.perf_counter() - started) * 1000
+            self._stats["last_flush_at"] = datetime.utcnow().isoformat()
+
+
+audit_writer = AuditWriter()
+
+
+def record_event(action: str, entity_type: str, entity_id: int, remarks: str | None = None):
+    audit_writer.record(action, entity_type, entity_id, remarks)
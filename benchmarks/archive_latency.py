@@ -0,0 +1,128 @@
+"""
+Hot-table latency before and after archiving historical checkups.
+
+Seeds a database with workers that each have a multi-year checkup history,
+times the per-worker checkup query used by the medical records page, runs
+the archival job and times the same query again.
+
+    python benchmarks/archive_latency.py --workers 100000 --checkups-per-worker 20
+
+Uses BENCH_DATABASE_URL if set (e.g. a scratch MySQL schema), otherwise a
+SQLite file next to this script. The database is dropped and recreated.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from database import db
+from models import (
+    User, Worker, MedicalCheckup, LabResults, DoctorEvaluation,
+    GenderEnum, OccupationEnum, UserRoleEnum, RecordStatusEnum
+)
+from archival import archive_checkups, checkups_for_worker
+
+
+def make_app():
+    app = Flask(__name__)
+    default_url = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive_bench.db")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("BENCH_DATABASE_URL", default_url)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n_workers, checkups_per_worker, years, chunk=5000):
+    rng = random.Random(42)
+    today = date.today()
+    checkup_id = 0
+
+    for start in range(1, n_workers + 1, chunk):
+        ids = range(start, min(start + chunk, n_workers + 1))
+        db.session.execute(insert(User), [
+            {"id": i, "username": f"bench{i}", "email": f"bench{i}@example.com",
+             "password_hash": "x", "role": UserRoleEnum.NORMAL_USER} for i in ids
+        ])
+        db.session.execute(insert(Worker), [
+            {"id": i, "user_id": i, "first_name": f"Worker{i}", "age": rng.randint(18, 60),
+             "gender": GenderEnum.MALE, "occupation": OccupationEnum.CONSTRUCTION} for i in ids
+        ])
+
+        checkups, labs, evaluations = [], [], []
+        for worker_id in ids:
+            for _ in range(checkups_per_worker):
+                checkup_id += 1
+                checkups.append({
+                    "id": checkup_id, "worker_id": worker_id,
+                    "date_of_checkup": today - timedelta(days=rng.randint(0, years * 365)),
+                    "blood_pressure_systolic": rng.randint(100, 160),
+                    "blood_pressure_diastolic": rng.randint(60, 100),
+                    "record_status": RecordStatusEnum.ACTIVE,
+                })
+                labs.append({"id": checkup_id, "checkup_id": checkup_id, "hemoglobin_g_dl": rng.uniform(9, 16)})
+                evaluations.append({"id": checkup_id, "checkup_id": checkup_id, "diagnosis": "Routine"})
+        db.session.execute(insert(MedicalCheckup), checkups)
+        db.session.execute(insert(LabResults), labs)
+        db.session.execute(insert(DoctorEvaluation), evaluations)
+        db.session.commit()
+        print(f"  seeded {ids[-1]}/{n_workers} workers", end="\r")
+    print()
+
+
+def time_reads(worker_ids):
+    samples = []
+    for worker_id in worker_ids:
+        db.session.expunge_all()
+        started = time.perf_counter()
+        checkups_for_worker(worker_id)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[int(len(samples) * 0.95) - 1],
+        "max": samples[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=20000)
+    parser.add_argument("--checkups-per-worker", type=int, default=20)
+    parser.add_argument("--history-years", type=int, default=10)
+    parser.add_argument("--archive-after-years", type=int, default=3)
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        total = args.workers * args.checkups_per_worker
+        print(f"Seeding {args.workers} workers / {total} checkups ...")
+        seed(args.workers, args.checkups_per_worker, args.history_years)
+
+        sample_ids = random.Random(7).sample(range(1, args.workers + 1), min(args.samples, args.workers))
+        before = time_reads(sample_ids)
+
+        started = time.perf_counter()
+        moved = archive_checkups(older_than_years=args.archive_after_years, batch_size=5000)
+        archive_seconds = time.perf_counter() - started
+
+        after = time_reads(sample_ids)
+
+    print(f"Archived {moved}/{total} checkups in {archive_seconds:.1f}s")
+    print(f"{'':8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for label, stats in (("before", before), ("after", after)):
+        print(f"{label:8}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['max']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
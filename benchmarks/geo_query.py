@@ -0,0 +1,119 @@
+"""
+Radius and bounding-box checkup lookups: geohash index vs. scanning and
+parsing every geo_location string.
+
+    python benchmarks/geo_query.py --checkups 1000000
+
+Uses BENCH_DATABASE_URL if set, otherwise a SQLite file next to this
+script. The database is dropped and recreated.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+
+from database import db
+from models import User, Worker, MedicalCheckup, GenderEnum, OccupationEnum, UserRoleEnum
+from geo import (
+    parse_geo_location, geohash_encode, haversine_km,
+    checkups_within_radius, checkups_in_box
+)
+
+# Roughly Kerala
+LAT_RANGE = (8.2, 12.8)
+LON_RANGE = (74.8, 77.4)
+
+
+def make_app():
+    app = Flask(__name__)
+    default_url = "sqlite:///" + os.path.join(os.path.dirname(os.path.abspath(__file__)), "geo_bench.db")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("BENCH_DATABASE_URL", default_url)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+
+def seed(n_checkups, n_workers=1000, chunk=20000):
+    rng = random.Random(42)
+    db.session.execute(insert(User), [
+        {"id": i, "username": f"geo{i}", "email": f"geo{i}@example.com", "password_hash": "x",
+         "role": UserRoleEnum.NORMAL_USER} for i in range(1, n_workers + 1)
+    ])
+    db.session.execute(insert(Worker), [
+        {"id": i, "user_id": i, "first_name": f"Worker{i}", "age": 30,
+         "gender": GenderEnum.MALE, "occupation": OccupationEnum.CONSTRUCTION} for i in range(1, n_workers + 1)
+    ])
+    today = date.today()
+    for start in range(0, n_checkups, chunk):
+        rows = []
+        for _ in range(min(chunk, n_checkups - start)):
+            lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+            rows.append({
+                "worker_id": rng.randint(1, n_workers),
+                "date_of_checkup": today - timedelta(days=rng.randint(0, 1000)),
+                "geo_location": f"{lat:.5f}, {lon:.5f}",
+                "latitude": lat, "longitude": lon, "geohash": geohash_encode(lat, lon),
+            })
+        db.session.execute(insert(MedicalCheckup), rows)
+        db.session.commit()
+        print(f"  seeded {start + len(rows)}/{n_checkups} checkups", end="\r")
+    print()
+
+
+def scan_radius(lat, lon, radius_km):
+    """What a radius query costs without the index: parse every row."""
+    hits = []
+    for checkup_id, text in db.session.execute(select(MedicalCheckup.id, MedicalCheckup.geo_location)):
+        parsed = parse_geo_location(text)
+        if parsed and haversine_km(lat, lon, *parsed) <= radius_km:
+            hits.append(checkup_id)
+    return hits
+
+
+def timed(fn, repeats):
+    samples, result = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checkups", type=int, default=1000000)
+    parser.add_argument("--radius-km", type=float, default=5.0)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    app = make_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"Seeding {args.checkups} checkups ...")
+        seed(args.checkups)
+
+        rng = random.Random(7)
+        centers = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.repeats)]
+        it = iter(centers * 2)
+
+        radius_ms, hits = timed(lambda: checkups_within_radius(*next(it), args.radius_km, limit=100000), args.repeats)
+        box_ms, box_hits = timed(lambda: checkups_in_box(10.0, 76.2, 10.1, 76.3, limit=100000), args.repeats)
+        scan_ms, scan_hits = timed(lambda: scan_radius(*centers[-1], args.radius_km), 1)
+
+    print(f"{args.checkups} checkups, radius {args.radius_km} km")
+    print(f"  indexed radius query   median {radius_ms:9.2f} ms  ({len(hits)} hits, last run)")
+    print(f"  indexed bbox query     median {box_ms:9.2f} ms  ({len(box_hits)} hits)")
+    print(f"  full scan + parse             {scan_ms:9.2f} ms  ({len(scan_hits)} hits)")
+
+
+if __name__ == "__main__":
+    main()
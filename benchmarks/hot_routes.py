@@ -0,0 +1,261 @@
+"""
+Latency and SQL statements per request for the hot routes of the real app,
+against a seeded synthetic population.
+
+    python benchmarks/hot_routes.py --workers 20000 --requests 200
+    python benchmarks/hot_routes.py --update-baseline
+
+Covers worker search, a worker's medical records, the worker dashboard,
+checkup submission by a facility and report generation. Ollama is replaced
+by a fake that answers after --llm-latency-ms, and WeasyPrint by one that
+returns a fixed PDF, so report timings cover the prompt, the database reads
+and the report template but not PDF layout (or the Pango install).
+
+Uses BENCH_DATABASE_URL if set, otherwise a SQLite file next to this script.
+The database is dropped and recreated. p95 latency and the most statements
+any request issued are compared with hot_routes_baseline.json: the run
+exits 1 if a route got slower than --tolerance allows or issues more
+statements, and also if there is no baseline to compare with. Record the
+baseline on the reference machine with --update-baseline and commit it.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DATABASE_URL = os.getenv("BENCH_DATABASE_URL", "sqlite:///" + os.path.join(ROOT, "benchmarks", "hot_routes_bench.db"))
+
+from sqlalchemy import insert, event
+
+import ai_service
+from app import create_app
+from database import db
+from models import (
+    User, Worker, HealthcareFacility, MedicalCheckup, LabResults, DoctorEvaluation, Vaccination, MedicalVisit,
+    ActivityLog, GenderEnum, OccupationEnum, UserRoleEnum, CheckupTypeEnum, PositiveNegativeEnum,
+    NormalAbnormalEnum, FitnessStatusEnum
+)
+
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "hot_routes_baseline.json")
+FIRST_NAMES = ["Ravi", "Suresh", "Amit", "Mohan", "Santosh", "Deepak", "Manoj", "Arjun", "Kiran", "Priya",
+               "Lakshmi", "Vijay", "Harish", "Bimal", "Gopal", "Jaya", "Nandini", "Shankar", "Tarun", "Rupa"]
+LAST_NAMES = ["Kumar", "Singh", "Yadav", "Das", "Mondal", "Sheikh", "Paswan", "Mahto", "Ali", "Sahu",
+              "Nayak", "Behera", "Rai", "Mandal", "Ansari", "Khatun", "Majhi", "Oraon", "Munda", "Tudu"]
+STATES = ["Bihar", "West Bengal", "Odisha", "Assam", "Jharkhand", "Uttar Pradesh", "Tamil Nadu", "Rajasthan"]
+DIAGNOSES = ["No significant findings", "Mild anaemia", "Contact dermatitis", "Lower back strain",
+             "Upper respiratory infection", "Elevated blood pressure", "Fungal skin infection"]
+FAKE_REPORT = (
+    "Summary\n- Vitals within normal limits for age.\n- Haemoglobin slightly low; iron-rich diet advised.\n"
+    "Recommendations\n- Use PPE on site.\n- Repeat blood test in 3 months.\n"
+)
+
+ADMIN_ID, OFFICIAL_ID = 1, 2
+
+app = create_app(SQLALCHEMY_DATABASE_URI=DATABASE_URL, WTF_CSRF_ENABLED=False)
+
+
+class FakeOllama:
+    """Stands in for the ollama module: a canned report after a fixed delay."""
+
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+
+    def chat(self, model, messages):
+        time.sleep(self.latency_s)
+        return {"message": {"content": FAKE_REPORT}}
+
+
+class FakeWeasyPrint:
+    """Stands in for the weasyprint module: HTML(string=...).write_pdf() writes a fixed, minimal PDF."""
+
+    class HTML:
+        def __init__(self, string=None, **kwargs):
+            self.string = string
+
+        def write_pdf(self, target):
+            target.write(b"%PDF-1.4\n%%EOF\n")
+
+
+def seed(n_workers, checkups_per_worker, chunk=5000):
+    """Admin (user 1), a facility official (user 2) and workers from user 3 on."""
+    rng = random.Random(42)
+    db.session.execute(insert(User), [
+        dict(id=ADMIN_ID, username="bench_admin", email="admin@bench.local", password_hash="x", role=UserRoleEnum.ADMIN),
+        dict(id=OFFICIAL_ID, username="bench_official", email="official@bench.local", password_hash="x",
+             role=UserRoleEnum.HEALTH_OFFICIAL),
+    ])
+    db.session.execute(insert(HealthcareFacility), [dict(
+        id=1, registered_by_user_id=OFFICIAL_ID, facility_name="Bench PHC", facility_license_number="BENCH-1",
+        facility_city="Kochi",
+    )])
+    today = date.today()
+    checkup_id = 0
+    for start in range(0, n_workers, chunk):
+        users, workers, checkups, labs, evaluations, vaccinations, visits, activities = [], [], [], [], [], [], [], []
+        for worker_id in range(start + 1, min(start + chunk, n_workers) + 1):
+            user_id = worker_id + OFFICIAL_ID
+            users.append(dict(id=user_id, username=f"bench{worker_id}", email=f"bench{worker_id}@bench.local",
+                              password_hash="x", role=UserRoleEnum.NORMAL_USER))
+            workers.append(dict(
+                id=worker_id, user_id=user_id, first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                age=rng.randint(18, 60), gender=rng.choice(list(GenderEnum)), occupation=rng.choice(list(OccupationEnum)),
+                phone=f"9{worker_id:09d}", home_state=rng.choice(STATES),
+            ))
+            for i in range(checkups_per_worker):
+                checkup_id += 1
+                checkups.append(dict(
+                    id=checkup_id, worker_id=worker_id, date_of_checkup=today - timedelta(days=180 * i + rng.randint(0, 90)),
+                    height_cm=rng.gauss(165, 8), weight_kg=rng.gauss(62, 9), bmi=rng.gauss(22.5, 3),
+                    blood_pressure_systolic=rng.randint(105, 160), blood_pressure_diastolic=rng.randint(65, 100),
+                    pulse_rate=rng.randint(60, 100), checkup_type=rng.choice(list(CheckupTypeEnum)), facility_id=1,
+                ))
+                labs.append(dict(
+                    checkup_id=checkup_id, hemoglobin_g_dl=rng.gauss(13, 1.5), blood_sugar_fasting=rng.gauss(95, 15),
+                    tuberculosis_screening_result=PositiveNegativeEnum.POSITIVE if rng.random() < 0.02 else PositiveNegativeEnum.NEGATIVE,
+                    urine_test_result=rng.choice(list(NormalAbnormalEnum)),
+                ))
+                evaluations.append(dict(
+                    checkup_id=checkup_id, doctor_name="Dr. Bench", diagnosis=rng.choice(DIAGNOSES),
+                    fitness_status=FitnessStatusEnum.FIT, follow_up_required=rng.random() < 0.1,
+                ))
+            vaccinations.append(dict(worker_id=worker_id, vaccine_name="Tetanus", dose_number=1,
+                                     date_administered=today - timedelta(days=rng.randint(0, 1500))))
+            visits.append(dict(worker_id=worker_id, facility_id=1, visit_date=today - timedelta(days=rng.randint(0, 700)),
+                               diagnosis=rng.choice(DIAGNOSES)))
+            activities.append(dict(worker_id=worker_id, activity_type="Walking", duration_minutes=rng.randint(10, 90)))
+        for model, rows in ((User, users), (Worker, workers), (MedicalCheckup, checkups), (LabResults, labs),
+                            (DoctorEvaluation, evaluations), (Vaccination, vaccinations), (MedicalVisit, visits),
+                            (ActivityLog, activities)):
+            if rows:
+                db.session.execute(insert(model), rows)
+        db.session.commit()
+        print(f"  seeded {start + len(workers)}/{n_workers} workers", end="\r")
+    print()
+
+
+def checkup_form(rng):
+    return {
+        "date_of_checkup": date.today().isoformat(), "height_cm": "168", "weight_kg": "64", "bmi": "22.7",
+        "blood_pressure_systolic": str(rng.randint(110, 150)), "blood_pressure_diastolic": "80", "pulse_rate": "76",
+        "hearing_test_result": "Normal", "checkup_type": "Periodic", "geo_location": "9.9312, 76.2673",
+        "hemoglobin_g_dl": "13.1", "blood_sugar_fasting": "92", "hiv_test_result": "Negative",
+        "hepatitis_b_result": "Negative", "hepatitis_c_result": "Negative", "tuberculosis_screening_result": "Negative",
+        "malaria_test_result": "Negative", "urine_test_result": "Normal", "xray_chest_result": "Normal",
+        "ecg_result": "Normal", "doctor_name": "Dr. Bench", "diagnosis": "No significant findings",
+        "fitness_status": "Fit",
+    }
+
+
+def scenarios(n_workers, rng):
+    """route name -> function returning (user_id, method, url, form data) for one request."""
+    worker = lambda: rng.randint(1, n_workers)
+    return {
+        "search_workers": lambda: (ADMIN_ID, "GET", f"/search-workers?q={rng.choice(LAST_NAMES)[:4]}{rng.randint(0, 9)}", None),
+        "view_worker_medical_records": lambda: (ADMIN_ID, "GET", f"/worker/{worker()}/medical-records", None),
+        "dashboard": lambda: (worker() + OFFICIAL_ID, "GET", "/dashboard", None),
+        "add_checkup_for_worker": lambda: (OFFICIAL_ID, "POST", f"/worker/{worker()}/add-checkup", checkup_form(rng)),
+        "generate_report": lambda: (worker() + OFFICIAL_ID, "GET", "/generate-report", None),
+    }
+
+
+def run(n_workers, n_requests, warmup):
+    """Call outside an app context, so every request gets its own session like in production."""
+    rng = random.Random(7)
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(1))
+    client = app.test_client()
+    results = {}
+    for name, make_request in scenarios(n_workers, rng).items():
+        latencies, counts = [], []
+        for i in range(warmup + n_requests):
+            user_id, method, url, data = make_request()
+            with client.session_transaction() as session:
+                session["_user_id"] = str(user_id)
+                session["_fresh"] = True
+            statements.clear()
+            started = time.perf_counter()
+            response = client.open(url, method=method, data=data)
+            elapsed = time.perf_counter() - started
+            if response.status_code != (302 if method == "POST" else 200):
+                raise SystemExit(f"{name}: {method} {url} returned {response.status_code}")
+            if i >= warmup:
+                latencies.append(elapsed * 1000)
+                counts.append(len(statements))
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        results[name] = dict(
+            p50_ms=round(percentiles[49], 2), p95_ms=round(percentiles[94], 2), p99_ms=round(percentiles[98], 2),
+            mean_ms=round(statistics.fmean(latencies), 2),
+            statements_median=statistics.median(counts), statements=max(counts),
+        )
+    return results
+
+
+def compare(results, baseline, population, tolerance):
+    """Regressions against the baseline, as messages."""
+    if baseline.get("population") != population:
+        print(f"Baseline was recorded for {baseline.get('population')}, not {population}: not comparing.")
+        return []
+    regressions = []
+    for name, result in results.items():
+        expected = baseline["routes"].get(name)
+        if expected is None:
+            continue
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms vs baseline {expected['p95_ms']} ms")
+        if result["statements"] > expected["statements"]:
+            regressions.append(f"{name}: {result['statements']} statements vs baseline {expected['statements']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=20000)
+    parser.add_argument("--checkups-per-worker", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per route.")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown (0.25 = 25%%).")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    ai_service.ollama = FakeOllama(args.llm_latency_ms / 1000)
+    # pdf_gen imports weasyprint on the first report, so this is the module it gets
+    sys.modules["weasyprint"] = FakeWeasyPrint()
+    population = dict(workers=args.workers, checkups_per_worker=args.checkups_per_worker)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print(f"Seeding {args.workers} workers with {args.checkups_per_worker} checkups each ...")
+        seed(args.workers, args.checkups_per_worker)
+    results = run(args.workers, args.requests, args.warmup)
+
+    print(f"{'route':30} {'p50':>9} {'p95':>9} {'p99':>9} {'mean':>9} {'stmts':>7}")
+    for name, r in results.items():
+        print(f"{name:30} {r['p50_ms']:7.2f}ms {r['p95_ms']:7.2f}ms {r['p99_ms']:7.2f}ms {r['mean_ms']:7.2f}ms "
+              f"{r['statements_median']:>3g}/{r['statements']:<3}")
+
+    if args.update_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(dict(population=population, routes=results), f, indent=2)
+        print(f"Baseline written to {BASELINE_FILE}")
+        return
+    if not os.path.exists(BASELINE_FILE):
+        print(f"No baseline at {BASELINE_FILE}: record one with --update-baseline.")
+        sys.exit(1)
+    with open(BASELINE_FILE) as f:
+        regressions = compare(results, json.load(f), population, args.tolerance)
+    for message in regressions:
+        print(f"REGRESSION {message}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
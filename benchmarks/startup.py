@@ -0,0 +1,87 @@
+"""
+Import and boot time of the app, the way a fresh gunicorn worker or test
+process pays it.
+
+    python benchmarks/startup.py --runs 20
+    python benchmarks/startup.py --eager
+
+Each run is a new interpreter that imports app, calls create_app() and
+serves the home page once, against an in-memory SQLite database. Reports
+the median of every phase and whether WeasyPrint and ollama got loaded.
+--eager imports both up front, as app.py did before they were loaded on
+first use, to show what they cost (a library that cannot be imported on
+this machine, e.g. WeasyPrint without Pango, is reported as unavailable).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("weasyprint", "ollama")
+
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+timings, unavailable = {{}}, []
+started = time.perf_counter()
+for name in {eager!r}:
+    try:
+        __import__(name)
+    except Exception:
+        unavailable.append(name)
+timings["eager_imports"] = time.perf_counter() - started
+
+started = time.perf_counter()
+import app
+timings["import_app"] = time.perf_counter() - started
+
+started = time.perf_counter()
+application = app.create_app(SQLALCHEMY_DATABASE_URI="sqlite://", AUDIT_ENABLED=False)
+timings["create_app"] = time.perf_counter() - started
+
+started = time.perf_counter()
+status = application.test_client().get("/").status_code
+timings["first_request"] = time.perf_counter() - started
+
+print(json.dumps(dict(timings=timings, status=status, unavailable=unavailable,
+                      loaded=[name for name in {heavy!r} if name in sys.modules])))
+"""
+
+
+def probe(eager: bool) -> dict:
+    code = PROBE.format(root=ROOT, eager=HEAVY if eager else (), heavy=HEAVY)
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["timings"]["process"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--eager", action="store_true", help="Import WeasyPrint and ollama before the app.")
+    args = parser.parse_args()
+
+    probe(args.eager)  # warm the OS file cache and __pycache__
+    results = [probe(args.eager) for _ in range(args.runs)]
+    if results[0]["status"] != 200:
+        raise SystemExit(f"GET / returned {results[0]['status']}")
+
+    phases = ["eager_imports", "import_app", "create_app", "first_request", "process"] if args.eager else \
+             ["import_app", "create_app", "first_request", "process"]
+    print(f"{'phase':16} {'median':>10} {'min':>10}")
+    for phase in phases:
+        values = [r["timings"][phase] * 1000 for r in results]
+        print(f"{phase:16} {statistics.median(values):8.1f}ms {min(values):8.1f}ms")
+    print(f"heavy modules loaded: {', '.join(results[0]['loaded']) or 'none'}")
+    if results[0]["unavailable"]:
+        print(f"unavailable here: {', '.join(results[0]['unavailable'])}")
+
+
+if __name__ == "__main__":
+    main()
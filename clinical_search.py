@@ -0,0 +1,357 @@
+import logging
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import date
+from functools import partial
+
+from sqlalchemy import select, insert, update, delete, func, event, case, or_
+
+from database import db
+from models import (
+    Worker, MedicalVisit, MedicalCheckup, DoctorEvaluation, ArchivedMedicalCheckup, ArchivedDoctorEvaluation,
+    ClinicalTerm
+)
+from sharding import shard_router
+
+VISIT = "visit"
+EVALUATION = "evaluation"
+
+# A term in a diagnosis counts three times as much as one in the notes
+VISIT_FIELDS = {"diagnosis": 3.0}
+EVALUATION_FIELDS = {"diagnosis": 3.0, "general_physical_findings": 1.0, "recommendations": 1.0, "remarks": 1.0}
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+MAX_PREFIX_TERMS = 50       # index terms a `prefix*` query term expands to, most frequent first
+SNIPPET_LENGTH = 160
+RECORD_COUNT_TTL = 600      # seconds the per-shard record count used for idf is reused
+DEFAULT_BATCH_SIZE = 2000
+IN_CHUNK = 1000
+
+_WORDS = re.compile(r"[^\W_]+")
+_REPEATS = re.compile(r"(.)\1+")
+# A prefix ending in the first letter of a folded pair may stop halfway through it: "whe*" is "vhe" or "vhi"
+_PAIR_STARTS = {"e": "i", "o": "u", "p": "f"}
+_STOPWORDS = frozenset(
+    "a an and any are as at be been by for from has have in is it its of on or the to was were with "
+    "no not nil na none patient pt".split()
+)
+
+
+# Tokenization
+
+def _fold_spelling(word: str) -> str:
+    """_fold without the plural endings, so it also applies to the start of a word."""
+    word = word.replace("ee", "i").replace("oo", "u")
+    word = _REPEATS.sub(r"\1", word)
+    return word.replace("ph", "f").replace("w", "v").replace("z", "j")
+
+
+def _fold(word: str) -> str:
+    """
+    Spelling variants of transliterated Hindi/Malayalam/Tamil terms and of
+    English plurals collapse to one term: bukhaar/bukhar, theek/thik,
+    khaansi/khansi, lesions/lesion. Only applied to Latin-script words.
+    """
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")) and len(word) > 3:
+        word = word[:-1]
+    return _fold_spelling(word)
+
+
+def normalise(word: str, prefix: bool = False) -> str | None:
+    """
+    The index term of one word, or None for stop words and single characters.
+    A `prefix` keeps its ending: spelling variants are folded, plurals are not.
+    """
+    word = unicodedata.normalize("NFKC", word).casefold()
+    plain = "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c))
+    if plain.isascii():
+        # Accents are dropped from Latin words only: Indic vowel signs are combining marks too
+        word = plain
+        if word in _STOPWORDS or len(word) < 2:
+            return None
+        if not word.isdigit():
+            word = _fold_spelling(word) if prefix else _fold(word)
+    return word[:MAX_TERM_LENGTH] or None
+
+
+def terms(text: str | None) -> Counter:
+    """Index terms of a text with their counts."""
+    return Counter(filter(None, (normalise(word) for word in _WORDS.findall(text or ""))))
+
+
+def parse_query(query: str) -> list[tuple[str, bool]]:
+    """(term, is_prefix) pairs of a query; `derm*` matches every term starting with "derm"."""
+    parsed = []
+    for word in _WORDS.finditer(query or ""):
+        prefix = query[word.end():word.end() + 1] == "*"
+        term = normalise(word.group(), prefix=prefix)
+        if term and (term, prefix) not in parsed:
+            parsed.append((term, prefix))
+    return parsed[:MAX_QUERY_TERMS]
+
+
+def _prefix_forms(term: str) -> tuple[str, ...]:
+    """The folded beginnings an index term matching the prefix `term` can have."""
+    if term[-1] in _PAIR_STARTS and term.isascii():
+        return term, term[:-1] + _PAIR_STARTS[term[-1]]
+    return (term,)
+
+
+def _weights(row, fields) -> dict[str, float]:
+    weights = defaultdict(float)
+    for field, field_weight in fields.items():
+        for term, count in terms(getattr(row, field)).items():
+            weights[term] += field_weight * (1 + math.log(count))
+    return weights
+
+
+# Index maintenance
+
+def _index_rows(executor, source, fields, records):
+    """Replaces the index rows of `records` (rows with id, worker_id, record_date and the text fields)."""
+    records = list(records)
+    ids = [record.id for record in records]
+    for chunk in range(0, len(ids), IN_CHUNK):
+        executor.execute(delete(ClinicalTerm).where(
+            ClinicalTerm.source == source, ClinicalTerm.record_id.in_(ids[chunk:chunk + IN_CHUNK])
+        ))
+    rows = [
+        dict(term=term, source=source, record_id=record.id, worker_id=record.worker_id,
+             record_date=record.record_date, weight=weight)
+        for record in records if record.worker_id is not None
+        for term, weight in _weights(record, fields).items()
+    ]
+    if rows:
+        executor.execute(insert(ClinicalTerm), rows)
+    return len(rows)
+
+
+def _visit_rows(*criteria):
+    return select(MedicalVisit.id, MedicalVisit.worker_id, MedicalVisit.visit_date.label("record_date"),
+                  MedicalVisit.diagnosis).where(*criteria)
+
+
+def _evaluation_rows(evaluation, checkup, *criteria):
+    return (
+        select(evaluation.id, checkup.worker_id, checkup.date_of_checkup.label("record_date"),
+               *[getattr(evaluation, field) for field in EVALUATION_FIELDS])
+        .join(checkup, checkup.id == evaluation.checkup_id)
+        .where(*criteria)
+    )
+
+
+@event.listens_for(MedicalVisit, "after_insert")
+@event.listens_for(MedicalVisit, "after_update")
+def _index_visit(mapper, connection, visit):
+    state = db.inspect(visit)
+    if not any(state.attrs[key].history.has_changes() for key in ("diagnosis", "worker_id", "visit_date")):
+        return
+    _index_rows(connection, VISIT, VISIT_FIELDS, connection.execute(_visit_rows(MedicalVisit.id == visit.id)))
+
+
+@event.listens_for(DoctorEvaluation, "after_insert")
+@event.listens_for(DoctorEvaluation, "after_update")
+def _index_evaluation(mapper, connection, evaluation):
+    state = db.inspect(evaluation)
+    if not any(state.attrs[key].history.has_changes() for key in ("checkup_id", *EVALUATION_FIELDS)):
+        return
+    _index_rows(connection, EVALUATION, EVALUATION_FIELDS, connection.execute(
+        _evaluation_rows(DoctorEvaluation, MedicalCheckup, DoctorEvaluation.id == evaluation.id)
+    ))
+
+
+@event.listens_for(MedicalCheckup, "after_update")
+def _move_evaluation_terms(mapper, connection, checkup):
+    # The evaluation's worker and date come from its checkup
+    state = db.inspect(checkup)
+    if not any(state.attrs[key].history.has_changes() for key in ("worker_id", "date_of_checkup")):
+        return
+    connection.execute(
+        update(ClinicalTerm)
+        .where(ClinicalTerm.source == EVALUATION,
+               ClinicalTerm.record_id.in_(select(DoctorEvaluation.id).where(DoctorEvaluation.checkup_id == checkup.id)))
+        .values(worker_id=checkup.worker_id, record_date=checkup.date_of_checkup)
+    )
+
+
+@event.listens_for(MedicalVisit, "after_delete")
+def _unindex_visit(mapper, connection, visit):
+    connection.execute(delete(ClinicalTerm).where(ClinicalTerm.source == VISIT, ClinicalTerm.record_id == visit.id))
+
+
+@event.listens_for(DoctorEvaluation, "after_delete")
+def _unindex_evaluation(mapper, connection, evaluation):
+    connection.execute(delete(ClinicalTerm).where(
+        ClinicalTerm.source == EVALUATION, ClinicalTerm.record_id == evaluation.id
+    ))
+
+
+def rebuild_clinical_index(batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Rebuilds the whole index from visits and from live and archived
+    evaluations (after bulk loads that bypass the ORM hooks), in id-ordered
+    batches with one commit per batch. Returns the number of records indexed.
+    """
+    db.session.execute(delete(ClinicalTerm))
+    indexed = 0
+    sources = (
+        (VISIT, VISIT_FIELDS, MedicalVisit.id, _visit_rows),
+        (EVALUATION, EVALUATION_FIELDS, DoctorEvaluation.id,
+         partial(_evaluation_rows, DoctorEvaluation, MedicalCheckup)),
+        (EVALUATION, EVALUATION_FIELDS, ArchivedDoctorEvaluation.id,
+         partial(_evaluation_rows, ArchivedDoctorEvaluation, ArchivedMedicalCheckup)),
+    )
+    for source, fields, id_column, rows in sources:
+        last_id = 0
+        while True:
+            records = db.session.execute(
+                rows(id_column > last_id).order_by(id_column).limit(batch_size)
+            ).all()
+            if not records:
+                break
+            _index_rows(db.session, source, fields, records)
+            db.session.commit()
+            indexed += len(records)
+            last_id = records[-1].id
+            logging.info(f"Indexed {indexed} clinical records.")
+    db.session.commit()
+    return indexed
+
+
+# Search
+
+_record_counts = {}
+
+
+def _record_count() -> int:
+    """Indexable records on the current shard, for idf; counted at most every RECORD_COUNT_TTL seconds."""
+    key = db.session.get_bind(clause=select(ClinicalTerm)).url
+    count, expires = _record_counts.get(key, (0, 0.0))
+    if expires < time.monotonic():
+        count = sum(db.session.scalar(select(func.count()).select_from(model))
+                    for model in (MedicalVisit, DoctorEvaluation, ArchivedDoctorEvaluation))
+        _record_counts[key] = (count, time.monotonic() + RECORD_COUNT_TTL)
+    return count
+
+
+def _term_stats(query_terms):
+    """Document frequency of the index terms each query term matches, and the record count."""
+    matches = []
+    for term, prefix in query_terms:
+        if prefix:
+            criterion = or_(*(ClinicalTerm.term.startswith(form, autoescape=True) for form in _prefix_forms(term)))
+        else:
+            criterion = ClinicalTerm.term == term
+        matches.append(dict(db.session.execute(
+            select(ClinicalTerm.term, func.count()).where(criterion)
+            .group_by(ClinicalTerm.term).order_by(func.count().desc()).limit(MAX_PREFIX_TERMS)
+        ).all()))
+    return matches, _record_count()
+
+
+def _ranked(groups, idf, limit):
+    """The best `limit` records containing a term of every group, by summed weight * idf."""
+    score = func.sum(ClinicalTerm.weight * case(idf, value=ClinicalTerm.term, else_=0.0)).label("score")
+    group_of = {term: index for index, group in enumerate(groups) for term in group}
+    matched = func.count(func.distinct(case(group_of, value=ClinicalTerm.term)))
+    return [row._asdict() for row in db.session.execute(
+        select(ClinicalTerm.source, ClinicalTerm.record_id, ClinicalTerm.worker_id, ClinicalTerm.record_date, score)
+        .where(ClinicalTerm.term.in_(list(group_of)))
+        .group_by(ClinicalTerm.source, ClinicalTerm.record_id, ClinicalTerm.worker_id, ClinicalTerm.record_date)
+        .having(matched == len(groups))
+        .order_by(score.desc(), ClinicalTerm.record_date.desc(), ClinicalTerm.record_id.desc())
+        .limit(limit)
+    )]
+
+
+def _snippet(record, fields, query_terms):
+    """The first field mentioning a query term, cut to SNIPPET_LENGTH characters around the first mention."""
+    for field in fields:
+        text = getattr(record, field, None) or ""
+        for word in _WORDS.finditer(text):
+            folded, start = normalise(word.group()), normalise(word.group(), prefix=True) or ""
+            if any(start.startswith(_prefix_forms(term)) if prefix else folded == term for term, prefix in query_terms):
+                start = max(word.start() - SNIPPET_LENGTH // 3, 0)
+                snippet = text[start:start + SNIPPET_LENGTH].strip()
+                return field, ("…" if start else "") + snippet + ("…" if start + SNIPPET_LENGTH < len(text) else "")
+    return None, None
+
+
+def _describe(results, query_terms):
+    """Adds worker names and a snippet to ranked rows of the current shard."""
+    ids = defaultdict(list)
+    for result in results:
+        ids[result["source"]].append(result["record_id"])
+    texts = {(VISIT, row.id): row for row in db.session.execute(
+        select(MedicalVisit.id, MedicalVisit.diagnosis).where(MedicalVisit.id.in_(ids[VISIT]))
+    )}
+    for model in (DoctorEvaluation, ArchivedDoctorEvaluation):
+        missing = [record_id for record_id in ids[EVALUATION] if (EVALUATION, record_id) not in texts]
+        if missing:
+            texts.update(((EVALUATION, row.id), row) for row in db.session.execute(
+                select(model.id, *[getattr(model, field) for field in EVALUATION_FIELDS]).where(model.id.in_(missing))
+            ))
+    names = {row.id: " ".join(filter(None, (row.first_name, row.last_name))) for row in db.session.execute(
+        select(Worker.id, Worker.first_name, Worker.last_name)
+        .where(Worker.id.in_({result["worker_id"] for result in results}))
+    )}
+    for result in results:
+        fields = VISIT_FIELDS if result["source"] == VISIT else EVALUATION_FIELDS
+        field, snippet = _snippet(texts.get((result["source"], result["record_id"])), fields, query_terms)
+        result.update(worker_name=names.get(result["worker_id"]), field=field, snippet=snippet)
+    return results
+
+
+def search_clinical_text(query: str, page: int = 1, per_page: int = 20) -> dict:
+    """
+    One page of visits and evaluations whose clinical text contains every
+    term of `query`, best first. Scores are tf-idf: each term's
+    field-weighted frequency in the record times log(1 + records / records
+    with the term), summed over the query. Every shard is searched, with
+    frequencies summed across shards so scores compare.
+    """
+    query_terms = parse_query(query)
+    empty = dict(query=query, terms=[], page=page, per_page=per_page, has_next=False, items=[])
+    if not query_terms:
+        return empty
+
+    stats = shard_router.fan_out(_term_stats, query_terms)
+    groups = [Counter() for _ in query_terms]
+    for matches, _ in stats.values():
+        for group, found in zip(groups, matches):
+            group.update(found)
+    if not all(groups):
+        return dict(empty, terms=[term for term, _ in query_terms])
+    records = sum(count for _, count in stats.values())
+    idf = {term: math.log(1 + max(records, df) / df) for group in groups for term, df in group.items()}
+
+    offset = (page - 1) * per_page
+    found = shard_router.fan_out(_ranked, [list(group) for group in groups], idf, offset + per_page + 1)
+    ranked = sorted(
+        ((shard, result) for shard, results in found.items() for result in results),
+        key=lambda item: (-item[1]["score"], -(item[1]["record_date"] or date.min).toordinal(), -item[1]["record_id"])
+    )
+    page_items = ranked[offset:offset + per_page]
+
+    by_shard = defaultdict(list)
+    for shard, result in page_items:
+        by_shard[shard].append(result)
+    for shard, results in by_shard.items():
+        with shard_router.use(shard):
+            _describe(results, query_terms)
+
+    items = [
+        dict(result, score=round(result["score"], 4),
+             record_date=result["record_date"].isoformat() if result["record_date"] else None)
+        for _, result in page_items
+    ]
+    return dict(query=query, terms=[term for term, _ in query_terms], page=page, per_page=per_page,
+                has_next=len(ranked) > offset + per_page, items=items)
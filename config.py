@@ -0,0 +1,34 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def database_url() -> str:
+    """DATABASE_URL (any SQLAlchemy URL) if set, e.g. for benchmarks/, else MySQL from the MYSQL*/DB_* variables."""
+    if os.getenv("DATABASE_URL"):
+        return os.getenv("DATABASE_URL")
+    db_user = os.getenv("MYSQLUSER") or os.getenv("DB_USER")
+    db_pass = os.getenv("MYSQLPASSWORD") or os.getenv("DB_PASS")
+    db_host = os.getenv("MYSQLHOST") or os.getenv("DB_HOST")
+    db_name = os.getenv("MYSQLDATABASE") or os.getenv("DB_NAME")
+    db_port = os.getenv("MYSQLPORT")
+    # Handle empty or missing port safely
+    if db_port and db_port.strip():
+        return f"mysql+pymysql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+    return f"mysql+pymysql://{db_user}:{db_pass}@{db_host}/{db_name}"
+
+
+class Config:
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
+
+
+class TestingConfig(Config):
+    """In-memory SQLite and no CSRF tokens, for scripted clients and benchmarks."""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.getenv("TEST_DATABASE_URL", "sqlite://")
+    WTF_CSRF_ENABLED = False
+    AUDIT_ENABLED = False
@@ -1,4 +1,37 @@
+from contextvars import ContextVar
+
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import inspect
+from sqlalchemy.sql.util import find_tables
+
+# Tables that always live in the main database. Every other table holds
+# worker data and lives on the worker's shard (see sharding.py).
+GLOBAL_TABLES = frozenset({"users", "healthcare_facilities", "audit_trail", "sync_records", "worker_placements"})
+
+# Bind key of the shard worker data is read from and written to in the
+# current request, thread or CLI command; None is the main database.
+current_shard = ContextVar("current_shard", default=None)
+
+
+class RoutingSession(Session):
+    """Sends statements on worker tables to current_shard, everything else to the main database."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = current_shard.get()
+        if shard is not None and bind is None and not _global_only(mapper, clause):
+            return self._db.engines[shard]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _global_only(mapper, clause) -> bool:
+    if mapper is not None:
+        return inspect(mapper).local_table.name in GLOBAL_TABLES
+    if clause is not None:
+        tables = find_tables(clause, include_crud=True)
+        return bool(tables) and all(table.name in GLOBAL_TABLES for table in tables)
+    return False    # Session.connection() in a shard context: the shard
+
 
 # SQLAlchemy object
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy(session_options={"class_": RoutingSession})
@@ -1,6 +1,7 @@
 from functools import wraps
 from flask_login import current_user
-from flask import abort
+from flask import abort, request
+from audit import record_event, DENIED
 
 def require_role(allowed_roles: list):
     """
@@ -18,8 +19,28 @@ def require_role(allowed_roles: list):
 
             # 3. If their role is not in the list of allowed roles, deny access.
             if user_role_value not in allowed_roles:
+                # Record denied attempts on worker records for the audit trail
+                if "worker_id" in kwargs:
+                    record_event(DENIED, "worker", kwargs["worker_id"], remarks=request.path)
                 abort(403)  # Forbidden
-            
+
             return func(*args, **kwargs)
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+
+def audited(action: str, entity_type: str, id_arg: str = "worker_id"):
+    """
+    Records an audit event for the entity named by the `id_arg` URL argument
+    once the view has run. Only successful (non 4xx/5xx) responses are recorded.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            response = func(*args, **kwargs)
+            status = getattr(response, "status_code", 200)
+            if status < 400 and kwargs.get(id_arg) is not None:
+                record_event(action, entity_type, kwargs[id_arg], remarks=f"{request.method} {request.full_path.rstrip('?')}")
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,223 @@
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import select, exists, insert, event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from database import db
+from models import DoctorEvaluation, MedicalCheckup, Worker, FollowUpReminder
+from sharding import shard_router
+
+WINDOW_DAYS = 7
+
+
+def open_follow_ups(facility_id: int | None = None):
+    """
+    Evaluations that asked for a follow-up which has not happened yet, i.e.
+    the worker has had no checkup since. Driven by the
+    (follow_up_required, follow_up_date) index.
+    """
+    later = aliased(MedicalCheckup)
+    query = (
+        select(
+            DoctorEvaluation.id.label("evaluation_id"),
+            DoctorEvaluation.follow_up_date,
+            DoctorEvaluation.diagnosis,
+            DoctorEvaluation.doctor_name,
+            MedicalCheckup.id.label("checkup_id"),
+            MedicalCheckup.facility_id,
+            Worker.id.label("worker_id"),
+            Worker.first_name,
+            Worker.last_name,
+            Worker.phone,
+        )
+        .join(MedicalCheckup, MedicalCheckup.id == DoctorEvaluation.checkup_id)
+        .join(Worker, Worker.id == MedicalCheckup.worker_id)
+        .where(DoctorEvaluation.follow_up_required.is_(True), DoctorEvaluation.follow_up_date.isnot(None))
+        .where(~exists().where(
+            later.worker_id == MedicalCheckup.worker_id,
+            later.date_of_checkup > MedicalCheckup.date_of_checkup
+        ))
+    )
+    if facility_id is not None:
+        query = query.where(MedicalCheckup.facility_id == facility_id)
+    return query
+
+
+def _due_rows(facility_id, status, today, limit):
+    query = open_follow_ups(facility_id)
+    if status == "overdue":
+        query = query.where(DoctorEvaluation.follow_up_date < today)
+    elif status == "due":
+        query = query.where(DoctorEvaluation.follow_up_date.between(today, today + timedelta(days=WINDOW_DAYS)))
+    query = query.order_by(DoctorEvaluation.follow_up_date, DoctorEvaluation.id)
+    return db.session.execute(query.limit(limit)).all()
+
+
+def due_list(facility_id: int | None, status: str = "all", page: int = 1, per_page: int = 50, today: date | None = None):
+    """
+    One page of a facility's open follow-ups ordered by due date.
+    status: 'overdue' (before today), 'due' (today to today + WINDOW_DAYS) or 'all'.
+    """
+    today = today or date.today()
+    offset = (page - 1) * per_page
+    # Every shard's first offset + per_page + 1 rows hold the page, whichever shard each row is on
+    per_shard = shard_router.fan_out(_due_rows, facility_id, status, today, offset + per_page + 1)
+    rows = heapq.merge(*per_shard.values(), key=lambda row: (row.follow_up_date, row.evaluation_id))
+    rows = list(rows)[offset:offset + per_page + 1]
+    items = []
+    for row in rows[:per_page]:
+        item = row._asdict()
+        item["follow_up_date"] = row.follow_up_date.isoformat()
+        item["overdue_days"] = max((today - row.follow_up_date).days, 0)
+        items.append(item)
+    return dict(page=page, per_page=per_page, has_next=len(rows) > per_page, items=items)
+
+
+class FollowUpScheduler:
+    """
+    Keeps open follow-ups that are overdue or due within the next
+    WINDOW_DAYS in an in-memory min-heap keyed by due date, and periodically
+    pops everything that has come due and emits reminders for it in one bulk
+    insert. The heap is reloaded from the index once a day (which also picks
+    up follow-ups that drift into the window); evaluations saved in between
+    are pushed as they are written.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._heap = []
+        self._queued = set()
+        self._loaded_for = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("FOLLOW_UP_REMINDER_INTERVAL", 3600)
+        app.config.setdefault("FOLLOW_UP_SCHEDULER_ENABLED", False)
+        self.app = app
+        self.interval = app.config["FOLLOW_UP_REMINDER_INTERVAL"]
+        app.extensions["follow_up_scheduler"] = self
+        if app.config["FOLLOW_UP_SCHEDULER_ENABLED"]:
+            app.before_request(self._ensure_thread)
+
+    @staticmethod
+    def _open_rows(horizon):
+        reminded = exists().where(FollowUpReminder.evaluation_id == DoctorEvaluation.id)
+        return db.session.execute(
+            open_follow_ups()
+            .where(DoctorEvaluation.follow_up_date <= horizon)
+            .where(~reminded)
+        ).all()
+
+    def load(self, today: date | None = None):
+        today = today or date.today()
+        per_shard = shard_router.fan_out(self._open_rows, today + timedelta(days=WINDOW_DAYS))
+        rows = [row for shard_rows in per_shard.values() for row in shard_rows]
+        with self._lock:
+            self._heap = [(r.follow_up_date, r.evaluation_id, r.worker_id, r.facility_id) for r in rows]
+            heapq.heapify(self._heap)
+            self._queued = {r.evaluation_id for r in rows}
+            self._loaded_for = today
+        return len(rows)
+
+    def push(self, evaluation_id, follow_up_date, worker_id, facility_id):
+        if self._loaded_for is None or follow_up_date > self._loaded_for + timedelta(days=WINDOW_DAYS):
+            return
+        with self._lock:
+            if evaluation_id not in self._queued:
+                heapq.heappush(self._heap, (follow_up_date, evaluation_id, worker_id, facility_id))
+                self._queued.add(evaluation_id)
+
+    def pop_due(self, today: date):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= today:
+                item = heapq.heappop(self._heap)
+                self._queued.discard(item[1])
+                due.append(item)
+        return due
+
+    def emit_reminders(self, today: date | None = None) -> int:
+        """Pops everything due by today and writes reminder rows in bulk, per shard. Returns how many were written."""
+        today = today or date.today()
+        if self._loaded_for != today:
+            self.load(today)
+        due = self.pop_due(today)
+        by_shard = {}
+        for item in due:
+            by_shard.setdefault(shard_router.shard_of(item[2]), []).append(item)
+        emitted = 0
+        for shard, shard_due in by_shard.items():
+            with shard_router.use(shard):
+                emitted += self._emit(shard_due, today)
+        return emitted
+
+    def _emit(self, due, today):
+        # One query re-checks that these are still open and not yet reminded
+        reminded = exists().where(FollowUpReminder.evaluation_id == DoctorEvaluation.id)
+        still_open = {
+            row.evaluation_id for row in db.session.execute(
+                open_follow_ups().where(DoctorEvaluation.id.in_([item[1] for item in due])).where(~reminded)
+            )
+        }
+        rows = [
+            dict(evaluation_id=evaluation_id, worker_id=worker_id, facility_id=facility_id,
+                 follow_up_date=due_date, kind="due" if due_date == today else "overdue")
+            for due_date, evaluation_id, worker_id, facility_id in due if evaluation_id in still_open
+        ]
+        if not rows:
+            return 0
+        try:
+            db.session.execute(insert(FollowUpReminder), rows)
+            db.session.commit()
+        except IntegrityError:
+            # Another process emitted (some of) these first: requeue the batch,
+            # the next run re-checks which are still not reminded
+            db.session.rollback()
+            for due_date, evaluation_id, worker_id, facility_id in due:
+                self.push(evaluation_id, due_date, worker_id, facility_id)
+            return 0
+        logging.info(f"Emitted {len(rows)} follow-up reminders.")
+        return len(rows)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="follow-up-scheduler", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    self.emit_reminders()
+            except Exception as e:
+                logging.error(f"Follow-up reminder run failed: {e}")
+
+
+follow_up_scheduler = FollowUpScheduler()
+
+
+@event.listens_for(DoctorEvaluation, "after_insert")
+def _queue_new_follow_up(mapper, connection, evaluation):
+    if not evaluation.follow_up_required or not evaluation.follow_up_date:
+        return
+    row = connection.execute(
+        select(MedicalCheckup.worker_id, MedicalCheckup.facility_id).where(MedicalCheckup.id == evaluation.checkup_id)
+    ).first()
+    if row:
+        follow_up_scheduler.push(evaluation.id, evaluation.follow_up_date, row.worker_id, row.facility_id)
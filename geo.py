@@ -0,0 +1,219 @@
+import heapq
+import logging
+import math
+import re
+
+from sqlalchemy import event, select, update, bindparam, and_, or_
+
+from database import db
+from models import MedicalCheckup
+from sharding import shard_router
+
+GEOHASH_PRECISION = 9  # ~5 m cells
+EARTH_RADIUS_KM = 6371.0088
+MAX_COVER_CELLS = 32
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_NUMBER = r"[-+]?\d{1,3}\.\d+"  # decimals required so "Camp 3, Block 12" is not a coordinate
+_COORDINATES = re.compile(
+    rf"(?P<lat>{_NUMBER})\s*°?\s*(?P<lat_hemi>[NS])?\s*[,;/\s]\s*(?:lon(?:g(?:itude)?)?\s*[:=]?\s*)?"
+    rf"(?P<lon>{_NUMBER})\s*°?\s*(?P<lon_hemi>[EW])?",
+    re.IGNORECASE
+)
+
+
+def parse_geo_location(text: str | None):
+    """
+    Extracts (latitude, longitude) from the free-form geo_location field.
+    Understands "9.9312, 76.2673", "9.9312 76.2673", "lat: 9.93, lon: 76.26",
+    "9.93°N 76.26°E" and map links containing "@9.93,76.26" or "q=9.93,76.26".
+    Returns None when no valid coordinate pair is found (e.g. a place name).
+    """
+    if not text:
+        return None
+    cleaned = re.sub(r"lat(?:itude)?\s*[:=]?", "", text, flags=re.IGNORECASE)
+    match = _COORDINATES.search(cleaned)
+    if not match:
+        return None
+    lat, lon = float(match["lat"]), float(match["lon"])
+    if (match["lat_hemi"] or "").upper() == "S":
+        lat = -abs(lat)
+    if (match["lon_hemi"] or "").upper() == "W":
+        lon = -abs(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, ch, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch = ch << 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision: int):
+    """(height, width) of a geohash cell in degrees."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def covering_cells(min_lat, min_lon, max_lat, max_lon, max_cells: int = MAX_COVER_CELLS):
+    """
+    Geohash prefixes that together cover the bounding box, at the finest
+    precision that needs no more than `max_cells` prefixes.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lon / width) - math.floor(min_lon / width) + 1
+        if rows * cols > max_cells and precision > 1:
+            continue
+        cells = set()
+        for r in range(rows):
+            lat = min(min_lat + r * height, max_lat)
+            for c in range(cols):
+                lon = min(min_lon + c * width, max_lon)
+                cells.add(geohash_encode(lat, lon, precision))
+            cells.add(geohash_encode(lat, max_lon, precision))
+        for c in range(cols):
+            cells.add(geohash_encode(max_lat, min(min_lon + c * width, max_lon), precision))
+        cells.add(geohash_encode(max_lat, max_lon, precision))
+        return sorted(cells)
+    return []
+
+
+def _cell_query(cells, min_lat, min_lon, max_lat, max_lon):
+    return (
+        select(MedicalCheckup.id, MedicalCheckup.worker_id, MedicalCheckup.date_of_checkup,
+               MedicalCheckup.latitude, MedicalCheckup.longitude, MedicalCheckup.geo_location)
+        # Prefix match as a range so every database can use the geohash index
+        .where(or_(*[and_(MedicalCheckup.geohash >= cell, MedicalCheckup.geohash < cell + "~") for cell in cells]))
+        .where(MedicalCheckup.latitude.between(min_lat, max_lat))
+        .where(MedicalCheckup.longitude.between(min_lon, max_lon))
+    )
+
+
+def _row(row, distance=None):
+    result = dict(
+        checkup_id=row.id,
+        worker_id=row.worker_id,
+        date_of_checkup=row.date_of_checkup.isoformat() if row.date_of_checkup else None,
+        latitude=row.latitude,
+        longitude=row.longitude,
+        geo_location=row.geo_location
+    )
+    if distance is not None:
+        result["distance_km"] = round(distance, 3)
+    return result
+
+
+def _newest_in_box(cells, min_lat, min_lon, max_lat, max_lon, limit):
+    # Ordered before the limit so a box with more hits always returns the same, newest ones
+    return db.session.execute(
+        _cell_query(cells, min_lat, min_lon, max_lat, max_lon)
+        .order_by(MedicalCheckup.date_of_checkup.desc(), MedicalCheckup.id.desc())
+        .limit(limit)
+    ).all()
+
+
+def checkups_in_box(min_lat, min_lon, max_lat, max_lon, limit: int = 500):
+    """Checkups inside a bounding box, newest first, found through geohash prefix range scans on every shard."""
+    cells = covering_cells(min_lat, min_lon, max_lat, max_lon)
+    per_shard = shard_router.fan_out(_newest_in_box, cells, min_lat, min_lon, max_lat, max_lon, limit)
+    rows = heapq.merge(*per_shard.values(), key=lambda r: (r.date_of_checkup, r.id), reverse=True)
+    return [_row(r) for r in list(rows)[:limit]]
+
+
+def _within_radius(cells, lat, lon, radius_km, min_lat, min_lon, max_lat, max_lon):
+    hits = []
+    for row in db.session.execute(_cell_query(cells, min_lat, min_lon, max_lat, max_lon)):
+        distance = haversine_km(lat, lon, row.latitude, row.longitude)
+        if distance <= radius_km:
+            hits.append((distance, row))
+    return hits
+
+
+def checkups_within_radius(lat, lon, radius_km, limit: int = 500):
+    """Checkups within `radius_km` of a point, nearest first."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    min_lon, max_lon = max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+    cells = covering_cells(min_lat, min_lon, max_lat, max_lon)
+    per_shard = shard_router.fan_out(_within_radius, cells, lat, lon, radius_km, min_lat, min_lon, max_lat, max_lon)
+    hits = [hit for shard_hits in per_shard.values() for hit in shard_hits]
+    hits.sort(key=lambda h: h[0])
+    return [_row(row, distance) for distance, row in hits[:limit]]
+
+
+def _apply_geo(checkup):
+    parsed = parse_geo_location(checkup.geo_location)
+    if parsed:
+        checkup.latitude, checkup.longitude = parsed
+        checkup.geohash = geohash_encode(*parsed)
+    else:
+        checkup.latitude = checkup.longitude = checkup.geohash = None
+
+
+@event.listens_for(MedicalCheckup, "before_insert")
+def _geo_before_insert(mapper, connection, checkup):
+    _apply_geo(checkup)
+
+
+@event.listens_for(MedicalCheckup, "before_update")
+def _geo_before_update(mapper, connection, checkup):
+    if db.inspect(checkup).attrs.geo_location.history.has_changes():
+        _apply_geo(checkup)
+
+
+def backfill_geo(batch_size: int = 5000) -> int:
+    """Parses geo_location for checkups written before the index existed (or through bulk inserts)."""
+    stmt = (
+        update(MedicalCheckup.__table__)
+        .where(MedicalCheckup.__table__.c.id == bindparam("checkup_id"))
+        .values(latitude=bindparam("lat"), longitude=bindparam("lon"), geohash=bindparam("hash"))
+    )
+    last_id, updated = 0, 0
+    while True:
+        rows = db.session.execute(
+            select(MedicalCheckup.id, MedicalCheckup.geo_location)
+            .where(MedicalCheckup.id > last_id, MedicalCheckup.geo_location.isnot(None), MedicalCheckup.geohash.is_(None))
+            .order_by(MedicalCheckup.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        params = []
+        for checkup_id, text in rows:
+            parsed = parse_geo_location(text)
+            if parsed:
+                params.append(dict(checkup_id=checkup_id, lat=parsed[0], lon=parsed[1], hash=geohash_encode(*parsed)))
+        if params:
+            db.session.execute(stmt, params)
+        db.session.commit()
+        updated += len(params)
+        last_id = rows[-1][0]
+        logging.info(f"Geo backfill: {updated} checkups indexed (up to id {last_id}).")
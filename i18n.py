@@ -0,0 +1,265 @@
+import gzip
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import brotli
+from flask import request, send_from_directory, abort, g, has_request_context
+from flask_login import current_user
+from jinja2.ext import Extension
+from markupsafe import escape
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRANSLATIONS_SOURCE = os.path.join(BASE_DIR, "static", "js", "translations.json")
+BUNDLE_DIR = os.path.join(BASE_DIR, "static", "i18n")
+MANIFEST_NAME = "manifest.json"
+DEFAULT_LANGUAGE = "en"
+# An explicit choice from the language switcher, for visitors who are not signed in
+LANGUAGE_COOKIE = "language"
+# How often the catalog file is checked for edits
+RELOAD_CHECK_SECONDS = 2.0
+
+# Bundle names change with their content, so browsers may keep them forever
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def build_bundles(source: str = TRANSLATIONS_SOURCE, out_dir: str = BUNDLE_DIR) -> dict:
+    """
+    Splits the translation catalog into one bundle per language named after
+    a hash of its content (en.3f2a9c1d04be.json), each with .gz and .br
+    variants next to it, and writes the language -> file name manifest.
+    Bundles left over from earlier builds are removed.
+    """
+    with open(source, encoding="utf-8") as f:
+        catalog = json.load(f)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest, written = {}, {MANIFEST_NAME}
+    for language, strings in catalog.items():
+        data = json.dumps(strings, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode()
+        name = f"{language}.{hashlib.sha256(data).hexdigest()[:12]}.json"
+        variants = {
+            name: data,
+            name + ".gz": gzip.compress(data, compresslevel=9, mtime=0),
+            name + ".br": brotli.compress(data, quality=11),
+        }
+        for filename, content in variants.items():
+            path = os.path.join(out_dir, filename)
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(content)
+        manifest[language] = name
+        written.update(variants)
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    for filename in os.listdir(out_dir):
+        if filename not in written:
+            os.remove(os.path.join(out_dir, filename))
+    return manifest
+
+
+class BundleManifest:
+    """
+    The manifest of the current bundles, read once per process. When
+    translations.json is newer than the manifest (or no build has been run)
+    the bundles are rebuilt on first use, so `flask build-translations` at
+    deploy time is an optimisation rather than a requirement.
+    """
+
+    def __init__(self, source: str = TRANSLATIONS_SOURCE, out_dir: str = BUNDLE_DIR):
+        self.source = source
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._loaded_mtime = None
+
+    def _path(self):
+        return os.path.join(self.out_dir, MANIFEST_NAME)
+
+    def get(self) -> dict:
+        source_mtime = os.stat(self.source).st_mtime
+        if self._manifest is not None and self._loaded_mtime == source_mtime:
+            return self._manifest
+        with self._lock:
+            if self._manifest is None or self._loaded_mtime != source_mtime:
+                path = self._path()
+                if not os.path.exists(path) or os.stat(path).st_mtime < source_mtime:
+                    logging.info("Translation bundles are missing or stale, rebuilding")
+                    self._manifest = build_bundles(self.source, self.out_dir)
+                else:
+                    with open(path, encoding="utf-8") as f:
+                        self._manifest = json.load(f)
+                self._loaded_mtime = source_mtime
+        return self._manifest
+
+    def filenames(self) -> set:
+        return set(self.get().values())
+
+
+bundle_manifest = BundleManifest()
+
+
+# Server-side catalog
+
+def compile_catalog(source: str = TRANSLATIONS_SOURCE) -> dict:
+    """
+    One flat dict per language with English filled in for missing or empty
+    keys, the values already HTML-escaped so rendering is a dict lookup.
+    """
+    with open(source, encoding="utf-8") as f:
+        catalog = json.load(f)
+    fallback = catalog.get(DEFAULT_LANGUAGE, {})
+    return {
+        language: {key: escape(value) for key, value in {**fallback, **strings}.items() if value}
+        for language, strings in catalog.items()
+    }
+
+
+class TranslationCatalog:
+    """
+    The compiled catalog, loaded once per process. The source file's mtime
+    is checked at most every RELOAD_CHECK_SECONDS and the catalog recompiled
+    when it changes, so edited translations show up without a restart.
+    """
+
+    def __init__(self, source: str = TRANSLATIONS_SOURCE):
+        self.source = source
+        self._lock = threading.Lock()
+        self._compiled = {}
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        mtime = os.stat(self.source).st_mtime
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime != self._mtime:
+                self._compiled = compile_catalog(self.source)
+                self._mtime = mtime
+                logging.info(f"Translation catalog loaded: {', '.join(self._compiled)}")
+
+    def languages(self) -> list:
+        self._refresh()
+        return list(self._compiled)
+
+    def strings(self, language: str) -> dict:
+        self._refresh()
+        return self._compiled.get(language) or self._compiled.get(DEFAULT_LANGUAGE, {})
+
+
+translation_catalog = TranslationCatalog()
+
+
+def _pick_language() -> str:
+    if not has_request_context():
+        return DEFAULT_LANGUAGE
+    languages = translation_catalog.languages()
+    if request.cookies.get(LANGUAGE_COOKIE) in languages:
+        return request.cookies[LANGUAGE_COOKIE]
+    worker = current_user.worker if current_user.is_authenticated else None
+    if worker is not None and worker.preferred_language in languages:
+        return worker.preferred_language
+    return request.accept_languages.best_match(languages, default=DEFAULT_LANGUAGE)
+
+
+def current_language() -> str:
+    """
+    The language last picked in the switcher on this browser, else the
+    worker profile's preferred_language, else the browser's best supported
+    match. Resolved once per request.
+    """
+    if "language" not in g:
+        g.language = _pick_language()
+    return g.language
+
+
+def translate(key: str, default: str = ""):
+    """The current language's string for `key` (escaped), or `default` if the catalog lacks it."""
+    value = translation_catalog.strings(current_language()).get(key)
+    return value if value is not None else escape(default)
+
+
+def _string_literal(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+# <tag ... data-translate-key="key" ...>plain text</tag>; text holding markup or Jinja is left alone
+_ELEMENT_TEXT = re.compile(
+    r'(?P<open><(?P<tag>[a-zA-Z][\w-]*)\b[^<>]*?\bdata-translate-key="(?P<key>[\w.-]+)"[^<>]*>)'
+    r'(?P<text>[^<>{}]*)(?=</(?P=tag)>)'
+)
+# {{ form.field(..., **{'data-translate-key': 'key'}) }} and {{ form.field.label(...) }}
+_FIELD_CALL = re.compile(
+    r"\{\{(?P<expr>(?:(?!\}\}).)*?\*\*\{'data-translate-key':\s*'(?P<key>[\w.-]+)'\}(?:(?!\}\}).)*?)\}\}",
+    re.S
+)
+_LABEL_CALL = re.compile(r"^(?P<lead>\s*)(?P<label>[\w.]+\.label)\(")
+_PLACEHOLDER = re.compile(r"""placeholder=(?P<quote>["'])(?P<text>.*?)(?P=quote)""")
+
+
+class TranslateKeyExtension(Extension):
+    """
+    Rewrites data-translate-key markup into translate() calls when a
+    template is compiled: element text, WTForms placeholders and field
+    labels. The English text in the template stays as the fallback, and
+    Jinja caches the compiled template, so rendering only does lookups.
+    """
+
+    def preprocess(self, source, name, filename=None):
+        return _FIELD_CALL.sub(self._field_call, _ELEMENT_TEXT.sub(self._element_text, source))
+
+    @staticmethod
+    def _element_text(match):
+        text = match.group("text")
+        core = text.strip()
+        if not core:
+            return match.group(0)
+        lead, trail = text[:len(text) - len(text.lstrip())], text[len(text.rstrip()):]
+        call = f'translate("{match.group("key")}", {_string_literal(html.unescape(core))})'
+        return f'{match.group("open")}{lead}{{{{ {call} }}}}{trail}'
+
+    @staticmethod
+    def _field_call(match):
+        expr, key = match.group("expr"), match.group("key")
+        label = _LABEL_CALL.match(expr)
+        if label:
+            expr = _LABEL_CALL.sub(
+                lambda m: f'{m.group("lead")}{m.group("label")}(translate("{key}", {m.group("label")}.text), ', expr, count=1
+            )
+        else:
+            expr = _PLACEHOLDER.sub(
+                lambda m: f'placeholder=translate("{key}", {_string_literal(m.group("text"))})', expr, count=1
+            )
+        return "{{" + expr + "}}"
+
+
+def bundle_response(filename: str):
+    """
+    Serves a fingerprinted bundle with immutable caching, picking the
+    precompressed variant the client accepts.
+    """
+    if filename not in bundle_manifest.filenames():
+        abort(404)
+    for encoding, suffix in ENCODINGS:
+        if encoding in request.accept_encodings:
+            response = send_from_directory(BUNDLE_DIR, filename + suffix, mimetype="application/json")
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(BUNDLE_DIR, filename, mimetype="application/json")
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE
+    response.vary.add("Accept-Encoding")
+    return response
@@ -0,0 +1,449 @@
+import difflib
+import functools
+import heapq
+import logging
+import re
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, delete, func, event, and_, or_
+from sqlalchemy.orm import aliased
+
+from database import db
+from models import Worker, WorkerBlockingKey, DuplicateCandidate, WorkerHealthSnapshot, ActivityRollup
+from analytics import population_analytics
+from vaccination_schedule import vaccination_schedule
+from snapshot import refresh_snapshots
+from record_cache import invalidate_after_commit
+from activity import merge_rollups
+from sharding import shard_router
+
+MAX_BLOCK_SIZE = 25     # keys shared by more workers than this (very common names) are not compared
+MATCH_THRESHOLD = 7.0   # pairs scoring at least this are surfaced to admins
+PAIR_BATCH_SIZE = 500
+FEATURE_CACHE_SIZE = 500000
+
+OPEN = "open"
+DISMISSED = "dismissed"
+MERGED = "merged"
+
+LINK_COLUMNS = (
+    Worker.id, Worker.first_name, Worker.last_name, Worker.phone, Worker.contact_number,
+    Worker.migrant_id_number, Worker.date_of_birth, Worker.age, Worker.gender, Worker.home_state,
+)
+LINK_FIELDS = [column.key for column in LINK_COLUMNS[1:]]
+
+_SOUNDEX = str.maketrans("bfpvcgjkqsxzdtlmnr", "111122222222334556")
+_NON_DIGITS = re.compile(r"\D")
+_NON_LETTERS = re.compile(r"[^a-z]")
+
+
+# Normalisation and blocking keys
+
+def normalise_phone(number: str | None) -> str | None:
+    """Last ten digits, so "+91 98470-12345" and "09847012345" agree."""
+    digits = _NON_DIGITS.sub("", number or "")
+    if len(digits) >= 10:
+        return digits[-10:]
+    return digits if len(digits) >= 7 else None
+
+
+def normalise_id(value: str | None) -> str | None:
+    cleaned = re.sub(r"[^A-Z0-9]", "", (value or "").upper())
+    return cleaned or None
+
+
+@functools.lru_cache(maxsize=100000)
+def soundex(name: str | None) -> str:
+    letters = _NON_LETTERS.sub("", (name or "").lower())
+    if not letters:
+        return ""
+    codes = letters.translate(_SOUNDEX)
+    result, previous = letters[0].upper(), codes[0]
+    for letter, code in zip(letters[1:], codes[1:]):
+        if code.isdigit() and code != previous:
+            result += code
+        if letter not in "hw":
+            previous = code
+    return (result + "000")[:4]
+
+
+def name_code(first_name, last_name) -> str:
+    """Phonetic code of the full name, order-independent so swapped first/last names still block together."""
+    return "".join(sorted(filter(None, (soundex(first_name), soundex(last_name)))))
+
+
+def blocking_keys(worker) -> set[str]:
+    """
+    Keys a worker is indexed under: normalised phone numbers, migrant id,
+    phonetic name + date of birth, and phonetic name + home state + age band.
+    Age bands come in two grids offset by five years, so ages less than five
+    years apart always share a band.
+    """
+    keys = set()
+    for number in (worker.phone, worker.contact_number):
+        phone = normalise_phone(number)
+        if phone:
+            keys.add(f"phone:{phone}")
+    migrant_id = normalise_id(worker.migrant_id_number)
+    if migrant_id:
+        keys.add(f"mid:{migrant_id}"[:160])
+    name = name_code(worker.first_name, worker.last_name)
+    if name:
+        if worker.date_of_birth:
+            keys.add(f"name_dob:{name}:{worker.date_of_birth.isoformat()}")
+        if worker.age is not None:
+            state = (worker.home_state or "").strip().lower()[:100]
+            keys.add(f"name_age:{name}:{state}:a{worker.age // 10}")
+            keys.add(f"name_age:{name}:{state}:b{(worker.age + 5) // 10}")
+    return keys
+
+
+# Scoring
+
+def features(worker) -> dict:
+    """The normalised fields score_pair compares, computed once per worker."""
+    return dict(
+        phones={normalise_phone(worker.phone), normalise_phone(worker.contact_number)} - {None},
+        migrant_id=normalise_id(worker.migrant_id_number),
+        date_of_birth=worker.date_of_birth,
+        age=worker.age,
+        full_name=f"{worker.first_name or ''} {worker.last_name or ''}".strip().lower(),
+        name_code=name_code(worker.first_name, worker.last_name),
+        gender=worker.gender,
+        home_state=(worker.home_state or "").strip().lower() or None,
+    )
+
+
+@functools.lru_cache(maxsize=100000)
+def name_similarity(a: str, b: str) -> float:
+    # Common names recur across blocks, so the cache saves most SequenceMatcher runs
+    return 1.0 if a == b else difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def score_pair(a: dict, b: dict) -> tuple[float, list[str]]:
+    """
+    Agreement weights in the spirit of Fellegi-Sunter over two features()
+    dicts: strong identifiers add a lot when they agree and subtract when
+    both are present and differ.
+    """
+    score, reasons = 0.0, []
+
+    if a["phones"] & b["phones"]:
+        score += 6
+        reasons.append("phone")
+
+    if a["migrant_id"] and b["migrant_id"]:
+        if a["migrant_id"] == b["migrant_id"]:
+            score += 8
+            reasons.append("migrant_id")
+        else:
+            score -= 6
+
+    if a["date_of_birth"] and b["date_of_birth"]:
+        if a["date_of_birth"] == b["date_of_birth"]:
+            score += 4
+            reasons.append("date_of_birth")
+        else:
+            score -= 4
+    elif a["age"] is not None and b["age"] is not None:
+        if abs(a["age"] - b["age"]) <= 2:
+            score += 1
+            reasons.append("age")
+        elif abs(a["age"] - b["age"]) > 5:
+            score -= 3
+
+    similarity = name_similarity(*sorted((a["full_name"], b["full_name"])))
+    if similarity >= 0.9:
+        score += 4
+        reasons.append("name")
+    elif a["name_code"] == b["name_code"]:
+        score += 3
+        reasons.append("phonetic_name")
+    elif similarity >= 0.75:
+        score += 1
+        reasons.append("similar_name")
+    else:
+        score -= 3
+
+    if a["gender"] and b["gender"] and a["gender"] != b["gender"]:
+        score -= 5
+
+    if a["home_state"] and b["home_state"]:
+        if a["home_state"] == b["home_state"]:
+            score += 1
+            reasons.append("home_state")
+        else:
+            score -= 1
+
+    return score, reasons
+
+
+# Candidate generation
+
+def _pairs_within_blocks(executor):
+    """Every pair sharing a usable blocking key, as one self-join on the key index."""
+    a, b = aliased(WorkerBlockingKey), aliased(WorkerBlockingKey)
+    oversized = (
+        select(WorkerBlockingKey.key)
+        .group_by(WorkerBlockingKey.key)
+        .having(func.count() > MAX_BLOCK_SIZE)
+    )
+    query = (
+        select(a.worker_id, b.worker_id)
+        .join(b, and_(a.key == b.key, a.worker_id < b.worker_id))
+        .where(a.key.not_in(oversized))
+        .distinct()
+    )
+    return {tuple(row) for row in executor.execute(query)}
+
+
+def _pairs_for_worker(executor, worker_id):
+    keys = executor.scalars(select(WorkerBlockingKey.key).where(WorkerBlockingKey.worker_id == worker_id)).all()
+    if not keys:
+        return set()
+    usable = [
+        key for key, n in executor.execute(
+            select(WorkerBlockingKey.key, func.count())
+            .where(WorkerBlockingKey.key.in_(keys))
+            .group_by(WorkerBlockingKey.key)
+        ) if n <= MAX_BLOCK_SIZE
+    ]
+    if not usable:
+        return set()
+    others = executor.scalars(
+        select(WorkerBlockingKey.worker_id).distinct()
+        .where(WorkerBlockingKey.key.in_(usable), WorkerBlockingKey.worker_id != worker_id)
+    ).all()
+    return {(min(worker_id, other), max(worker_id, other)) for other in others}
+
+
+def find_duplicates(worker_ids=None, executor=None) -> int:
+    """
+    Scores candidate pairs from the blocking index and stores those above
+    MATCH_THRESHOLD as open DuplicateCandidates. With worker_ids only pairs
+    involving those workers are considered. Pairs already on record (in any
+    status) are skipped. Returns the number of new candidates.
+    """
+    executor = executor or db.session
+    if worker_ids is None:
+        pairs = _pairs_within_blocks(executor)
+        known = {tuple(row) for row in executor.execute(select(DuplicateCandidate.worker_id, DuplicateCandidate.other_worker_id))}
+    else:
+        pairs = set()
+        for worker_id in worker_ids:
+            pairs |= _pairs_for_worker(executor, worker_id)
+        involved = {w for pair in pairs for w in pair}
+        known = {tuple(row) for row in executor.execute(
+            select(DuplicateCandidate.worker_id, DuplicateCandidate.other_worker_id)
+            .where(DuplicateCandidate.worker_id.in_(involved), DuplicateCandidate.other_worker_id.in_(involved))
+        )} if involved else set()
+    pairs = sorted(pairs - known)
+
+    found, workers = 0, {}
+    for start in range(0, len(pairs), PAIR_BATCH_SIZE):
+        batch = pairs[start:start + PAIR_BATCH_SIZE]
+        if len(workers) > FEATURE_CACHE_SIZE:
+            workers.clear()
+        missing = {w for pair in batch for w in pair} - workers.keys()
+        if missing:
+            workers.update(
+                (row.id, features(row)) for row in executor.execute(select(*LINK_COLUMNS).where(Worker.id.in_(missing)))
+            )
+        rows = []
+        for worker_id, other_id in batch:
+            if worker_id not in workers or other_id not in workers:
+                continue
+            score, reasons = score_pair(workers[worker_id], workers[other_id])
+            if score >= MATCH_THRESHOLD:
+                rows.append(dict(worker_id=worker_id, other_worker_id=other_id, score=score,
+                                 reasons=",".join(reasons), status=OPEN, created_on=datetime.utcnow()))
+        if rows:
+            executor.execute(insert(DuplicateCandidate), rows)
+            found += len(rows)
+    if worker_ids is None:
+        logging.info(f"Duplicate detection scored {len(pairs)} new pairs, {found} probable duplicates.")
+    return found
+
+
+def rebuild_blocking_keys(batch_size: int = 5000) -> int:
+    """Rebuilds the whole blocking index (after bulk loads that bypass the ORM hooks)."""
+    db.session.execute(delete(WorkerBlockingKey))
+    last_id, indexed = 0, 0
+    while True:
+        workers = db.session.execute(
+            select(*LINK_COLUMNS).where(Worker.id > last_id).order_by(Worker.id).limit(batch_size)
+        ).all()
+        if not workers:
+            db.session.commit()
+            return indexed
+        rows = [dict(worker_id=w.id, key=key) for w in workers for key in blocking_keys(w)]
+        if rows:
+            db.session.execute(insert(WorkerBlockingKey), rows)
+        db.session.commit()
+        indexed += len(workers)
+        last_id = workers[-1].id
+
+
+def index_workers(worker_ids: list[int], executor=None) -> int:
+    """
+    Indexes workers inserted in bulk and looks for their duplicates, as the
+    insert hook does one worker at a time. Returns the new candidates found.
+    """
+    executor = executor or db.session
+    workers = executor.execute(select(*LINK_COLUMNS).where(Worker.id.in_(worker_ids))).all()
+    rows = [dict(worker_id=w.id, key=key) for w in workers for key in blocking_keys(w)]
+    if rows:
+        executor.execute(insert(WorkerBlockingKey), rows)
+    return find_duplicates(worker_ids, executor=executor)
+
+
+def _index_worker(connection, worker):
+    connection.execute(delete(WorkerBlockingKey).where(WorkerBlockingKey.worker_id == worker.id))
+    keys = blocking_keys(worker)
+    if keys:
+        connection.execute(insert(WorkerBlockingKey), [dict(worker_id=worker.id, key=key) for key in keys])
+    find_duplicates([worker.id], executor=connection)
+
+
+@event.listens_for(Worker, "after_insert")
+def _link_new_worker(mapper, connection, worker):
+    _index_worker(connection, worker)
+
+
+@event.listens_for(Worker, "after_update")
+def _link_changed_worker(mapper, connection, worker):
+    state = db.inspect(worker)
+    if any(state.attrs[field].history.has_changes() for field in LINK_FIELDS):
+        _index_worker(connection, worker)
+
+
+# Review and merge
+
+def _candidates(min_score, status, limit):
+    a, b = aliased(Worker), aliased(Worker)
+    rows = db.session.execute(
+        select(DuplicateCandidate, a, b)
+        # Outer joins: a merged pair has lost one of its workers
+        .outerjoin(a, a.id == DuplicateCandidate.worker_id)
+        .outerjoin(b, b.id == DuplicateCandidate.other_worker_id)
+        .where(DuplicateCandidate.status == status, DuplicateCandidate.score >= min_score)
+        .order_by(DuplicateCandidate.score.desc(), DuplicateCandidate.id)
+        .limit(limit)
+    ).all()
+
+    def describe(worker, worker_id):
+        if worker is None:
+            return dict(id=worker_id, removed=True)
+        return dict(
+            id=worker.id,
+            name=f"{worker.first_name} {worker.last_name or ''}".strip(),
+            phone=worker.phone,
+            migrant_id_number=worker.migrant_id_number,
+            date_of_birth=worker.date_of_birth.isoformat() if worker.date_of_birth else None,
+            age=worker.age,
+            gender=worker.gender.value if worker.gender else None,
+            home_state=worker.home_state,
+        )
+
+    return [
+        dict(id=candidate.id, score=candidate.score, reasons=(candidate.reasons or "").split(","),
+             status=candidate.status, worker=describe(first, candidate.worker_id),
+             other_worker=describe(second, candidate.other_worker_id))
+        for candidate, first, second in rows
+    ]
+
+
+def open_candidates(min_score: float = MATCH_THRESHOLD, status: str = OPEN, page: int = 1, per_page: int = 50):
+    """
+    One page of candidates, best first, with both workers' identifying fields
+    side by side. Pairs are found within a shard, so each shard has its own.
+    """
+    offset = (page - 1) * per_page
+    per_shard = shard_router.fan_out(_candidates, min_score, status, offset + per_page + 1)
+    items = list(heapq.merge(*per_shard.values(), key=lambda item: (-item["score"], item["id"])))
+    items = items[offset:offset + per_page + 1]
+    return dict(page=page, per_page=per_page, has_next=len(items) > per_page, items=items[:per_page])
+
+
+def merge_workers(keep_id: int, duplicate_id: int, reviewed_by_user_id: int | None = None) -> dict:
+    """
+    Folds the duplicate worker into the kept one: every table with a
+    worker_id foreign key is repointed, blank profile fields are filled in
+    from the duplicate, and the duplicate worker row is removed. The
+    duplicate's login account is left in place. Returns rows moved per table.
+    """
+    if keep_id == duplicate_id:
+        raise ValueError("Cannot merge a worker into itself.")
+    keep = db.session.get(Worker, keep_id)
+    duplicate = db.session.get(Worker, duplicate_id)
+    if keep is None or duplicate is None:
+        raise ValueError("Both workers must exist.")
+
+    moved = {}
+    skip = {Worker.__tablename__, WorkerBlockingKey.__tablename__, DuplicateCandidate.__tablename__,
+            WorkerHealthSnapshot.__tablename__, ActivityRollup.__tablename__}
+    for table in db.metadata.sorted_tables:
+        column = table.c.get("worker_id")
+        if table.name in skip or column is None:
+            continue
+        if not any(fk.column.table.name == Worker.__tablename__ for fk in column.foreign_keys):
+            continue
+        result = db.session.execute(update(table).where(column == duplicate_id).values(worker_id=keep_id))
+        if result.rowcount:
+            moved[table.name] = result.rowcount
+    # Rollups are summed, not moved: both workers can have a row for the same day
+    merge_rollups(keep_id, duplicate_id)
+
+    fill = {
+        attr.key: getattr(duplicate, attr.key)
+        for attr in db.inspect(Worker).column_attrs
+        if attr.key not in ("id", "user_id")
+        and getattr(keep, attr.key) is None and getattr(duplicate, attr.key) is not None
+    }
+    if keep.phone and duplicate.phone and not keep.contact_number \
+            and normalise_phone(keep.phone) != normalise_phone(duplicate.phone):
+        fill["contact_number"] = duplicate.phone
+
+    pair = (DuplicateCandidate.worker_id == min(keep_id, duplicate_id)) \
+        & (DuplicateCandidate.other_worker_id == max(keep_id, duplicate_id))
+    merged = dict(status=MERGED, reviewed_by_user_id=reviewed_by_user_id, reviewed_on=datetime.utcnow())
+    if not db.session.execute(update(DuplicateCandidate).where(pair).values(**merged)).rowcount:
+        db.session.execute(insert(DuplicateCandidate).values(
+            worker_id=min(keep_id, duplicate_id), other_worker_id=max(keep_id, duplicate_id), score=0.0,
+            reasons="manual", created_on=datetime.utcnow(), **merged
+        ))
+    # Other open suggestions for the duplicate are re-found against the kept worker
+    db.session.execute(delete(DuplicateCandidate).where(
+        or_(DuplicateCandidate.worker_id == duplicate_id, DuplicateCandidate.other_worker_id == duplicate_id),
+        DuplicateCandidate.status == OPEN
+    ))
+
+    # The duplicate's children now belong to the kept worker, so its row goes
+    # without the ORM cascades; that also frees its unique phone/migrant id.
+    db.session.execute(delete(WorkerBlockingKey).where(WorkerBlockingKey.worker_id == duplicate_id))
+    db.session.execute(delete(WorkerHealthSnapshot).where(WorkerHealthSnapshot.worker_id == duplicate_id))
+    refresh_snapshots([keep_id])
+    invalidate_after_commit(db.session, [keep_id, duplicate_id])
+    db.session.expunge(duplicate)
+    db.session.execute(delete(Worker).where(Worker.id == duplicate_id))
+
+    for key, value in fill.items():
+        setattr(keep, key, value)
+    db.session.commit()
+    find_duplicates([keep_id])
+    db.session.commit()
+    vaccination_schedule.invalidate()
+    population_analytics.invalidate()
+    logging.info(f"Merged worker {duplicate_id} into {keep_id}: {moved}")
+    return moved
+
+
+def review_candidate(candidate_id: int, status: str, reviewed_by_user_id: int | None = None):
+    candidate = db.session.get(DuplicateCandidate, candidate_id)
+    if candidate is None:
+        raise ValueError("Unknown duplicate candidate.")
+    candidate.status = status
+    candidate.reviewed_by_user_id = reviewed_by_user_id
+    candidate.reviewed_on = datetime.utcnow()
+    db.session.commit()
+    return candidate
@@ -0,0 +1,159 @@
+import hmac
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import request, abort, Response
+from flask_login import current_user
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Route latency is mostly in the 5 ms - 1 s range; report phases (LLM, PDF) run for seconds
+LATENCY_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500)
+SQL_TIME_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5)
+PHASE_BUCKETS = (.01, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+registry = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    "curavie_request_duration_seconds", "Time to build a response, by endpoint.",
+    ["endpoint", "method", "status"], buckets=LATENCY_BUCKETS, registry=registry
+)
+REQUEST_SQL_STATEMENTS = Histogram(
+    "curavie_request_sql_statements", "SQL statements executed per request, by endpoint.",
+    ["endpoint"], buckets=SQL_COUNT_BUCKETS, registry=registry
+)
+REQUEST_SQL_DURATION = Histogram(
+    "curavie_request_sql_duration_seconds", "Time spent in SQL per request, by endpoint.",
+    ["endpoint"], buckets=SQL_TIME_BUCKETS, registry=registry
+)
+REPORT_PHASE_DURATION = Histogram(
+    "curavie_report_phase_duration_seconds", "Time spent in each phase of health report generation.",
+    ["phase"], buckets=PHASE_BUCKETS, registry=registry
+)
+CACHE_REQUESTS = Counter(
+    "curavie_cache_requests_total", "Cached worker view reads, by view and result (hit, miss, error).",
+    ["view", "result"], registry=registry
+)
+CACHE_INVALIDATIONS = Counter(
+    "curavie_cache_invalidations_total", "Workers whose cached views were dropped after a commit.",
+    registry=registry
+)
+
+
+class _RequestTimer:
+    __slots__ = ("started", "statements", "sql_seconds", "statement_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.statement_started = 0.0
+
+
+# The timer of the request being handled in this thread/context; None outside requests
+# (CLI commands, the audit writer thread), where SQL is not attributed to anything.
+_current = ContextVar("request_timer", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current.get()
+    if timer is not None:
+        timer.statement_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current.get()
+    if timer is not None:
+        timer.statements += 1
+        timer.sql_seconds += time.perf_counter() - timer.statement_started
+
+
+class RequestMetrics:
+    """
+    Times every request and the SQL it runs, into Prometheus histograms
+    labelled by endpoint (the route name, so label cardinality stays fixed).
+    The cost per request is a few perf_counter calls and three histogram
+    observations; the SQL hooks only add to counters on the request's timer.
+
+    Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty writable
+    directory before the app starts so /metrics reports every worker rather
+    than whichever one answered the scrape.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", True)
+        # Bearer token for the Prometheus scraper; admins can always read /metrics
+        app.config.setdefault("METRICS_TOKEN", os.getenv("METRICS_TOKEN"))
+        self.app = app
+        app.extensions["metrics"] = self
+        if not app.config["METRICS_ENABLED"]:
+            return
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        # First in line, so requests rejected by other hooks (CSRF, login) are timed too
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._reset)
+
+    @staticmethod
+    def _start():
+        request.environ["curavie.metrics_token"] = _current.set(_RequestTimer())
+
+    @staticmethod
+    def _finish(response):
+        timer = _current.get()
+        if timer is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_LATENCY.labels(endpoint, request.method, response.status_code).observe(time.perf_counter() - timer.started)
+        REQUEST_SQL_STATEMENTS.labels(endpoint).observe(timer.statements)
+        REQUEST_SQL_DURATION.labels(endpoint).observe(timer.sql_seconds)
+        return response
+
+    @staticmethod
+    def _reset(exc=None):
+        token = request.environ.pop("curavie.metrics_token", None)
+        if token is not None:
+            _current.reset(token)
+
+    def authorized(self) -> bool:
+        token = self.app.config["METRICS_TOKEN"]
+        header = request.headers.get("Authorization", "")
+        if token and hmac.compare_digest(header, f"Bearer {token}"):
+            return True
+        return current_user.is_authenticated and current_user.role.value == "admin"
+
+    def response(self) -> Response:
+        """The Prometheus exposition of every metric, for the /metrics route."""
+        if not self.authorized():
+            abort(403)
+        if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+            scrape = CollectorRegistry()
+            multiprocess.MultiProcessCollector(scrape)
+        else:
+            scrape = registry
+        return Response(generate_latest(scrape), content_type=CONTENT_TYPE_LATEST)
+
+
+request_metrics = RequestMetrics()
+
+
+@contextmanager
+def report_phase(phase: str):
+    """Times one phase of report generation: `with report_phase("llm"): ...`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REPORT_PHASE_DURATION.labels(phase).observe(time.perf_counter() - started)
@@ -256,10 +256,9 @@ class Vaccination(db.Model):
 
 
 # New extended medical schema (restored)
-class MedicalCheckup(db.Model):
-    __tablename__ = "medical_checkups"
-    id = db.Column(db.Integer, primary_key=True)
-    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id"), nullable=False, index=True)
+# The clinical columns live in mixins so the hot tables below and their
+# *_archive counterparts (see archival.py) always share one definition.
+class MedicalCheckupColumns:
     date_of_checkup = db.Column(db.Date, nullable=False, default=datetime.utcnow)
 
     # Vitals / Examination
@@ -281,20 +280,17 @@ class MedicalCheckup(db.Model):
     disease_prediction_score = db.Column(db.Float)
     checkup_type = db.Column(Enum(CheckupTypeEnum))
     geo_location = db.Column(db.String(100))
+    # Facility that entered the checkup (None when a worker entered it themselves)
+    facility_id = db.Column(db.Integer, db.ForeignKey("healthcare_facilities.id"), index=True)
+    # Parsed from geo_location at write time (see geo.py)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12), index=True)
     data_entry_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     record_status = db.Column(Enum(RecordStatusEnum), default=RecordStatusEnum.ACTIVE)
 
-    # Relationships
-    worker = db.relationship("Worker", backref=db.backref("medical_checkups", cascade="all, delete-orphan"))
-    lab_results = db.relationship("LabResults", back_populates="checkup", uselist=False, cascade="all, delete-orphan")
-    doctor_evaluation = db.relationship("DoctorEvaluation", back_populates="checkup", uselist=False, cascade="all, delete-orphan")
-
-
-class LabResults(db.Model):
-    __tablename__ = "lab_results"
-    id = db.Column(db.Integer, primary_key=True)
-    checkup_id = db.Column(db.Integer, db.ForeignKey("medical_checkups.id"), nullable=False, unique=True)
 
+class LabResultsColumns:
     hemoglobin_g_dl = db.Column(db.Float)
     blood_sugar_fasting = db.Column(db.Float)
     blood_sugar_postprandial = db.Column(db.Float)
@@ -313,14 +309,8 @@ class LabResults(db.Model):
     xray_chest_result = db.Column(Enum(NormalAbnormalEnum))
     ecg_result = db.Column(Enum(NormalAbnormalEnum))
 
-    checkup = db.relationship("MedicalCheckup", back_populates="lab_results")
-
-
-class DoctorEvaluation(db.Model):
-    __tablename__ = "doctor_evaluations"
-    id = db.Column(db.Integer, primary_key=True)
-    checkup_id = db.Column(db.Integer, db.ForeignKey("medical_checkups.id"), nullable=False, unique=True)
 
+class DoctorEvaluationColumns:
     doctor_name = db.Column(db.String(255))
     doctor_registration_number = db.Column(db.String(120))
     general_physical_findings = db.Column(db.Text)
@@ -336,9 +326,74 @@ class DoctorEvaluation(db.Model):
     report_generated_on = db.Column(db.DateTime, default=datetime.utcnow)
     remarks = db.Column(db.Text)
 
+
+class MedicalCheckup(MedicalCheckupColumns, db.Model):
+    __tablename__ = "medical_checkups"
+    __table_args__ = (
+        db.Index("ix_medical_checkups_worker_date", "worker_id", "date_of_checkup"),
+        db.Index("ix_medical_checkups_date", "date_of_checkup"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id"), nullable=False, index=True)
+
+    # Relationships
+    worker = db.relationship("Worker", backref=db.backref("medical_checkups", cascade="all, delete-orphan"))
+    lab_results = db.relationship("LabResults", back_populates="checkup", uselist=False, cascade="all, delete-orphan")
+    doctor_evaluation = db.relationship("DoctorEvaluation", back_populates="checkup", uselist=False, cascade="all, delete-orphan")
+
+
+class LabResults(LabResultsColumns, db.Model):
+    __tablename__ = "lab_results"
+    id = db.Column(db.Integer, primary_key=True)
+    checkup_id = db.Column(db.Integer, db.ForeignKey("medical_checkups.id"), nullable=False, unique=True)
+
+    checkup = db.relationship("MedicalCheckup", back_populates="lab_results")
+
+
+class DoctorEvaluation(DoctorEvaluationColumns, db.Model):
+    __tablename__ = "doctor_evaluations"
+    __table_args__ = (
+        db.Index("ix_doctor_evaluations_follow_up", "follow_up_required", "follow_up_date"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    checkup_id = db.Column(db.Integer, db.ForeignKey("medical_checkups.id"), nullable=False, unique=True)
+
     checkup = db.relationship("MedicalCheckup", back_populates="doctor_evaluation")
 
 
+# Cold storage for historical checkups. Rows keep their original ids so
+# archiving is idempotent and lab/evaluation rows still point at the same
+# checkup id. Only archival.py writes here.
+class ArchivedMedicalCheckup(MedicalCheckupColumns, db.Model):
+    __tablename__ = "medical_checkups_archive"
+    __table_args__ = (
+        db.Index("ix_medical_checkups_archive_worker_date", "worker_id", "date_of_checkup"),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id"), nullable=False)
+    archived_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    worker = db.relationship("Worker")
+    lab_results = db.relationship("ArchivedLabResults", back_populates="checkup", uselist=False)
+    doctor_evaluation = db.relationship("ArchivedDoctorEvaluation", back_populates="checkup", uselist=False)
+
+
+class ArchivedLabResults(LabResultsColumns, db.Model):
+    __tablename__ = "lab_results_archive"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    checkup_id = db.Column(db.Integer, db.ForeignKey("medical_checkups_archive.id"), nullable=False, unique=True)
+
+    checkup = db.relationship("ArchivedMedicalCheckup", back_populates="lab_results")
+
+
+class ArchivedDoctorEvaluation(DoctorEvaluationColumns, db.Model):
+    __tablename__ = "doctor_evaluations_archive"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    checkup_id = db.Column(db.Integer, db.ForeignKey("medical_checkups_archive.id"), nullable=False, unique=True)
+
+    checkup = db.relationship("ArchivedMedicalCheckup", back_populates="doctor_evaluation")
+
+
 class AuditTrail(db.Model):
     __tablename__ = "audit_trail"
     id = db.Column(db.Integer, primary_key=True)
@@ -347,4 +402,188 @@ class AuditTrail(db.Model):
     action = db.Column(db.String(50), nullable=False)
     actor_user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    remarks = db.Column(db.Text)
\ No newline at end of file
+    remarks = db.Column(db.Text)
+
+
+class PositiveResultCount(db.Model):
+    """
+    Daily counts of positive infectious-disease lab results per location cell,
+    work location and employer. Maintained on every LabResults write by
+    outbreak.py so spike detection never has to scan lab_results.
+    """
+    __tablename__ = "positive_result_counts"
+    __table_args__ = (
+        db.UniqueConstraint("dimension", "group_key", "disease", "day", name="uq_positive_result_counts"),
+        db.Index("ix_positive_result_counts_day", "day"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    dimension = db.Column(db.String(20), nullable=False)  # 'cell', 'work_location' or 'employer'
+    group_key = db.Column(db.String(255), nullable=False)
+    disease = db.Column(db.String(30), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ActivityRollup(db.Model):
+    """
+    Minutes and entries of logged activity per worker, activity type and
+    day or ISO week (period_start is the Monday). Maintained on every
+    ActivityLog write by activity.py, and the only record of activity
+    older than the retention period once raw logs are compacted.
+    """
+    __tablename__ = "activity_rollups"
+    __table_args__ = (
+        db.UniqueConstraint("worker_id", "period", "period_start", "activity_type", name="uq_activity_rollups"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id", ondelete="CASCADE"), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # 'day' or 'week'
+    period_start = db.Column(db.Date, nullable=False)
+    activity_type = db.Column(db.String(100), nullable=False, default="")  # '' when none was given
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+    entries = db.Column(db.Integer, nullable=False, default=0)
+
+
+class WorkerHealthSnapshot(db.Model):
+    """
+    Each worker's current health at a glance: vitals and key labs from the
+    latest checkup, its evaluation's fitness status and open follow-up, and
+    the last vaccination and visit. Maintained by snapshot.py on every write
+    to those records, so dashboards and lists read one row by primary key.
+    """
+    __tablename__ = "worker_health_snapshot"
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id", ondelete="CASCADE"), primary_key=True)
+
+    latest_checkup_id = db.Column(db.Integer)
+    latest_checkup_date = db.Column(db.Date)
+    bmi = db.Column(db.Float)
+    weight_kg = db.Column(db.Float)
+    blood_pressure_systolic = db.Column(db.Integer)
+    blood_pressure_diastolic = db.Column(db.Integer)
+    pulse_rate = db.Column(db.Integer)
+    temperature_celsius = db.Column(db.Float)
+    oxygen_saturation = db.Column(db.Integer)
+    risk_category = db.Column(db.String(50))
+    disease_prediction_score = db.Column(db.Float)
+
+    hemoglobin_g_dl = db.Column(db.Float)
+    blood_sugar_fasting = db.Column(db.Float)
+    blood_sugar_postprandial = db.Column(db.Float)
+    cholesterol_total = db.Column(db.Float)
+
+    fitness_status = db.Column(Enum(FitnessStatusEnum))
+    next_follow_up_date = db.Column(db.Date)
+
+    last_vaccine_name = db.Column(db.String(100))
+    last_vaccine_dose = db.Column(db.Integer)
+    last_vaccination_date = db.Column(db.Date)
+    last_visit_date = db.Column(db.Date)
+    last_visit_facility_id = db.Column(db.Integer)
+
+    updated_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class FollowUpReminder(db.Model):
+    """One reminder event per follow-up, emitted in bulk by followups.py."""
+    __tablename__ = "follow_up_reminders"
+    id = db.Column(db.Integer, primary_key=True)
+    evaluation_id = db.Column(db.Integer, db.ForeignKey("doctor_evaluations.id", ondelete="CASCADE"), nullable=False, unique=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id"), nullable=False, index=True)
+    facility_id = db.Column(db.Integer, db.ForeignKey("healthcare_facilities.id"), index=True)
+    follow_up_date = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)  # 'due' or 'overdue'
+    created_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class WorkerBlockingKey(db.Model):
+    """
+    Record-linkage blocking index: each worker's normalised phone, migrant
+    id and phonetic-name keys, maintained by linkage.py on every Worker
+    write. Duplicate candidates are only ever compared within a key.
+    """
+    __tablename__ = "worker_blocking_keys"
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id", ondelete="CASCADE"), primary_key=True)
+    key = db.Column(db.String(160), primary_key=True, index=True)
+
+
+class DuplicateCandidate(db.Model):
+    """
+    A scored pair of workers that probably belong to the same person
+    (worker_id < other_worker_id). The ids are deliberately not foreign keys
+    so reviewed pairs, including merges, outlive the removed worker.
+    """
+    __tablename__ = "worker_duplicate_candidates"
+    __table_args__ = (
+        db.UniqueConstraint("worker_id", "other_worker_id", name="uq_worker_duplicate_candidates"),
+        db.Index("ix_worker_duplicate_candidates_status_score", "status", "score"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, nullable=False)
+    other_worker_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+    reasons = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default="open")  # 'open', 'dismissed' or 'merged'
+    created_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    reviewed_by_user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    reviewed_on = db.Column(db.DateTime)
+
+
+class SyncRecord(db.Model):
+    """Client-generated id -> server row, so offline batches can be re-sent safely (see sync.py)."""
+    __tablename__ = "sync_records"
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.String(64), nullable=False, unique=True)
+    entity_type = db.Column(db.String(30), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    device_id = db.Column(db.String(100))
+    created_by_user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    created_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class SyncChange(db.Model):
+    """
+    Append-only change log of synced entities; `seq` is the cursor handed
+    to offline clients. Written by mapper events in sync.py.
+    """
+    __tablename__ = "sync_changes"
+    __table_args__ = (
+        db.Index("ix_sync_changes_worker_seq", "worker_id", "seq"),
+    )
+    seq = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(30), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    worker_id = db.Column(db.Integer, nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    device_id = db.Column(db.String(100))
+    changed_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class WorkerPlacement(db.Model):
+    """
+    Which shard holds a user's worker profile, for logins (see sharding.py).
+    Lives in the main database; workers without a row are on the main one.
+    """
+    __tablename__ = "worker_placements"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    shard = db.Column(db.String(50), nullable=False)
+    placed_on = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ClinicalTerm(db.Model):
+    """
+    Full-text index over clinical free text: one row per term of a visit's
+    diagnosis or an evaluation's diagnosis, findings, recommendations and
+    remarks, with its field-weighted frequency. Maintained by
+    clinical_search.py on every write; archived evaluations keep their ids,
+    so their rows stay valid after archival.py moves them.
+    """
+    __tablename__ = "clinical_terms"
+    __table_args__ = (
+        db.Index("ix_clinical_terms_record", "source", "record_id"),
+    )
+    term = db.Column(db.String(64), primary_key=True)
+    source = db.Column(db.String(12), primary_key=True)  # 'visit' or 'evaluation'
+    record_id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, db.ForeignKey("workers.id", ondelete="CASCADE"), nullable=False, index=True)
+    record_date = db.Column(db.Date)
+    weight = db.Column(db.Float, nullable=False)
@@ -0,0 +1,207 @@
+import logging
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import event, select, update, insert, func
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import (
+    LabResults, MedicalCheckup, Worker, PositiveResultCount, PositiveNegativeEnum
+)
+from sharding import shard_router
+
+# LabResults column -> disease label used in counts and alerts
+INFECTIOUS_RESULTS = {
+    "hiv_test_result": "hiv",
+    "hepatitis_b_result": "hepatitis_b",
+    "hepatitis_c_result": "hepatitis_c",
+    "tuberculosis_screening_result": "tuberculosis",
+    "malaria_test_result": "malaria",
+}
+
+CELL_PRECISION = 5      # geohash cells of roughly 5 x 5 km
+WINDOW_DAYS = 7         # the window being tested for a spike
+BASELINE_DAYS = 56      # the preceding period that sets the expected rate
+MIN_CASES = 3           # never alert on fewer positives than this
+ALERT_P_VALUE = 0.01    # Poisson tail probability that counts as unusual
+EXPECTED_FLOOR = 0.2    # expected positives per window where there is no history
+
+
+def _groups(checkup_date, geohash, work_location, employer):
+    """The (dimension, key) groups a positive result counts towards."""
+    groups = []
+    if geohash:
+        groups.append(("cell", geohash[:CELL_PRECISION]))
+    if work_location and work_location.strip():
+        groups.append(("work_location", work_location.strip().lower()[:255]))
+    if employer and employer.strip():
+        groups.append(("employer", employer.strip().lower()[:255]))
+    return groups
+
+
+def _bump(connection, dimension, group_key, disease, day, delta):
+    table = PositiveResultCount.__table__
+    match = (
+        (table.c.dimension == dimension) & (table.c.group_key == group_key)
+        & (table.c.disease == disease) & (table.c.day == day)
+    )
+    result = connection.execute(update(table).where(match).values(count=table.c.count + delta))
+    if result.rowcount or delta < 0:
+        return
+    try:
+        # Savepoint so losing an insert race does not abort the lab result's transaction
+        with connection.begin_nested():
+            connection.execute(insert(table).values(
+                dimension=dimension, group_key=group_key, disease=disease, day=day, count=delta
+            ))
+    except IntegrityError:
+        connection.execute(update(table).where(match).values(count=table.c.count + delta))
+
+
+def _record(connection, lab, deltas):
+    if not deltas:
+        return
+    row = connection.execute(
+        select(MedicalCheckup.date_of_checkup, MedicalCheckup.geohash, Worker.work_location, Worker.employer_name)
+        .join(Worker, Worker.id == MedicalCheckup.worker_id)
+        .where(MedicalCheckup.id == lab.checkup_id)
+    ).first()
+    if row is None:
+        return
+    for dimension, group_key in _groups(*row):
+        for disease, delta in deltas.items():
+            _bump(connection, dimension, group_key, disease, row.date_of_checkup, delta)
+
+
+@event.listens_for(LabResults, "after_insert")
+def _count_new_positives(mapper, connection, lab):
+    deltas = {
+        disease: 1 for column, disease in INFECTIOUS_RESULTS.items()
+        if getattr(lab, column) == PositiveNegativeEnum.POSITIVE
+    }
+    _record(connection, lab, deltas)
+
+
+@event.listens_for(LabResults, "before_update")
+def _count_changed_positives(mapper, connection, lab):
+    state = db.inspect(lab)
+    changed = [column for column in INFECTIOUS_RESULTS if state.attrs[column].history.has_changes()]
+    if not changed:
+        return
+    # Old values come from the row itself: after a commit the attribute
+    # history no longer knows what was there before.
+    table = LabResults.__table__
+    stored = connection.execute(select(*[table.c[column] for column in changed]).where(table.c.id == lab.id)).first()
+    if stored is None:
+        return
+    deltas = {}
+    for column, old_value in zip(changed, stored):
+        was_positive = old_value == PositiveNegativeEnum.POSITIVE
+        is_positive = getattr(lab, column) == PositiveNegativeEnum.POSITIVE
+        if was_positive != is_positive:
+            deltas[INFECTIOUS_RESULTS[column]] = 1 if is_positive else -1
+    _record(connection, lab, deltas)
+
+
+def poisson_tail(k: int, expected: float) -> float:
+    """P(X >= k) for X ~ Poisson(expected)."""
+    if k <= 0:
+        return 1.0
+    term = math.exp(-expected)
+    cdf = term
+    for i in range(1, k):
+        term *= expected / i
+        cdf += term
+    return max(0.0, 1.0 - cdf)
+
+
+def _window_counts(today, window_start, baseline_start, dimension):
+    query = (
+        select(
+            PositiveResultCount.dimension, PositiveResultCount.group_key, PositiveResultCount.disease,
+            func.sum(db.case((PositiveResultCount.day >= window_start, PositiveResultCount.count), else_=0)),
+            func.sum(db.case((PositiveResultCount.day < window_start, PositiveResultCount.count), else_=0)),
+        )
+        .where(PositiveResultCount.day >= baseline_start, PositiveResultCount.day <= today)
+        .group_by(PositiveResultCount.dimension, PositiveResultCount.group_key, PositiveResultCount.disease)
+    )
+    if dimension:
+        query = query.where(PositiveResultCount.dimension == dimension)
+    return db.session.execute(query).all()
+
+
+def current_alerts(today: date | None = None, dimension: str | None = None) -> list[dict]:
+    """
+    Groups whose positives in the last WINDOW_DAYS are improbably high given
+    their rate over the preceding BASELINE_DAYS. Only the small daily counts
+    table is read, for the last WINDOW_DAYS + BASELINE_DAYS days, on every
+    shard: a group's workers can be spread over several.
+    """
+    today = today or date.today()
+    window_start = today - timedelta(days=WINDOW_DAYS - 1)
+    baseline_start = window_start - timedelta(days=BASELINE_DAYS)
+
+    totals = defaultdict(lambda: [0, 0])
+    for rows in shard_router.fan_out(_window_counts, today, window_start, baseline_start, dimension).values():
+        for dim, group_key, disease, recent, baseline in rows:
+            total = totals[(dim, group_key, disease)]
+            total[0] += int(recent or 0)
+            total[1] += int(baseline or 0)
+
+    alerts = []
+    for (dim, group_key, disease), (recent, baseline) in totals.items():
+        if recent < MIN_CASES:
+            continue
+        expected = max(baseline * WINDOW_DAYS / BASELINE_DAYS, EXPECTED_FLOOR)
+        p_value = poisson_tail(recent, expected)
+        if p_value < ALERT_P_VALUE:
+            alerts.append(dict(
+                dimension=dim,
+                group=group_key,
+                disease=disease,
+                positives=recent,
+                expected=round(expected, 2),
+                baseline_positives=baseline,
+                p_value=p_value,
+                window_start=window_start.isoformat(),
+                window_end=today.isoformat()
+            ))
+    alerts.sort(key=lambda a: a["p_value"])
+    return alerts
+
+
+def rebuild_counts(days: int = WINDOW_DAYS + BASELINE_DAYS) -> int:
+    """
+    Recomputes the daily counts for the last `days` days from checkups in that
+    date range only (used once when deploying, or to repair drift).
+    """
+    since = date.today() - timedelta(days=days)
+    rows = db.session.execute(
+        select(
+            MedicalCheckup.date_of_checkup, MedicalCheckup.geohash, Worker.work_location, Worker.employer_name,
+            *[getattr(LabResults, column) for column in INFECTIOUS_RESULTS]
+        )
+        .join(LabResults, LabResults.checkup_id == MedicalCheckup.id)
+        .join(Worker, Worker.id == MedicalCheckup.worker_id)
+        .where(MedicalCheckup.date_of_checkup >= since)
+    ).all()
+
+    counts = defaultdict(int)
+    for row in rows:
+        groups = _groups(*row[:4])
+        for result, disease in zip(row[4:], INFECTIOUS_RESULTS.values()):
+            if result == PositiveNegativeEnum.POSITIVE:
+                for dimension, group_key in groups:
+                    counts[(dimension, group_key, disease, row[0])] += 1
+
+    db.session.execute(PositiveResultCount.__table__.delete().where(PositiveResultCount.day >= since))
+    if counts:
+        db.session.execute(insert(PositiveResultCount), [
+            dict(dimension=d, group_key=g, disease=disease, day=day, count=c)
+            for (d, g, disease, day), c in counts.items()
+        ])
+    db.session.commit()
+    logging.info(f"Rebuilt {len(counts)} positive result counts since {since}.")
+    return len(counts)
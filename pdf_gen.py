@@ -1,5 +1,4 @@
 from flask import render_template
-from weasyprint import HTML
 from io import BytesIO
 import time
 import random
@@ -21,6 +20,9 @@ def create_report_pdf(report_content: str, worker_name: str) -> BytesIO:
         report_id=f"RPT-{date_str}-{rand}"
     )
 
+    # WeasyPrint loads Pango/Cairo natively, so it is imported on the first report, not at boot
+    from weasyprint import HTML
+
     # Create a PDF file in memory
     pdf_file = BytesIO()
     HTML(string=rendered_html).write_pdf(pdf_file)
@@ -0,0 +1,245 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select, event, inspect
+from sqlalchemy.orm import Session
+
+from database import db
+from metrics import CACHE_REQUESTS, CACHE_INVALIDATIONS
+from models import Worker, MedicalCheckup
+
+LOCAL = "local"
+REDIS = "redis"
+NONE = "none"
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 10000
+
+# Cached views of a worker and the variants each is stored under; a
+# worker's invalidation drops all of them
+WORKER = "worker"
+RECORDS = "records"
+VARIANTS = {WORKER: ("",), RECORDS: ("hot", "full")}
+
+# Session.info key of the workers written since the last commit
+PENDING = "record_cache_pending"
+
+
+def _models_version() -> str:
+    # Values are pickled ORM rows: a changed model must not read old entries
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "models.py"), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+
+class LocalBackend:
+    """In-process LRU with a TTL. Each gunicorn worker has its own, so it also stands in for Redis in tests."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+
+class RedisBackend:
+    """Any Redis-protocol server, shared by every process, through a redis-py compatible client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis    # only needed when CACHE_BACKEND is "redis"
+        return cls(redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, *keys):
+        self.client.delete(*keys)
+
+
+class RecordCache:
+    """
+    Serialized worker profiles and medical record lists for the facility
+    pages, in a pluggable backend (CACHE_BACKEND: "local" LRU per process,
+    "redis" shared via CACHE_REDIS_URL, or "none"). Entries are dropped when
+    a commit touches the worker (see the session hooks below) and expire
+    after CACHE_TTL seconds, which bounds how stale another process's local
+    LRU can get. A backend that fails is treated as a miss, never an error.
+
+    Cached rows come back detached: only their columns and the relationships
+    loaded with them (a checkup's lab results and evaluation) are readable.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = None
+        self.prefix = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", os.getenv("CACHE_BACKEND", LOCAL))
+        app.config.setdefault("CACHE_REDIS_URL", os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0"))
+        app.config.setdefault("CACHE_TTL", int(os.getenv("CACHE_TTL", DEFAULT_TTL)))
+        app.config.setdefault("CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+        app.config.setdefault("CACHE_KEY_PREFIX", "curavie")
+        self.app = app
+        app.extensions["record_cache"] = self
+
+        kind = app.config["CACHE_BACKEND"]
+        if kind == LOCAL:
+            self.backend = LocalBackend(app.config["CACHE_MAX_ENTRIES"])
+        elif kind == REDIS:
+            self.backend = RedisBackend.from_url(app.config["CACHE_REDIS_URL"])
+        elif kind == NONE:
+            self.backend = None
+        else:
+            raise ValueError(f"CACHE_BACKEND must be '{LOCAL}', '{REDIS}' or '{NONE}', got {kind!r}.")
+        self.prefix = f"{app.config['CACHE_KEY_PREFIX']}:{_models_version()}"
+
+    def _key(self, view, worker_id, variant=""):
+        return f"{self.prefix}:{view}:{worker_id}:{variant}"
+
+    def get_or_load(self, view, worker_id, variant, load):
+        """The cached value of `view` for a worker, or load() stored for next time. None is never cached."""
+        if self.backend is None:
+            return load()
+        key = self._key(view, worker_id, variant)
+        try:
+            data = self.backend.get(key)
+        except Exception as e:
+            logging.warning(f"Record cache read failed: {e}")
+            CACHE_REQUESTS.labels(view, "error").inc()
+            return load()
+        if data is not None:
+            CACHE_REQUESTS.labels(view, "hit").inc()
+            return pickle.loads(data)
+
+        CACHE_REQUESTS.labels(view, "miss").inc()
+        value = load()
+        if value is not None:
+            try:
+                self.backend.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.app.config["CACHE_TTL"])
+            except Exception as e:
+                logging.warning(f"Record cache write failed: {e}")
+        return value
+
+    def invalidate(self, worker_ids):
+        """Drops every cached view of `worker_ids` now; writes normally go through the commit hooks instead."""
+        worker_ids = set(worker_ids)
+        if self.backend is None or not worker_ids:
+            return
+        keys = [self._key(view, worker_id, variant)
+                for worker_id in worker_ids for view, variants in VARIANTS.items() for variant in variants]
+        try:
+            self.backend.delete(*keys)
+        except Exception as e:
+            logging.warning(f"Record cache invalidation failed: {e}")
+        CACHE_INVALIDATIONS.inc(len(worker_ids))
+
+
+record_cache = RecordCache()
+
+
+# Cached views
+
+def cached_worker(worker_id: int) -> Worker | None:
+    return record_cache.get_or_load(WORKER, worker_id, "", lambda: db.session.get(Worker, worker_id))
+
+
+def cached_records(worker_id: int, full_history: bool, load) -> dict:
+    """A worker's record lists as returned by load(), e.g. those of app.view_worker_medical_records."""
+    return record_cache.get_or_load(RECORDS, worker_id, "full" if full_history else "hot", load)
+
+
+# Write hooks: note the workers each flush touches, drop their views once committed
+
+def invalidate_after_commit(session, worker_ids):
+    """For bulk Core writes that bypass the ORM: drops the workers' views when `session` commits."""
+    session.info.setdefault(PENDING, set()).update(worker_ids)
+
+
+def _workers_of(session, objects) -> set:
+    worker_ids, checkup_ids = set(), set()
+    for obj in objects:
+        if isinstance(obj, Worker):
+            worker_ids.add(obj.id)
+            continue
+        attrs = inspect(obj).attrs
+        if "worker_id" in attrs:
+            worker_ids.add(obj.worker_id)
+            # Moved to another worker: the old one's lists change too
+            worker_ids.update(attrs.worker_id.history.deleted)
+        elif "checkup_id" in attrs:
+            checkup_ids.add(obj.checkup_id)
+    checkup_ids.discard(None)
+    if checkup_ids:
+        worker_ids.update(session.connection().scalars(
+            select(MedicalCheckup.worker_id).where(MedicalCheckup.id.in_(list(checkup_ids)))
+        ))
+    worker_ids.discard(None)
+    return worker_ids
+
+
+@event.listens_for(Session, "before_flush")
+def _note_deleted_workers(session, flush_context, instances):
+    # Before the flush, while expired attributes of deleted rows can still load
+    if session.deleted:
+        invalidate_after_commit(session, _workers_of(session, session.deleted))
+
+
+@event.listens_for(Session, "after_flush")
+def _note_written_workers(session, flush_context):
+    # After it, so new rows have their ids and relationship-set foreign keys
+    objects = [*session.new, *session.dirty]
+    if objects:
+        invalidate_after_commit(session, _workers_of(session, objects))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    # Also fired when a SAVEPOINT is released: its writes are not committed yet
+    if session.in_nested_transaction():
+        return
+    worker_ids = session.info.pop(PENDING, None)
+    if worker_ids:
+        record_cache.invalidate(worker_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    # A SAVEPOINT rolled back leaves the rest of the transaction's writes pending
+    if not session.in_nested_transaction():
+        session.info.pop(PENDING, None)
@@ -0,0 +1,195 @@
+import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import select, insert, union_all
+from werkzeug.security import generate_password_hash
+
+from database import db
+from linkage import index_workers
+from sharding import shard_router, DEFAULT
+from sync import log_inserted
+from models import User, Worker, WorkerPlacement, GenderEnum, OccupationEnum, UserRoleEnum
+
+MAX_BATCH_WORKERS = 2000
+IN_CHUNK = 1000     # values per IN (...) when reading back generated ids
+
+CREATED = "created"
+CONFLICT = "conflict"
+ERROR = "error"
+
+_PHONE = re.compile(r"^[0-9+]+$")
+_GENDERS = {gender.value: gender for gender in GenderEnum}
+_OCCUPATIONS = {occupation.value: occupation for occupation in OccupationEnum}
+
+
+class RegistrationError(ValueError):
+    pass
+
+
+# Password hashing
+
+_pool = None
+_pool_pid = None
+
+
+def _hash_pool() -> ProcessPoolExecutor:
+    # Pools do not survive a fork, so every gunicorn worker starts its own on first use
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ProcessPoolExecutor(max_workers=int(os.getenv("REGISTRATION_HASH_PROCESSES", 0)) or None)
+        _pool_pid = os.getpid()
+    return _pool
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    """
+    Salted hashes of every password, computed in a process pool so a camp's
+    worth of deliberately slow hashes runs on every core instead of one
+    request thread. Small batches are hashed inline.
+    """
+    if len(passwords) < 4:
+        return [generate_password_hash(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (4 * (os.cpu_count() or 1)))
+    return list(_hash_pool().map(generate_password_hash, passwords, chunksize=chunksize))
+
+
+# Validation (mirrors HospitalRegisterWorkerForm, without its per-row queries)
+
+def _text(record, key, max_length, required=False):
+    value = record.get(key)
+    value = str(value).strip() if value is not None else ""
+    if not value:
+        if required:
+            raise ValueError(f"{key} is required.")
+        return None
+    if len(value) > max_length:
+        raise ValueError(f"{key} must be at most {max_length} characters.")
+    return value
+
+
+def _clean(record, default_password):
+    if not isinstance(record, dict):
+        raise ValueError("Each worker must be an object.")
+    phone = _text(record, "phone", 20, required=True)
+    if len(phone) < 10 or not _PHONE.match(phone):
+        raise ValueError("phone must be 10-20 digits (and +).")
+    try:
+        age = int(record.get("age"))
+    except (TypeError, ValueError):
+        raise ValueError("age must be a whole number.")
+    if not 14 <= age <= 120:
+        raise ValueError("age must be between 14 and 120.")
+    if record.get("gender") not in _GENDERS:
+        raise ValueError(f"gender must be one of {', '.join(_GENDERS)}.")
+    if record.get("occupation") not in _OCCUPATIONS:
+        raise ValueError(f"occupation must be one of {', '.join(_OCCUPATIONS)}.")
+    password = record.get("password") or default_password
+    if not isinstance(password, str) or not 6 <= len(password) <= 128:
+        raise ValueError("password (or the batch default) must be 6-128 characters.")
+    return dict(
+        first_name=_text(record, "first_name", 100, required=True),
+        last_name=_text(record, "last_name", 100),
+        phone=phone,
+        age=age,
+        gender=_GENDERS[record["gender"]],
+        home_state=_text(record, "home_state", 100),
+        occupation=_OCCUPATIONS[record["occupation"]],
+        password=password,
+    )
+
+
+def _placeholder_email(phone):
+    return f"{phone}@placeholder.hospital.com"
+
+
+def _taken(phones) -> set:
+    """Phones already used as a username, placeholder email or worker phone, in one query per database."""
+    emails = {_placeholder_email(phone): phone for phone in phones}
+    taken = set(db.session.execute(union_all(
+        select(User.username).where(User.username.in_(phones)),
+        select(User.email).where(User.email.in_(list(emails))),
+    )).scalars())
+
+    def worker_phones():
+        return db.session.scalars(select(Worker.phone).where(Worker.phone.in_(phones))).all()
+
+    for found in shard_router.fan_out(worker_phones).values():
+        taken.update(found)
+    return {emails.get(value, value) for value in taken}
+
+
+def _ids_by(column, key_column, values) -> dict:
+    ids = {}
+    for start in range(0, len(values), IN_CHUNK):
+        chunk = values[start:start + IN_CHUNK]
+        ids.update((key, id_) for key, id_ in db.session.execute(select(key_column, column).where(key_column.in_(chunk))))
+    return ids
+
+
+def register_workers(records: list, default_password: str | None = None) -> list[dict]:
+    """
+    Registers a batch of workers the way the facility form does (phone as
+    username, placeholder email), with set-based checks and batched inserts
+    instead of a round trip per worker. Records that fail validation or whose
+    phone is already registered (or repeated in the batch) are reported and
+    skipped; the rest are created in one transaction. Returns one result per
+    record, in order: index, status and worker_id or error.
+    """
+    if not isinstance(records, list):
+        raise RegistrationError("workers must be a list.")
+    if len(records) > MAX_BATCH_WORKERS:
+        raise RegistrationError(f"At most {MAX_BATCH_WORKERS} workers per batch.")
+
+    results, valid = [], {}     # valid: phone -> cleaned record, in batch order
+    for index, record in enumerate(records):
+        try:
+            cleaned = _clean(record, default_password)
+        except ValueError as e:
+            results.append(dict(index=index, status=ERROR, error=str(e)))
+            continue
+        if cleaned["phone"] in valid:
+            results.append(dict(index=index, status=CONFLICT, error="phone is repeated in this batch."))
+            continue
+        valid[cleaned["phone"]] = cleaned
+        results.append(dict(index=index, status=CREATED, phone=cleaned["phone"]))
+
+    taken = _taken(list(valid)) if valid else set()
+    for phone in taken & valid.keys():
+        del valid[phone]
+
+    worker_ids = {}
+    if valid:
+        phones = list(valid)
+        hashes = hash_passwords([valid[phone].pop("password") for phone in phones])
+        db.session.execute(insert(User), [
+            dict(username=phone, email=_placeholder_email(phone), password_hash=password_hash, role=UserRoleEnum.NORMAL_USER)
+            for phone, password_hash in zip(phones, hashes)
+        ])
+        user_ids = _ids_by(User.id, User.username, phones)
+
+        # Each worker on the shard the ORM path would place it on (ShardRouter.place)
+        by_shard = defaultdict(list)
+        for phone in phones:
+            by_shard[shard_router.choose(None, valid[phone]["home_state"], phone)].append(phone)
+        for shard, group in by_shard.items():
+            with shard_router.use(shard):
+                db.session.execute(insert(Worker), [dict(valid[phone], user_id=user_ids[phone]) for phone in group])
+                created = _ids_by(Worker.id, Worker.phone, group)
+
+                # What the Worker mapper hooks would have done one row at a time
+                log_inserted(db.session, "worker", [(worker_id, worker_id) for worker_id in created.values()])
+                index_workers(list(created.values()))
+            if shard != DEFAULT:
+                db.session.execute(insert(WorkerPlacement), [dict(user_id=user_ids[phone], shard=shard) for phone in group])
+            worker_ids.update(created)
+        db.session.commit()
+
+    for result in results:
+        phone = result.pop("phone", None)
+        if phone in taken:
+            result.update(status=CONFLICT, error="A user or worker with this phone number already exists.")
+        elif phone is not None:
+            result["worker_id"] = worker_ids[phone]
+    return results
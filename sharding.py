@@ -0,0 +1,403 @@
+import json
+import logging
+import os
+import zlib
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app, has_app_context, request
+from flask_login import current_user
+from sqlalchemy import MetaData, select, insert, update, delete, event, text, case
+from sqlalchemy.orm import Session, object_session
+
+from database import db, current_shard, GLOBAL_TABLES
+from models import Worker, MedicalCheckup, WorkerPlacement, DuplicateCandidate, SyncRecord, SyncChange
+from record_cache import invalidate_after_commit
+
+DEFAULT = "default"             # the main database, always shard 0
+ID_BLOCK = 100_000_000          # ids minted on shard k are in [k * ID_BLOCK, (k + 1) * ID_BLOCK)
+IN_CHUNK = 1000
+REGION_BY = "region"
+
+
+def parse_shard_urls(value: str) -> dict:
+    """'north=mysql+pymysql://...,south=sqlite:///south.db' -> {'north': ..., 'south': ...}, in order."""
+    urls = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"SHARD_URLS entries must be name=url, got {item!r}.")
+        urls[name.strip()] = url.strip()
+    return urls
+
+
+def _chunks(values, size=IN_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _table_name(foreign_key) -> str:
+    return foreign_key.target_fullname.split(".")[0]
+
+
+def shard_metadata() -> MetaData:
+    """
+    The schema of a shard: every table except GLOBAL_TABLES, without the
+    foreign keys into them (users and facilities stay in the main database).
+    """
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        if table.name in GLOBAL_TABLES:
+            continue
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if _table_name(constraint.elements[0]) in GLOBAL_TABLES:
+                copy.constraints.discard(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+        copy.foreign_keys.difference_update([fk for fk in copy.foreign_keys if _table_name(fk) in GLOBAL_TABLES])
+        if copy.autoincrement_column is not None:
+            # SQLite only honours a starting id (sqlite_sequence) on AUTOINCREMENT tables
+            copy.dialect_kwargs["sqlite_autoincrement"] = True
+    return metadata
+
+
+class ShardRouter:
+    """
+    Horizontal sharding of worker data. The main database keeps users,
+    facilities and the audit trail; each shard (SHARD_URLS, also registered
+    as SQLAlchemy binds) holds whole workers: the worker row and every row
+    that belongs to it. db.session routes statements on those tables to
+    the shard in `current_shard` (see database.RoutingSession):
+
+    - ids minted on shard k fall in block k of SHARD_ID_BLOCK, so a worker
+      id alone names its shard and /worker/<id>/... requests go straight
+      to it;
+    - a logged-in worker's shard comes from worker_placements;
+    - new workers are placed by region (SHARD_REGIONS, matched against
+      their work location, then home state) or by a hash of their phone;
+    - cross-worker searches and population-wide pages run on every shard
+      in parallel (fan_out) and merge the results.
+
+    Tables derived from worker data (outbreak counts, the sync change log,
+    duplicate candidates, ...) are kept per shard by the hooks that write
+    them, next to the rows they summarise. With no SHARD_URLS the main
+    database is the only shard and nothing is routed. Shards are numbered
+    in SHARD_URLS order: only ever append.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.names = [DEFAULT]
+        self._pool = None
+        self._pool_pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Call before db.init_app: the shards are added to SQLALCHEMY_BINDS."""
+        app.config.setdefault("SHARD_URLS", parse_shard_urls(os.getenv("SHARD_URLS", "")))
+        app.config.setdefault("SHARD_BY", os.getenv("SHARD_BY", REGION_BY))
+        # Work location or home state (any case) -> shard name, e.g. {"Ernakulam": "central"}
+        app.config.setdefault("SHARD_REGIONS", json.loads(os.getenv("SHARD_REGIONS", "{}")))
+        app.config.setdefault("SHARD_ID_BLOCK", ID_BLOCK)
+        self.app = app
+        app.extensions["shard_router"] = self
+
+        urls = app.config["SHARD_URLS"]
+        if DEFAULT in urls:
+            raise ValueError(f"'{DEFAULT}' is the main database and cannot be listed in SHARD_URLS.")
+        self.names = [DEFAULT] + list(urls)
+        self.regions = {region.strip().lower(): name for region, name in app.config["SHARD_REGIONS"].items()}
+        unknown = set(self.regions.values()) - set(self.names)
+        if unknown:
+            raise ValueError(f"SHARD_REGIONS names unknown shards: {', '.join(sorted(unknown))}.")
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        for name, url in urls.items():
+            binds.setdefault(name, url)
+
+        if self.enabled:
+            # Before any other hook reads worker data (language, metrics are harmless)
+            app.before_request_funcs.setdefault(None, []).insert(0, self._scope_request)
+            app.teardown_request(self._unscope_request)
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.names) > 1
+
+    # Placement and lookup
+
+    @staticmethod
+    def _bind_key(name):
+        return None if name in (None, DEFAULT) else name
+
+    def shard_of(self, worker_id: int) -> str:
+        """Shard of a worker, or of any row minted on a shard (duplicate candidates, change log entries)."""
+        block = worker_id // self.app.config["SHARD_ID_BLOCK"]
+        return self.names[block] if 0 <= block < len(self.names) else DEFAULT
+
+    def shards_of(self, worker_ids) -> dict:
+        """{shard name: [worker ids on it]}"""
+        found = defaultdict(list)
+        for worker_id in worker_ids:
+            found[self.shard_of(worker_id)].append(worker_id)
+        return dict(found)
+
+    @staticmethod
+    def current() -> str:
+        """The shard worker data is routed to here, e.g. in a fan_out function."""
+        return current_shard.get() or DEFAULT
+
+    def choose(self, work_location=None, home_state=None, key=None) -> str:
+        """Shard for a new worker: by region if SHARD_BY is 'region' and one matches, else by hash."""
+        if self.app.config["SHARD_BY"] == REGION_BY:
+            for region in (work_location, home_state):
+                if region and region.strip().lower() in self.regions:
+                    return self.regions[region.strip().lower()]
+        return self.names[zlib.crc32(str(key).encode()) % len(self.names)]
+
+    def place(self, worker) -> str:
+        """
+        Shard of a worker not yet written. Create it there, one worker at a
+        time: `with shard_router.use(shard_router.place(worker)): ...flush`.
+        """
+        return self.choose(worker.work_location, worker.home_state, worker.phone or worker.user_id)
+
+    def shard_of_user(self, user_id: int) -> str:
+        placement = db.session.get(WorkerPlacement, user_id)
+        return placement.shard if placement else DEFAULT
+
+    def locate_checkup(self, checkup_id: int) -> str | None:
+        found = self.fan_out(lambda: db.session.scalar(select(MedicalCheckup.id).where(MedicalCheckup.id == checkup_id)))
+        return next((name for name, checkup in found.items() if checkup is not None), None)
+
+    @contextmanager
+    def use(self, name: str | None):
+        """Routes worker data to shard `name` for the block: `with shard_router.use("north"): ...`"""
+        token = current_shard.set(self._bind_key(name))
+        try:
+            yield
+        finally:
+            current_shard.reset(token)
+
+    def for_worker(self, worker_id: int):
+        return self.use(self.shard_of(worker_id))
+
+    def fan_out(self, fn, *args) -> dict:
+        """
+        Runs fn(*args) against every shard in parallel, each in its own app
+        context and session, and returns {shard name: result}. Returned
+        ORM objects are detached: their loaded columns stay readable.
+        """
+        if not self.enabled:
+            return {DEFAULT: fn(*args)}
+        app = current_app._get_current_object()
+
+        def run(name):
+            with app.app_context(), self.use(name):
+                return fn(*args)
+
+        return dict(zip(self.names, self._executor().map(run, self.names)))
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive a fork, so every gunicorn worker starts its own pool
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=2 * len(self.names), thread_name_prefix="shard")
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    # Request scoping
+
+    def _scope_request(self):
+        view_args = request.view_args or {}
+        if "worker_id" in view_args:
+            shard = self.shard_of(view_args["worker_id"])
+        elif "candidate_id" in view_args:
+            shard = self.shard_of(view_args["candidate_id"])
+        elif "checkup_id" in view_args:
+            shard = self.locate_checkup(view_args["checkup_id"])
+        elif current_user.is_authenticated:
+            shard = self.shard_of_user(current_user.id)
+        else:
+            return
+        current_shard.set(self._bind_key(shard))
+
+    @staticmethod
+    def _unscope_request(exc=None):
+        # Worker threads are reused across requests
+        current_shard.set(None)
+
+    # Administration
+
+    def create_schemas(self) -> list[str]:
+        """Creates the shard schema on every shard and moves each one's id sequences to its block."""
+        metadata = shard_metadata()
+        for index, name in enumerate(self.names[1:], start=1):
+            engine = db.engines[name]
+            metadata.create_all(engine)
+            with engine.begin() as connection:
+                for table in metadata.sorted_tables:
+                    if table.autoincrement_column is not None:
+                        self._start_ids(connection, table, index * self.app.config["SHARD_ID_BLOCK"])
+        return self.names[1:]
+
+    @staticmethod
+    def _start_ids(connection, table, start):
+        dialect = connection.dialect.name
+        column = table.autoincrement_column.name
+        if dialect == "sqlite":
+            if connection.scalar(text("SELECT count(*) FROM sqlite_sequence WHERE name = :t"), dict(t=table.name)):
+                connection.execute(text("UPDATE sqlite_sequence SET seq = max(seq, :s) WHERE name = :t"),
+                                   dict(s=start - 1, t=table.name))
+            else:
+                connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:t, :s)"),
+                                   dict(t=table.name, s=start - 1))
+        elif dialect in ("mysql", "mariadb"):
+            # Never lowers an existing counter
+            connection.execute(text(f"ALTER TABLE `{table.name}` AUTO_INCREMENT = {int(start)}"))
+        elif dialect == "postgresql":
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{column}'), "
+                f"GREATEST({int(start)}, (SELECT COALESCE(MAX({column}), 0) + 1 FROM {table.name})), false)"
+            ))
+        else:
+            logging.warning(f"Cannot set the first id of {table.name} on {dialect}; ids may overlap other shards.")
+
+    def distribute_workers(self, batch_size: int = 200) -> dict:
+        """
+        Moves workers still in the main database to the shard choose()
+        picks for them, with every row that belongs to them. Moved workers
+        get a new id in their shard's block (child rows keep theirs); their
+        duplicate-candidate pairs are dropped and found again per shard.
+        One commit per batch. Returns workers moved per shard.
+        """
+        moved = defaultdict(int)
+        block = self.app.config["SHARD_ID_BLOCK"]
+        last_id = 0
+        while True:
+            workers = db.session.execute(
+                select(Worker.id, Worker.user_id, Worker.work_location, Worker.home_state, Worker.phone)
+                .where(Worker.id > last_id, Worker.id < block).order_by(Worker.id).limit(batch_size)
+            ).all()
+            if not workers:
+                return dict(moved)
+            targets = defaultdict(list)
+            for worker in workers:
+                shard = self.place(worker)
+                if shard != DEFAULT:
+                    targets[shard].append(worker)
+            for shard, group in targets.items():
+                self._move(shard, group)
+                moved[shard] += len(group)
+            db.session.commit()
+            last_id = workers[-1].id
+            logging.info(f"Distributed workers up to id {last_id}: {dict(moved)}")
+
+    def _move(self, shard, workers):
+        worker_ids = [worker.id for worker in workers]
+        tables = [table for table in db.metadata.sorted_tables
+                  if table.name not in GLOBAL_TABLES and table.name != DuplicateCandidate.__tablename__]
+
+        # Read everything that belongs to these workers from the main database
+        rows, keys = {}, {Worker.__tablename__: worker_ids}
+        for table in tables:
+            if "worker_id" in table.c or table.name == Worker.__tablename__:
+                column = table.c.id if table.name == Worker.__tablename__ else table.c.worker_id
+                values = worker_ids
+            else:
+                parent = next((fk for fk in table.foreign_keys if _table_name(fk) in keys), None)
+                if parent is None:
+                    continue    # not per-worker data, e.g. positive_result_counts
+                column, values = parent.parent, keys[_table_name(parent)]
+            rows[table] = [row._asdict() for chunk in _chunks(values)
+                           for row in db.session.execute(select(table).where(column.in_(chunk)))]
+            key = table.primary_key.columns.values()[0]
+            keys[table.name] = [row[key.name] for row in rows[table]]
+
+        # Write them to the shard under new worker ids
+        now = datetime.utcnow()
+        with self.use(shard):
+            new_ids = {}
+            for row in rows.pop(Worker.__table__):
+                old_id = row.pop("id")
+                new_ids[old_id] = db.session.execute(insert(Worker.__table__).values(**row)).inserted_primary_key[0]
+            # Offline clients drop the old ids; logged here, where their sync scope now finds the worker
+            db.session.execute(insert(SyncChange), [
+                dict(entity_type="worker", entity_id=old_id, worker_id=new_id, deleted=True, changed_on=now)
+                for old_id, new_id in new_ids.items()
+            ])
+            for table, table_rows in rows.items():
+                for row in table_rows:
+                    if "worker_id" in row:
+                        row["worker_id"] = new_ids[row["worker_id"]]
+                    if table is SyncChange.__table__:
+                        # Logged again under this shard's seqs: clients' cursors here may be past the old ones
+                        del row["seq"]
+                        row.update(device_id=None, changed_on=now)
+                        if row["entity_type"] == "worker":
+                            row["entity_id"] = new_ids[row["entity_id"]]
+                for chunk in _chunks(table_rows):
+                    db.session.execute(insert(table), chunk)
+
+        # Then remove them from the main database, children first
+        db.session.execute(delete(DuplicateCandidate).where(
+            DuplicateCandidate.worker_id.in_(worker_ids) | DuplicateCandidate.other_worker_id.in_(worker_ids)
+        ))
+        for table in reversed([table for table in tables if table.name in keys]):
+            key = table.primary_key.columns.values()[0]
+            for chunk in _chunks(keys[table.name]):
+                db.session.execute(delete(table).where(key.in_(chunk)))
+        db.session.execute(insert(WorkerPlacement), [dict(user_id=worker.user_id, shard=shard) for worker in workers])
+        # Batches re-sent from offline clients name workers by client id
+        for chunk in _chunks(worker_ids):
+            db.session.execute(
+                update(SyncRecord)
+                .where(SyncRecord.entity_type == "worker", SyncRecord.entity_id.in_(chunk))
+                .values(entity_id=case({old_id: new_ids[old_id] for old_id in chunk}, value=SyncRecord.entity_id))
+            )
+        invalidate_after_commit(db.session, worker_ids)
+
+
+shard_router = ShardRouter()
+
+
+# Session.info key of (user_id, shard) placements made in the current flush
+PLACEMENTS = "worker_placements_pending"
+
+
+@event.listens_for(Session, "before_flush")
+def _check_new_workers(session, flush_context, instances):
+    # A flush only writes to the shard it runs in: a new worker placed
+    # elsewhere would be lost to every lookup by id or placement
+    router = current_app.extensions.get("shard_router") if has_app_context() else None
+    if router is None or not router.enabled:
+        return
+    for obj in session.new:
+        if isinstance(obj, Worker) and obj.id is None and router._bind_key(router.place(obj)) != current_shard.get():
+            raise ValueError(f"A new worker belongs on shard {router.place(obj)!r}: "
+                             f"flush it inside shard_router.use(shard_router.place(worker)).")
+
+
+@event.listens_for(Worker, "after_insert")
+def _note_placement(mapper, connection, worker):
+    shard = current_shard.get()
+    session = object_session(worker)
+    if shard is not None and session is not None:
+        session.info.setdefault(PLACEMENTS, []).append(dict(user_id=worker.user_id, shard=shard))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_placements(session, flush_context):
+    placements = session.info.pop(PLACEMENTS, None)
+    if placements:
+        session.execute(insert(WorkerPlacement), placements)   # a global table: the main database
+
+
+@event.listens_for(Session, "before_flush")
+def _discard_placements(session, flush_context, instances):
+    # Left over only by a flush that failed, whether it rolled back the
+    # transaction or just a SAVEPOINT: none of its workers were written
+    session.info.pop(PLACEMENTS, None)
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statement prefix that shows the plan without running the statement
+EXPLAIN_PREFIX = {
+    "mysql": "EXPLAIN ",
+    "mariadb": "EXPLAIN ",
+    "postgresql": "EXPLAIN ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+MAX_ENDPOINTS_PER_SHAPE = 10
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+_VALUE_LIST = re.compile(r"\b(IN|VALUES)\s*\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*", re.I)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """
+    The shape of a statement: literals and bind parameters become ?, IN
+    lists and multi-row VALUES collapse to (...), whitespace is squeezed.
+    Statements that differ only in their values share a shape.
+    """
+    shape = _STRING_LITERAL.sub("?", statement)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _VALUE_LIST.sub(r"\1 (...)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+def redact_parameters(parameters) -> list | dict | None:
+    """Parameter types only (never values), enough to see what a statement was bound with."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class SlowQueryLog:
+    """
+    Opt-in recorder of SQL statements slower than SLOW_QUERY_THRESHOLD_MS.
+    Statements are grouped by normalize_statement() shape; each shape keeps
+    its count, total and worst time, the endpoints it ran under, the bound
+    parameter types and the query plan captured the first time it was slow.
+    The plan is read through a second cursor on the same connection, so it
+    sees the same transaction and real parameters.
+
+    Kept in memory per process (bounded by SLOW_QUERY_MAX_SHAPES, the
+    least slow shapes are dropped first); the first occurrence of every
+    shape is also logged with its plan so multi-worker deployments keep a
+    record in the logs.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._shapes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SLOW_QUERY_LOG_ENABLED", os.getenv("SLOW_QUERY_LOG_ENABLED", "").lower() in ("1", "true", "yes"))
+        app.config.setdefault("SLOW_QUERY_THRESHOLD_MS", float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200)))
+        app.config.setdefault("SLOW_QUERY_EXPLAIN", True)
+        app.config.setdefault("SLOW_QUERY_MAX_SHAPES", 500)
+        self.app = app
+        app.extensions["slow_queries"] = self
+        if app.config["SLOW_QUERY_LOG_ENABLED"]:
+            self.enable()
+
+    def enable(self):
+        if not event.contains(Engine, "before_cursor_execute", self._before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def disable(self):
+        if event.contains(Engine, "before_cursor_execute", self._before_cursor_execute):
+            event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def top(self, limit: int = 50, sort: str = "total_ms") -> list[dict]:
+        """The worst shapes by `sort` (total_ms, max_ms, count or mean_ms)."""
+        with self._lock:
+            entries = [dict(entry, endpoints=sorted(entry["endpoints"])) for entry in self._shapes.values()]
+        for entry in entries:
+            entry["mean_ms"] = round(entry["total_ms"] / entry["count"], 2)
+        entries.sort(key=lambda entry: entry[sort], reverse=True)
+        return entries[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._shapes.clear()
+
+    # Internals
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("slow_query_started")
+        if not started:
+            return  # enabled while this statement was running
+        elapsed_ms = (time.perf_counter() - started.pop()) * 1000
+        if elapsed_ms < self.app.config["SLOW_QUERY_THRESHOLD_MS"]:
+            return
+        try:
+            self._record(conn, statement, parameters, executemany, elapsed_ms)
+        except Exception as e:
+            # Never fail the statement that was being measured
+            logging.error(f"Could not record slow query: {e}")
+
+    def _record(self, conn, statement, parameters, executemany, elapsed_ms):
+        shape = normalize_statement(statement)
+        fingerprint = hashlib.sha1(shape.encode()).hexdigest()[:16]
+        endpoint = request.endpoint if has_request_context() else None
+        now = datetime.utcnow().isoformat()
+
+        with self._lock:
+            entry = self._shapes.get(fingerprint)
+            is_new = entry is None
+            if is_new:
+                self._evict()
+                entry = self._shapes[fingerprint] = dict(
+                    fingerprint=fingerprint, statement=shape, count=0, total_ms=0.0, max_ms=0.0,
+                    first_seen=now, last_seen=now, endpoints=set(),
+                    parameters=redact_parameters(parameters[0] if executemany and parameters else parameters),
+                    plan=None
+                )
+            entry["count"] += 1
+            entry["total_ms"] = round(entry["total_ms"] + elapsed_ms, 2)
+            entry["max_ms"] = round(max(entry["max_ms"], elapsed_ms), 2)
+            entry["last_seen"] = now
+            if endpoint and len(entry["endpoints"]) < MAX_ENDPOINTS_PER_SHAPE:
+                entry["endpoints"].add(endpoint)
+
+        if is_new:
+            if self.app.config["SLOW_QUERY_EXPLAIN"] and not executemany:
+                entry["plan"] = self._explain(conn, statement, parameters)
+            plan = "\n".join(entry["plan"] or [])
+            logging.warning(f"Slow query {fingerprint} ({elapsed_ms:.0f} ms, {endpoint or 'no request'}): {shape}\n{plan}")
+
+    def _evict(self):
+        limit = self.app.config["SLOW_QUERY_MAX_SHAPES"]
+        while len(self._shapes) >= limit:
+            least = min(self._shapes, key=lambda key: self._shapes[key]["total_ms"])
+            del self._shapes[least]
+
+    @staticmethod
+    def _explain(conn, statement, parameters) -> list[str] | None:
+        prefix = EXPLAIN_PREFIX.get(conn.dialect.name)
+        if prefix is None or not statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            return None
+        # A plain DB-API cursor: it does not fire engine events and leaves the
+        # measured statement's result set alone
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception as e:
+            return [f"EXPLAIN failed: {e}"]
+        finally:
+            cursor.close()
+        # Plans can quote values (e.g. PostgreSQL filter conditions)
+        return [_STRING_LITERAL.sub("'?'", " | ".join("" if value is None else str(value) for value in row)) for row in rows]
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,207 @@
+from datetime import datetime
+
+from sqlalchemy import select, insert, delete, func, event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from database import db
+from models import (
+    Worker, MedicalCheckup, LabResults, DoctorEvaluation, Vaccination, MedicalVisit, WorkerHealthSnapshot
+)
+
+IN_CHUNK = 1000     # workers per refresh statement
+SNAPSHOT_COLUMNS = [column.name for column in WorkerHealthSnapshot.__table__.columns]
+
+# Session.info key of the workers (and checkups, for lab results and
+# evaluations) written since the last flush
+PENDING = "health_snapshot_pending"
+
+
+def _first_per_worker(source, worker_column, order_by, columns, worker_ids):
+    """Each worker's first row of `source` by `order_by`, via row_number()."""
+    rank = func.row_number().over(partition_by=worker_column, order_by=order_by).label("snapshot_rank")
+    ranked = (
+        select(worker_column.label("worker_id"), *columns, rank)
+        .select_from(source)
+        .where(worker_column.in_(worker_ids))
+        .subquery()
+    )
+    return select(ranked).where(ranked.c.snapshot_rank == 1)
+
+
+def compute_snapshots(worker_ids, executor=None) -> dict[int, dict]:
+    """
+    Snapshot values of every existing worker in `worker_ids`, from three
+    set-based queries (latest checkup with its labs and evaluation, last
+    vaccination, last visit). Only the hot tables are read: archival.py
+    never moves a worker's latest checkup on age alone, and refreshes the
+    snapshots of workers whose checkups it moves.
+    """
+    executor = executor or db.session
+    now = datetime.utcnow()
+    snapshots = {
+        worker_id: dict(dict.fromkeys(SNAPSHOT_COLUMNS), worker_id=worker_id, updated_on=now)
+        for worker_id in executor.execute(select(Worker.id).where(Worker.id.in_(list(worker_ids)))).scalars()
+    }
+    if not snapshots:
+        return snapshots
+    ids = list(snapshots)
+
+    checkups = _first_per_worker(
+        MedicalCheckup.__table__
+        .outerjoin(LabResults.__table__, LabResults.checkup_id == MedicalCheckup.id)
+        .outerjoin(DoctorEvaluation.__table__, DoctorEvaluation.checkup_id == MedicalCheckup.id),
+        MedicalCheckup.worker_id, (MedicalCheckup.date_of_checkup.desc(), MedicalCheckup.id.desc()), [
+            MedicalCheckup.id.label("latest_checkup_id"),
+            MedicalCheckup.date_of_checkup.label("latest_checkup_date"),
+            MedicalCheckup.bmi, MedicalCheckup.weight_kg,
+            MedicalCheckup.blood_pressure_systolic, MedicalCheckup.blood_pressure_diastolic,
+            MedicalCheckup.pulse_rate, MedicalCheckup.temperature_celsius, MedicalCheckup.oxygen_saturation,
+            MedicalCheckup.risk_category, MedicalCheckup.disease_prediction_score,
+            LabResults.hemoglobin_g_dl, LabResults.blood_sugar_fasting,
+            LabResults.blood_sugar_postprandial, LabResults.cholesterol_total,
+            DoctorEvaluation.fitness_status, DoctorEvaluation.follow_up_required, DoctorEvaluation.follow_up_date,
+        ], ids
+    )
+    for row in executor.execute(checkups).mappings():
+        snapshot = snapshots[row["worker_id"]]
+        snapshot.update((key, value) for key, value in row.items() if key in snapshot)
+        # Only the latest evaluation's follow-up can still be open (see followups.open_follow_ups)
+        snapshot["next_follow_up_date"] = row["follow_up_date"] if row["follow_up_required"] else None
+
+    vaccinations = _first_per_worker(
+        Vaccination.__table__, Vaccination.worker_id, (Vaccination.date_administered.desc(), Vaccination.id.desc()),
+        [Vaccination.vaccine_name, Vaccination.dose_number, Vaccination.date_administered], ids
+    )
+    for row in executor.execute(vaccinations):
+        snapshots[row.worker_id].update(last_vaccine_name=row.vaccine_name, last_vaccine_dose=row.dose_number,
+                                        last_vaccination_date=row.date_administered)
+
+    visits = _first_per_worker(
+        MedicalVisit.__table__, MedicalVisit.worker_id, (MedicalVisit.visit_date.desc(), MedicalVisit.id.desc()),
+        [MedicalVisit.visit_date, MedicalVisit.facility_id], ids
+    )
+    for row in executor.execute(visits):
+        snapshots[row.worker_id].update(last_visit_date=row.visit_date, last_visit_facility_id=row.facility_id)
+    return snapshots
+
+
+def refresh_snapshots(worker_ids, executor=None) -> int:
+    """
+    Recomputes the snapshots of `worker_ids` (delete and re-insert, in
+    chunks). Used by the write hooks below and by bulk paths that bypass
+    them. Returns the number of snapshots written.
+    """
+    executor = executor or db.session
+    worker_ids = sorted(set(worker_ids))
+    written = 0
+    for start in range(0, len(worker_ids), IN_CHUNK):
+        chunk = worker_ids[start:start + IN_CHUNK]
+        rows = list(compute_snapshots(chunk, executor).values())
+        executor.execute(delete(WorkerHealthSnapshot).where(WorkerHealthSnapshot.worker_id.in_(chunk)))
+        if rows:
+            executor.execute(insert(WorkerHealthSnapshot), rows)
+        written += len(rows)
+    return written
+
+
+def rebuild_snapshots(batch_size: int = 5000) -> int:
+    """Rebuilds every worker's snapshot (after bulk loads that bypass the ORM hooks), one commit per batch."""
+    db.session.execute(delete(WorkerHealthSnapshot))
+    last_id, rebuilt = 0, 0
+    while True:
+        worker_ids = db.session.scalars(
+            select(Worker.id).where(Worker.id > last_id).order_by(Worker.id).limit(batch_size)
+        ).all()
+        if not worker_ids:
+            db.session.commit()
+            return rebuilt
+        rebuilt += refresh_snapshots(worker_ids)
+        db.session.commit()
+        last_id = worker_ids[-1]
+
+
+def snapshots_for(worker_ids) -> dict[int, WorkerHealthSnapshot]:
+    """
+    The snapshots of `worker_ids` in one primary-key query. Workers whose
+    row has not been built yet (bulk loads before a rebuild) get a
+    computed, unsaved snapshot, so callers never see stale gaps.
+    """
+    worker_ids = set(worker_ids)
+    if not worker_ids:
+        return {}
+    found = {
+        snapshot.worker_id: snapshot
+        for snapshot in db.session.scalars(
+            select(WorkerHealthSnapshot).where(WorkerHealthSnapshot.worker_id.in_(list(worker_ids)))
+        )
+    }
+    missing = worker_ids - found.keys()
+    if missing:
+        found.update((worker_id, WorkerHealthSnapshot(**values))
+                     for worker_id, values in compute_snapshots(missing).items())
+    return found
+
+
+def snapshot_for(worker_id: int) -> WorkerHealthSnapshot | None:
+    return snapshots_for([worker_id]).get(worker_id)
+
+
+# Write hooks: note which workers changed, recompute each once per flush
+
+def _pending(target):
+    session = object_session(target)
+    if session is None:
+        return None
+    return session.info.setdefault(PENDING, (set(), set()))
+
+
+def _listen(model):
+    @event.listens_for(model, "after_insert")
+    @event.listens_for(model, "after_update")
+    @event.listens_for(model, "after_delete")
+    def _changed(mapper, connection, target):
+        pending = _pending(target)
+        if pending is not None:
+            pending[0].add(target.worker_id)
+            # Moved to another worker: the old one loses a record too
+            pending[0].update(inspect(target).attrs.worker_id.history.deleted)
+
+
+_listen(MedicalCheckup)
+_listen(Vaccination)
+_listen(MedicalVisit)
+
+
+@event.listens_for(LabResults, "after_insert")
+@event.listens_for(LabResults, "after_update")
+@event.listens_for(LabResults, "after_delete")
+@event.listens_for(DoctorEvaluation, "after_insert")
+@event.listens_for(DoctorEvaluation, "after_update")
+@event.listens_for(DoctorEvaluation, "after_delete")
+def _checkup_part_changed(mapper, connection, target):
+    pending = _pending(target)
+    if pending is not None:
+        pending[1].add(target.checkup_id)
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_pending(session, flush_context):
+    pending = session.info.pop(PENDING, None)
+    if not pending:
+        return
+    worker_ids, checkup_ids = pending
+    connection = session.connection()
+    if checkup_ids:
+        worker_ids |= set(connection.scalars(
+            select(MedicalCheckup.worker_id).where(MedicalCheckup.id.in_(list(checkup_ids)))
+        ))
+    worker_ids.discard(None)
+    if worker_ids:
+        refresh_snapshots(worker_ids, connection)
+
+
+@event.listens_for(Session, "before_flush")
+def _discard_pending(session, flush_context, instances):
+    # Left over only by a flush that failed, whether it rolled back the
+    # transaction or just a SAVEPOINT: none of its rows were written
+    session.info.pop(PENDING, None)
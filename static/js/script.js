@@ -1,27 +1,42 @@
+// The page is rendered in the current language on the server. base.html.j2 passes the
+// fingerprinted bundle URL of every language so the switcher can translate in place.
+const i18nScript = document.currentScript;
+
 document.addEventListener('DOMContentLoaded', async () => {
-    
+
     const languageSelect = document.getElementById('language-select');
-    let translations = {}; // This will store all our translations
+    const bundles = JSON.parse(i18nScript.dataset.bundles || '{}');
+    const loaded = {}; // language -> its translations, fetched on first use
 
-    // Fetch the translations file and store it
-    try {
-        const response = await fetch("/static/js/translations.json");
-        translations = await response.json();
-    } catch (error) {
-        console.error("Could not load translations:", error);
-        return; // Stop if translations can't be loaded
-    }
+    /**
+     * Fetches the bundle of one language. Bundles are cached immutably by the
+     * browser, so this only hits the network the first time.
+     * @param {string} language - The language code (e.g., 'en', 'hi').
+     */
+    const loadLanguage = async (language) => {
+        if (!loaded[language]) {
+            const response = await fetch(bundles[language]);
+            loaded[language] = await response.json();
+        }
+        return loaded[language];
+    };
 
     /**
      * Translates the page to the given language.
      * @param {string} language - The language code (e.g., 'en', 'hi').
      */
-    const translatePage = (language) => {
-        const languageTranslations = translations[language];
-        if (!languageTranslations) {
+    const translatePage = async (language) => {
+        if (!bundles[language]) {
             console.warn(`No translations found for language: ${language}`);
             return;
         }
+        let languageTranslations;
+        try {
+            languageTranslations = await loadLanguage(language);
+        } catch (error) {
+            console.error("Could not load translations:", error);
+            return;
+        }
 
         document.querySelectorAll('[data-translate-key]').forEach(element => {
             const key = element.dataset.translateKey;
@@ -37,13 +52,24 @@ document.addEventListener('DOMContentLoaded', async () => {
                 console.warn(`No translation found for key: ${key} in language: ${language}`);
             }
         });
+        document.documentElement.lang = language;
+    };
+
+    /**
+     * Remembers the choice so the next pages are rendered in it.
+     * @param {string} language - The language code (e.g., 'en', 'hi').
+     */
+    const saveLanguage = (language) => {
+        fetch(i18nScript.dataset.languageUrl, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': i18nScript.dataset.csrfToken },
+            body: new URLSearchParams({ language }),
+        }).catch(error => console.error("Could not save language:", error));
     };
 
     // Event listener for the language dropdown
     languageSelect.addEventListener('change', (event) => {
         translatePage(event.target.value);
+        saveLanguage(event.target.value);
     });
-
-    // Translate the page to English by default when it loads
-    translatePage('en');
-});
\ No newline at end of file
+});
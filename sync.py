@@ -0,0 +1,410 @@
+import json
+import secrets
+import zlib
+from datetime import date, datetime, timedelta
+
+from flask import g, has_app_context
+from sqlalchemy import select, insert, union, event, or_, Enum, Date, DateTime
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import selectinload
+
+from database import db
+from api import serialize
+from sharding import shard_router
+from models import (
+    User, Worker, MedicalCheckup, LabResults, DoctorEvaluation, Vaccination, MedicalVisit,
+    SyncRecord, SyncChange, UserRoleEnum
+)
+
+MAX_BATCH_RECORDS = 2000
+MAX_BODY_BYTES = 32 * 1024 * 1024   # after decompression
+DELTA_LIMIT = 500
+# seq is allocated at insert, not at commit, so a change only enters a delta
+# once it is this old; write transactions must finish well within it
+SETTLE_SECONDS = 30
+
+# Payload key -> (entity type, model), in the order they are applied so later
+# sections can reference workers created earlier in the same batch
+ENTITIES = {
+    "workers": ("worker", Worker),
+    "checkups": ("checkup", MedicalCheckup),
+    "vaccinations": ("vaccination", Vaccination),
+    "visits": ("visit", MedicalVisit),
+}
+MODELS = {entity_type: model for entity_type, model in ENTITIES.values()}
+
+# Filled in by the server, never taken from a client
+SERVER_COLUMNS = {"id", "user_id", "worker_id", "checkup_id", "facility_id",
+                  "latitude", "longitude", "geohash", "data_entry_timestamp"}
+
+CREATED = "created"
+DUPLICATE = "duplicate"
+ERROR = "error"
+
+
+class SyncError(ValueError):
+    pass
+
+
+# Wire format
+
+def decode_body(raw: bytes, content_encoding: str | None) -> dict:
+    """JSON body, optionally gzip/deflate compressed; decompression is capped at MAX_BODY_BYTES."""
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding in ("gzip", "deflate"):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS if encoding == "gzip" else zlib.MAX_WBITS)
+        try:
+            raw = decompressor.decompress(raw, MAX_BODY_BYTES)
+        except zlib.error:
+            raise SyncError("Body could not be decompressed.")
+        if decompressor.unconsumed_tail:
+            raise SyncError("Batch is too large.")
+    elif encoding != "identity":
+        raise SyncError(f"Unsupported Content-Encoding {encoding}.")
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        raise SyncError("Body is not valid JSON.")
+    if not isinstance(payload, dict):
+        raise SyncError("Body must be a JSON object.")
+    return payload
+
+
+def _coerce(model, data) -> dict:
+    """Client JSON -> column values: enums by value, dates as ISO strings, unknown keys ignored."""
+    if not isinstance(data, dict):
+        raise SyncError("Record must be a JSON object.")
+    values = {}
+    columns = model.__table__.columns
+    for key, value in data.items():
+        column = columns.get(key)
+        if column is None or key in SERVER_COLUMNS:
+            continue
+        if value is not None:
+            if isinstance(column.type, Enum):
+                value = column.type.enum_class(value)
+            elif isinstance(column.type, DateTime):
+                value = datetime.fromisoformat(value)
+            elif isinstance(column.type, Date):
+                value = date.fromisoformat(value)
+        values[key] = value
+    for column in columns:
+        if not column.nullable and column.default is None and column.key not in SERVER_COLUMNS \
+                and values.get(column.key) is None:
+            raise SyncError(f"{column.key} is required.")
+    return values
+
+
+# Applying a batch
+
+def _create_worker(record, context):
+    values = _coerce(Worker, record)
+    username = values.get("phone") or f"sync-{record['client_id']}"
+    user = User(username=username[:100], email=f"{username}@placeholder.hospital.com"[:120], role=UserRoleEnum.NORMAL_USER)
+    if record.get("password"):
+        user.set_password(record["password"])
+    else:
+        # Unusable until the facility sets one: never matches check_password_hash
+        user.password_hash = "!" + secrets.token_hex(16)
+    db.session.add(user)
+    db.session.flush()
+    worker = Worker(user_id=user.id, **values)
+    with shard_router.use(shard_router.place(worker)):
+        db.session.add(worker)
+        db.session.flush()
+    return worker
+
+
+# Records of a worker are flushed on the worker's shard
+
+def _create_checkup(record, context):
+    checkup = MedicalCheckup(worker_id=context.worker_id(record), facility_id=context.facility_id,
+                             **_coerce(MedicalCheckup, record))
+    with shard_router.for_worker(checkup.worker_id):
+        db.session.add(checkup)
+        db.session.flush()
+        if record.get("lab_results"):
+            db.session.add(LabResults(checkup_id=checkup.id, **_coerce(LabResults, record["lab_results"])))
+        if record.get("doctor_evaluation"):
+            db.session.add(DoctorEvaluation(checkup_id=checkup.id, **_coerce(DoctorEvaluation, record["doctor_evaluation"])))
+        db.session.flush()
+    return checkup
+
+
+def _create_vaccination(record, context):
+    vaccination = Vaccination(worker_id=context.worker_id(record), **_coerce(Vaccination, record))
+    with shard_router.for_worker(vaccination.worker_id):
+        db.session.add(vaccination)
+        db.session.flush()
+    return vaccination
+
+
+def _create_visit(record, context):
+    if context.facility_id is None:
+        raise SyncError("Only facility accounts can record visits.")
+    visit = MedicalVisit(worker_id=context.worker_id(record), facility_id=context.facility_id,
+                         **_coerce(MedicalVisit, record))
+    with shard_router.for_worker(visit.worker_id):
+        db.session.add(visit)
+        db.session.flush()
+    return visit
+
+
+CREATORS = {
+    "worker": _create_worker,
+    "checkup": _create_checkup,
+    "vaccination": _create_vaccination,
+    "visit": _create_visit,
+}
+
+
+class _BatchContext:
+    """What a batch already knows: client ids seen before and the workers records may point at."""
+
+    def __init__(self, payload, facility_id):
+        self.facility_id = facility_id
+        records = [r for key in ENTITIES for r in payload.get(key) or [] if isinstance(r, dict)]
+        client_ids = {r.get("client_id") for r in records} | {r.get("worker_client_id") for r in records}
+        client_ids = [c for c in client_ids if isinstance(c, str)]
+        self.known = {
+            row.client_id: row for row in db.session.scalars(select(SyncRecord).where(SyncRecord.client_id.in_(client_ids)))
+        } if client_ids else {}
+        worker_ids = {r.get("worker_id") for r in records if isinstance(r.get("worker_id"), int)}
+        self.existing_workers = set()
+        for shard, shard_worker_ids in shard_router.shards_of(worker_ids).items():
+            with shard_router.use(shard):
+                self.existing_workers.update(db.session.scalars(
+                    select(Worker.id).where(Worker.id.in_(shard_worker_ids))
+                ))
+
+    def worker_id(self, record):
+        if record.get("worker_client_id"):
+            known = self.known.get(record["worker_client_id"])
+            if known is None or known.entity_type != "worker":
+                raise SyncError("Unknown worker_client_id.")
+            return known.entity_id
+        if record.get("worker_id") not in self.existing_workers:
+            raise SyncError("Unknown worker_id.")
+        return record["worker_id"]
+
+
+def apply_batch(payload: dict, user, device_id: str | None = None) -> list[dict]:
+    """
+    Creates every record in the batch that has not been seen before. Each
+    record is applied in its own savepoint, so one bad record is reported
+    back without losing the rest; the whole batch is committed once.
+    Returns one result per record: client_id, type, status and server id.
+    """
+    for key in ENTITIES:
+        if not isinstance(payload.get(key) or [], list):
+            raise SyncError(f"{key} must be a list.")
+    total = sum(len(payload.get(key) or []) for key in ENTITIES)
+    if total > MAX_BATCH_RECORDS:
+        raise SyncError(f"At most {MAX_BATCH_RECORDS} records per batch.")
+
+    context = _BatchContext(payload, user.facility.id if user.facility else None)
+    results = []
+    g.sync_device_id = device_id
+    try:
+        for key, (entity_type, model) in ENTITIES.items():
+            for record in payload.get(key) or []:
+                results.append(_apply_record(entity_type, record, context, user, device_id))
+        db.session.commit()
+    finally:
+        g.pop("sync_device_id", None)
+    return results
+
+
+def _apply_record(entity_type, record, context, user, device_id):
+    client_id = record.get("client_id") if isinstance(record, dict) else None
+    result = dict(client_id=client_id, type=entity_type)
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= 64:
+        return dict(result, status=ERROR, error="client_id must be a string of at most 64 characters.")
+
+    known = context.known.get(client_id)
+    if known is not None:
+        if known.entity_type != entity_type:
+            return dict(result, status=ERROR, error=f"client_id already used for a {known.entity_type}.")
+        return dict(result, status=DUPLICATE, id=known.entity_id)
+
+    try:
+        with db.session.begin_nested():
+            entity = CREATORS[entity_type](record, context)
+            db.session.flush()
+            sync_record = SyncRecord(client_id=client_id, entity_type=entity_type, entity_id=entity.id,
+                                     device_id=device_id, created_by_user_id=user.id)
+            db.session.add(sync_record)
+            db.session.flush()
+    except DBAPIError as e:
+        return dict(result, status=ERROR, error=f"Rejected by the database: {e.orig}")
+    except (ValueError, TypeError) as e:
+        return dict(result, status=ERROR, error=str(e))
+    context.known[client_id] = sync_record
+    return dict(result, status=CREATED, id=entity.id)
+
+
+# Delta since a cursor
+
+def parse_cursor(value) -> dict:
+    """
+    A client's cursor -> {shard name: seq}. The cursor holds the last seq
+    delivered from each shard, in shard order joined by "." (a plain number
+    when there is only the main database, so it is also read as that).
+    """
+    parts = str(value or 0).split(".")
+    if len(parts) > len(shard_router.names) or not all(part.isdigit() for part in parts):
+        raise SyncError("Invalid cursor.")
+    return {name: int(part) for name, part in zip(shard_router.names, parts)}
+
+
+def format_cursor(cursor: dict):
+    seqs = [cursor.get(name, 0) for name in shard_router.names]
+    return seqs[0] if len(seqs) == 1 else ".".join(map(str, seqs))
+
+
+def _scope_workers(facility_id, user_id, registered=None):
+    """
+    Workers a facility account syncs: seen at the facility, or registered
+    through its sync (by `registered` ids where sync records are not in the
+    same database).
+    """
+    if registered is None:
+        registered = select(SyncRecord.entity_id).where(SyncRecord.entity_type == "worker",
+                                                         SyncRecord.created_by_user_id == user_id)
+    else:
+        registered = select(Worker.id).where(Worker.id.in_(registered))
+    return union(
+        select(MedicalCheckup.worker_id).where(MedicalCheckup.facility_id == facility_id),
+        select(MedicalVisit.worker_id).where(MedicalVisit.facility_id == facility_id),
+        registered,
+    )
+
+
+def changes_since(cursor: dict, user, device_id: str | None = None, limit: int = DELTA_LIMIT) -> dict:
+    """
+    Current state of every entity changed after `cursor` (see parse_cursor)
+    that the user can see, oldest change first per shard, skipping changes
+    this device sent itself. Returns the changes, the next cursor and
+    whether more are waiting; each shard sends at most `limit` changes.
+
+    The cursor never passes a change younger than SETTLE_SECONDS: a
+    transaction can commit after a higher seq is already visible, and a
+    cursor past its rows would skip them for good. Newer changes come
+    with a later pull.
+    """
+    scope = None
+    if user.role != UserRoleEnum.ADMIN:
+        scope = dict(facility_id=user.facility.id if user.facility else -1, user_id=user.id)
+        if shard_router.enabled:
+            # Sync records live in the main database only
+            registered = db.session.scalars(select(SyncRecord.entity_id).where(
+                SyncRecord.entity_type == "worker", SyncRecord.created_by_user_id == user.id
+            )).all()
+            scope["registered"] = shard_router.shards_of(registered)
+    deltas = shard_router.fan_out(_shard_changes, cursor, scope, device_id, limit)
+    return dict(
+        changes=[change for delta in deltas.values() for change in delta["changes"]],
+        cursor=format_cursor({shard: delta["cursor"] for shard, delta in deltas.items()}),
+        has_more=any(delta["has_more"] for delta in deltas.values()),
+    )
+
+
+def _shard_changes(cursors, scope, device_id, limit):
+    shard = shard_router.current()
+    cursor = cursors.get(shard, 0)
+    settled = datetime.utcnow() - timedelta(seconds=SETTLE_SECONDS)
+    # Walks the primary key back from the newest change; only recent rows are unsettled
+    high = db.session.scalar(
+        select(SyncChange.seq).where(SyncChange.changed_on <= settled).order_by(SyncChange.seq.desc()).limit(1)
+    ) or 0
+    query = (
+        select(SyncChange.seq, SyncChange.entity_type, SyncChange.entity_id, SyncChange.deleted)
+        .where(SyncChange.seq > cursor, SyncChange.seq <= high)
+        .order_by(SyncChange.seq)
+        .limit(limit + 1)
+    )
+    if scope is not None:
+        registered = scope["registered"].get(shard, []) if "registered" in scope else None
+        query = query.where(SyncChange.worker_id.in_(_scope_workers(scope["facility_id"], scope["user_id"], registered)))
+    if device_id:
+        query = query.where(or_(SyncChange.device_id.is_(None), SyncChange.device_id != device_id))
+    rows = db.session.execute(query).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Latest change per entity wins; the payload is the row as it is now
+    latest = {}
+    for row in rows:
+        latest[(row.entity_type, row.entity_id)] = row
+    current = {}
+    for entity_type, model in MODELS.items():
+        ids = [entity_id for (t, entity_id) in latest if t == entity_type]
+        if not ids:
+            continue
+        query = select(model).where(model.id.in_(ids))
+        if model is MedicalCheckup:
+            query = query.options(selectinload(MedicalCheckup.lab_results), selectinload(MedicalCheckup.doctor_evaluation))
+        for obj in db.session.scalars(query):
+            data = serialize(obj)
+            if model is MedicalCheckup:
+                data["lab_results"] = serialize(obj.lab_results) if obj.lab_results else None
+                data["doctor_evaluation"] = serialize(obj.doctor_evaluation) if obj.doctor_evaluation else None
+            current[(entity_type, obj.id)] = data
+
+    changes = []
+    for (entity_type, entity_id), row in sorted(latest.items(), key=lambda item: item[1].seq):
+        data = current.get((entity_type, entity_id))
+        changes.append(dict(seq=row.seq, type=entity_type, id=entity_id, deleted=data is None, data=data))
+    next_cursor = rows[-1].seq if has_more else max(high, cursor)
+    return dict(changes=changes, cursor=next_cursor, has_more=has_more)
+
+
+# Change log
+
+def _log(connection, entity_type, entity_id, worker_id, deleted=False):
+    device_id = g.get("sync_device_id") if has_app_context() else None
+    connection.execute(insert(SyncChange).values(
+        entity_type=entity_type, entity_id=entity_id, worker_id=worker_id,
+        deleted=deleted, device_id=device_id, changed_on=datetime.utcnow()
+    ))
+
+
+def log_inserted(executor, entity_type, entities):
+    """Logs (entity_id, worker_id) pairs inserted in bulk, which the mapper events below never see."""
+    if not entities:
+        return
+    device_id = g.get("sync_device_id") if has_app_context() else None
+    now = datetime.utcnow()
+    executor.execute(insert(SyncChange), [
+        dict(entity_type=entity_type, entity_id=entity_id, worker_id=worker_id,
+             deleted=False, device_id=device_id, changed_on=now)
+        for entity_id, worker_id in entities
+    ])
+
+
+def _listen(model, entity_type, worker_of):
+    @event.listens_for(model, "after_insert")
+    @event.listens_for(model, "after_update")
+    def _changed(mapper, connection, target):
+        _log(connection, entity_type, target.id, worker_of(target))
+
+    @event.listens_for(model, "after_delete")
+    def _deleted(mapper, connection, target):
+        _log(connection, entity_type, target.id, worker_of(target), deleted=True)
+
+
+_listen(Worker, "worker", lambda worker: worker.id)
+_listen(MedicalCheckup, "checkup", lambda checkup: checkup.worker_id)
+_listen(Vaccination, "vaccination", lambda vaccination: vaccination.worker_id)
+_listen(MedicalVisit, "visit", lambda visit: visit.worker_id)
+
+
+@event.listens_for(LabResults, "after_insert")
+@event.listens_for(LabResults, "after_update")
+@event.listens_for(DoctorEvaluation, "after_insert")
+@event.listens_for(DoctorEvaluation, "after_update")
+def _checkup_part_changed(mapper, connection, target):
+    # Lab results and evaluations travel inside their checkup
+    worker_id = connection.scalar(select(MedicalCheckup.worker_id).where(MedicalCheckup.id == target.checkup_id))
+    if worker_id is not None:
+        _log(connection, "checkup", target.checkup_id, worker_id)
@@ -0,0 +1,339 @@
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert, select, func
+from werkzeug.security import generate_password_hash
+
+from database import db
+from geo import geohash_encode
+from models import (
+    User, Worker, HealthcareFacility, MedicalCheckup, LabResults, DoctorEvaluation, Vaccination, MedicalVisit,
+    ActivityLog, UserRoleEnum, GenderEnum, OccupationEnum, DietTypeEnum, FrequencyEnum, PPEUsageEnum,
+    PhysicalStrainEnum, AccommodationEnum, SanitationEnum, MaritalStatusEnum, NormalAbnormalEnum,
+    PositiveNegativeEnum, HearingResultEnum, FitnessStatusEnum, CheckupTypeEnum, RecordStatusEnum,
+    ChronicDiseaseEnum
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+WORKERS_PER_FACILITY = 2000
+DEFAULT_PASSWORD = "synthetic"
+
+# Weighted distributions, roughly shaped on migrant worker screening camps in Kerala
+GENDERS = {GenderEnum.MALE: 78, GenderEnum.FEMALE: 21, GenderEnum.OTHER: 1}
+OCCUPATIONS = {OccupationEnum.CONSTRUCTION: 40, OccupationEnum.FACTORY: 20, OccupationEnum.AGRICULTURE: 15,
+               OccupationEnum.DOMESTIC_WORK: 10, OccupationEnum.FISHING: 8, OccupationEnum.OTHER: 7}
+MARITAL_STATUSES = {MaritalStatusEnum.MARRIED: 50, MaritalStatusEnum.SINGLE: 45, MaritalStatusEnum.WIDOWED: 3,
+                    MaritalStatusEnum.DIVORCED: 2}
+PPE_USAGE = {PPEUsageEnum.SOMETIMES: 45, PPEUsageEnum.NEVER: 30, PPEUsageEnum.ALWAYS: 25}
+PHYSICAL_STRAIN = {PhysicalStrainEnum.HEAVY_LIFTING: 50, PhysicalStrainEnum.MODERATE: 40, PhysicalStrainEnum.SEDENTARY: 10}
+SMOKING = {FrequencyEnum.NEVER: 55, FrequencyEnum.OCCASIONALLY: 20, FrequencyEnum.WEEKLY: 5, FrequencyEnum.DAILY: 20}
+ALCOHOL = {FrequencyEnum.NEVER: 50, FrequencyEnum.OCCASIONALLY: 30, FrequencyEnum.WEEKLY: 12, FrequencyEnum.DAILY: 8}
+JUNK_FOOD = {FrequencyEnum.NEVER: 10, FrequencyEnum.OCCASIONALLY: 45, FrequencyEnum.WEEKLY: 35, FrequencyEnum.DAILY: 10}
+DIETS = {DietTypeEnum.NON_VEG: 65, DietTypeEnum.VEG: 25, DietTypeEnum.EGGETARIAN: 8, DietTypeEnum.VEGAN: 2}
+ACCOMMODATION = {AccommodationEnum.SHARED_ROOM: 50, AccommodationEnum.TEMPORARY_CAMP: 30, AccommodationEnum.RENTED_HOUSE: 20}
+SANITATION = {SanitationEnum.SHARED_TOILET: 70, SanitationEnum.PRIVATE_TOILET: 20, SanitationEnum.OPEN_DEFECATION: 10}
+CHRONIC_DISEASES = {ChronicDiseaseEnum.NONE: 80, ChronicDiseaseEnum.HYPERTENSION: 6, ChronicDiseaseEnum.DIABETES: 4,
+                    ChronicDiseaseEnum.HIGH_CHOLESTEROL: 3, ChronicDiseaseEnum.ASTHMA: 2, ChronicDiseaseEnum.ARTHRITIS: 2,
+                    ChronicDiseaseEnum.KIDNEY_DISEASE: 1, ChronicDiseaseEnum.HEART_DISEASE: 1,
+                    ChronicDiseaseEnum.TUBERCULOSIS: 1}
+LANGUAGES = {"hi": 40, "en": 25, "ta": 20, "ml": 15}
+HEARING = {HearingResultEnum.NORMAL: 95, HearingResultEnum.IMPAIRED: 5}
+CHECKUP_TYPES = {CheckupTypeEnum.PERIODIC: 75, CheckupTypeEnum.PRE_EMPLOYMENT: 20, CheckupTypeEnum.EXIT: 5}
+RECORD_STATUSES = {RecordStatusEnum.ACTIVE: 97, RecordStatusEnum.PENDING_REVIEW: 3}
+FITNESS = {FitnessStatusEnum.FIT: 88, FitnessStatusEnum.TEMPORARILY_UNFIT: 10, FitnessStatusEnum.PERMANENTLY_UNFIT: 2}
+# Share of positive results per screening test
+POSITIVE_RATES = {"hiv_test_result": 0.003, "hepatitis_b_result": 0.02, "hepatitis_c_result": 0.005,
+                  "tuberculosis_screening_result": 0.015, "malaria_test_result": 0.02}
+ABNORMAL_RATES = {"urine_test_result": 0.10, "xray_chest_result": 0.07, "ecg_result": 0.08}
+# Vaccine -> (share of workers who have it, most doses given)
+VACCINES = {"Tetanus": (0.7, 3), "COVID-19": (0.8, 2), "Hepatitis B": (0.3, 3), "Typhoid": (0.1, 1), "Influenza": (0.1, 1)}
+
+STATES = {"Bihar": 22, "West Bengal": 20, "Odisha": 14, "Assam": 12, "Jharkhand": 10, "Uttar Pradesh": 10,
+          "Tamil Nadu": 7, "Rajasthan": 5}
+GIVEN_NAMES = ["Ravi", "Suresh", "Amit", "Mohan", "Santosh", "Deepak", "Manoj", "Arjun", "Kiran", "Rahul", "Vijay",
+               "Harish", "Bimal", "Gopal", "Shankar", "Tarun", "Sanjay", "Ramesh", "Dinesh", "Ajay", "Priya",
+               "Lakshmi", "Jaya", "Nandini", "Rupa", "Sunita", "Anita", "Pooja", "Rekha", "Meena"]
+SURNAMES = ["Kumar", "Singh", "Yadav", "Das", "Mondal", "Sheikh", "Paswan", "Mahto", "Ali", "Sahu", "Nayak",
+            "Behera", "Rai", "Mandal", "Ansari", "Khatun", "Majhi", "Oraon", "Munda", "Tudu"]
+EMPLOYERS = ["Sobha Builders", "Kerala Agro Exports", "Malabar Fisheries", "Cochin Tiles", "Periyar Plywood",
+             "Home services"]
+# Work sites: (name, latitude, longitude)
+SITES = [("Kochi", 9.9312, 76.2673), ("Thiruvananthapuram", 8.5241, 76.9366), ("Kozhikode", 11.2588, 75.7804),
+         ("Thrissur", 10.5276, 76.2144), ("Perumbavoor", 10.1076, 76.4760), ("Kollam", 8.8932, 76.6141)]
+DIAGNOSES = ["No significant findings", "Mild anaemia", "Contact dermatitis", "Lower back strain",
+             "Upper respiratory infection", "Elevated blood pressure", "Fungal skin infection", "Dental caries",
+             "Acute gastroenteritis", "Heat exhaustion"]
+ACTIVITIES = ["Walking", "Manual Labor", "Cycling", "Football", "Yoga"]
+
+# Tables in dependency order, with the name of the per-worker count in the skeleton
+_RECORD_TABLES = (("checkups", MedicalCheckup), ("lab_results", LabResults), ("evaluations", DoctorEvaluation),
+                  ("vaccinations", Vaccination), ("visits", MedicalVisit), ("activities", ActivityLog))
+
+
+class _Choice:
+    """rng.choices over a {value: weight} mapping with the cumulative weights precomputed."""
+
+    def __init__(self, weights: dict):
+        self.values = list(weights)
+        self.cumulative = []
+        total = 0
+        for weight in weights.values():
+            total += weight
+            self.cumulative.append(total)
+
+    def __call__(self, rng):
+        return rng.choices(self.values, cum_weights=self.cumulative)[0]
+
+
+_PICK = {name: _Choice(weights) for name, weights in {
+    "gender": GENDERS, "occupation": OCCUPATIONS, "marital_status": MARITAL_STATUSES, "ppe_usage": PPE_USAGE,
+    "physical_strain": PHYSICAL_STRAIN, "smoking_habit": SMOKING, "alcohol_consumption": ALCOHOL,
+    "junk_food_frequency": JUNK_FOOD, "diet_type": DIETS, "accommodation_type": ACCOMMODATION,
+    "sanitation_quality": SANITATION, "chronic_diseases": CHRONIC_DISEASES, "preferred_language": LANGUAGES,
+    "home_state": STATES, "hearing_test_result": HEARING, "checkup_type": CHECKUP_TYPES,
+    "record_status": RECORD_STATUSES, "fitness_status": FITNESS,
+}.items()}
+
+
+def _skeleton(rng, years: int, today: date) -> dict:
+    """
+    The shape of one worker's history: registration date, checkup dates,
+    vaccine doses and visit/activity counts. Drawn from its own random stream
+    so the parent can size id ranges without generating the records.
+    """
+    registered = today - timedelta(days=rng.randint(0, years * 365))
+    checkup_dates, day = [], registered
+    while day <= today:
+        checkup_dates.append(day)
+        day += timedelta(days=rng.randint(120, 540))
+    doses = [(vaccine, rng.randint(1, most)) for vaccine, (share, most) in VACCINES.items() if rng.random() < share]
+    span_years = max((today - registered).days / 365, 0.1)
+    return dict(
+        registered=registered, checkup_dates=checkup_dates, doses=doses,
+        visits=min(int(rng.expovariate(1 / (1.5 * span_years))), 20),
+        activities=rng.randint(0, min(int(12 * span_years), 60)),
+    )
+
+
+def _counts(skeleton: dict) -> dict:
+    checkups = len(skeleton["checkup_dates"])
+    return dict(checkups=checkups, lab_results=checkups, evaluations=checkups,
+                vaccinations=sum(n for _, n in skeleton["doses"]), visits=skeleton["visits"],
+                activities=skeleton["activities"])
+
+
+def _chunk_skeletons(seed: int, chunk_index: int, size: int, years: int, today: date) -> list:
+    rng = random.Random(f"{seed}:shape:{chunk_index}")
+    return [_skeleton(rng, years, today) for _ in range(size)]
+
+
+def _build_chunk(spec: dict) -> dict:
+    """Every row for one chunk of workers. Ids come from the spec, so chunks never collide."""
+    today = spec["today"]
+    rng = random.Random(f"{spec['seed']}:rows:{spec['chunk_index']}")
+    skeletons = _chunk_skeletons(spec["seed"], spec["chunk_index"], spec["size"], spec["years"], today)
+    next_id = dict(spec["first_ids"])
+    rows = {name: [] for name in ("users", "workers", "checkups", "lab_results", "evaluations",
+                                  "vaccinations", "visits", "activities")}
+    facilities = spec["facility_ids"]
+
+    for offset, skeleton in enumerate(skeletons):
+        user_id, worker_id = spec["first_user_id"] + offset, spec["first_worker_id"] + offset
+        rows["users"].append(dict(id=user_id, username=f"syn{user_id}", email=f"syn{user_id}@synthetic.local",
+                                  password_hash=spec["password_hash"], role=UserRoleEnum.NORMAL_USER))
+        age = int(rng.triangular(18, 60, 28))
+        site, site_lat, site_lon = rng.choice(SITES)
+        smoker = _PICK["smoking_habit"](rng)
+        rows["workers"].append(dict(
+            id=worker_id, user_id=user_id, first_name=rng.choice(GIVEN_NAMES), last_name=rng.choice(SURNAMES),
+            age=age, gender=_PICK["gender"](rng), phone=f"7{worker_id:09d}",
+            preferred_language=_PICK["preferred_language"](rng), home_state=_PICK["home_state"](rng),
+            date_of_birth=date(today.year - age, 1, 1) + timedelta(days=rng.randint(0, 364)) if rng.random() < 0.6 else None,
+            nationality="Indian", migrant_id_number=f"SYN-{worker_id:010d}" if rng.random() < 0.7 else None,
+            employment_id=f"EMP-{rng.randint(1000, 99999)}", employer_name=rng.choice(EMPLOYERS), work_location=site,
+            marital_status=_PICK["marital_status"](rng), years_in_country=round(rng.uniform(0, 10), 1),
+            occupation=_PICK["occupation"](rng), work_hours_per_day=rng.choice([8, 8, 9, 10, 10, 12]),
+            ppe_usage=_PICK["ppe_usage"](rng), physical_strain=_PICK["physical_strain"](rng),
+            smoking_habit=smoker, alcohol_consumption=_PICK["alcohol_consumption"](rng),
+            diet_type=_PICK["diet_type"](rng), meals_per_day=rng.choice([2, 3, 3, 3]),
+            junk_food_frequency=_PICK["junk_food_frequency"](rng), sleep_hours_per_night=rng.randint(5, 8),
+            access_to_clean_water=rng.random() < 0.8, accommodation_type=_PICK["accommodation_type"](rng),
+            sanitation_quality=_PICK["sanitation_quality"](rng), chronic_diseases=_PICK["chronic_diseases"](rng),
+            stress_level=min(10, max(1, round(rng.gauss(5, 2)))), has_social_support=rng.random() < 0.6,
+        ))
+
+        height, weight = rng.gauss(164, 7), rng.gauss(60, 9)
+        systolic = rng.gauss(118 + (age - 18) * 0.4 + (6 if smoker == FrequencyEnum.DAILY else 0), 10)
+        facility_id = rng.choice(facilities)
+        for checkup_date in skeleton["checkup_dates"]:
+            checkup_id, lab_id, evaluation_id = next_id["checkups"], next_id["lab_results"], next_id["evaluations"]
+            next_id["checkups"] += 1
+            next_id["lab_results"] += 1
+            next_id["evaluations"] += 1
+            weight += rng.gauss(0, 1.5)
+            lat, lon = site_lat + rng.gauss(0, 0.03), site_lon + rng.gauss(0, 0.03)
+            rows["checkups"].append(dict(
+                id=checkup_id, worker_id=worker_id, date_of_checkup=checkup_date, height_cm=round(height, 1),
+                weight_kg=round(weight, 1), bmi=round(weight / (height / 100) ** 2, 1),
+                blood_pressure_systolic=round(systolic + rng.gauss(0, 6)),
+                blood_pressure_diastolic=round(systolic * 0.65 + rng.gauss(0, 5)),
+                pulse_rate=rng.randint(60, 100), temperature_celsius=round(rng.gauss(36.8, 0.3), 1),
+                vision_left=rng.choice(["6/6", "6/6", "6/9", "6/12"]), vision_right=rng.choice(["6/6", "6/6", "6/9"]),
+                hearing_test_result=_PICK["hearing_test_result"](rng), respiratory_rate=rng.randint(12, 20),
+                oxygen_saturation=rng.randint(94, 100), checkup_type=_PICK["checkup_type"](rng),
+                geo_location=f"{lat:.5f}, {lon:.5f}", latitude=lat, longitude=lon, geohash=geohash_encode(lat, lon),
+                facility_id=facility_id if rng.random() < 0.9 else None, record_status=_PICK["record_status"](rng),
+            ))
+            rows["lab_results"].append(dict(
+                id=lab_id, checkup_id=checkup_id, hemoglobin_g_dl=round(rng.gauss(13, 1.6), 1),
+                blood_sugar_fasting=round(rng.gauss(96, 14)), blood_sugar_postprandial=round(rng.gauss(128, 22)),
+                cholesterol_total=round(rng.gauss(185, 30)), triglycerides=round(rng.gauss(140, 40)),
+                hdl_cholesterol=round(rng.gauss(45, 9)), ldl_cholesterol=round(rng.gauss(110, 25)),
+                **{column: PositiveNegativeEnum.POSITIVE if rng.random() < rate else PositiveNegativeEnum.NEGATIVE
+                   for column, rate in POSITIVE_RATES.items()},
+                **{column: NormalAbnormalEnum.ABNORMAL if rng.random() < rate else NormalAbnormalEnum.NORMAL
+                   for column, rate in ABNORMAL_RATES.items()},
+            ))
+            follow_up = rng.random() < 0.12
+            rows["evaluations"].append(dict(
+                id=evaluation_id, checkup_id=checkup_id, doctor_name=f"Dr. {rng.choice(GIVEN_NAMES)} {rng.choice(SURNAMES)}",
+                doctor_registration_number=f"TCMC-{rng.randint(10000, 99999)}", diagnosis=rng.choice(DIAGNOSES),
+                recommendations="Review in 6 months", fitness_status=_PICK["fitness_status"](rng),
+                follow_up_required=follow_up,
+                follow_up_date=checkup_date + timedelta(days=rng.randint(7, 90)) if follow_up else None,
+            ))
+
+        for vaccine, doses in skeleton["doses"]:
+            day = skeleton["registered"] + timedelta(days=rng.randint(0, 60))
+            for dose in range(1, doses + 1):
+                rows["vaccinations"].append(dict(id=next_id["vaccinations"], worker_id=worker_id, vaccine_name=vaccine,
+                                                 dose_number=dose, date_administered=min(day, today)))
+                next_id["vaccinations"] += 1
+                day += timedelta(days=rng.randint(28, 200))
+        span = max((today - skeleton["registered"]).days, 1)
+        for _ in range(skeleton["visits"]):
+            rows["visits"].append(dict(
+                id=next_id["visits"], worker_id=worker_id, facility_id=rng.choice(facilities),
+                doctor_name=f"Dr. {rng.choice(SURNAMES)}", diagnosis=rng.choice(DIAGNOSES),
+                visit_date=skeleton["registered"] + timedelta(days=rng.randint(0, span)),
+            ))
+            next_id["visits"] += 1
+        for _ in range(skeleton["activities"]):
+            rows["activities"].append(dict(
+                id=next_id["activities"], worker_id=worker_id, activity_type=rng.choice(ACTIVITIES),
+                date=skeleton["registered"] + timedelta(days=rng.randint(0, span)), duration_minutes=rng.randint(10, 120),
+            ))
+            next_id["activities"] += 1
+    return rows
+
+
+_TABLE_FOR_ROWS = (("users", User), ("workers", Worker), ("checkups", MedicalCheckup), ("lab_results", LabResults),
+                   ("evaluations", DoctorEvaluation), ("vaccinations", Vaccination), ("visits", MedicalVisit),
+                   ("activities", ActivityLog))
+
+
+def _write(connection, rows: dict, batch_size: int = 5000):
+    for name, model in _TABLE_FOR_ROWS:
+        table_rows = rows[name]
+        for start in range(0, len(table_rows), batch_size):
+            connection.execute(insert(model), table_rows[start:start + batch_size])
+
+
+_engine = None
+
+
+def _generate_chunk(url: str, spec: dict) -> int:
+    """Runs in a pool process: builds one chunk and writes it in one transaction on its own engine."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(url)
+    rows = _build_chunk(spec)
+    with _engine.begin() as connection:
+        _write(connection, rows)
+    return spec["size"]
+
+
+def _next_id(model) -> int:
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def generate(n_workers: int, years: int = 5, seed: int = 42, chunk_size: int = DEFAULT_CHUNK_SIZE,
+             processes: int | None = None, password: str = DEFAULT_PASSWORD, progress=None) -> dict:
+    """
+    Adds `n_workers` synthetic workers (each with a user account) and up to
+    `years` of checkups with lab results and evaluations, vaccinations,
+    facility visits and activity logs, plus one facility per
+    WORKERS_PER_FACILITY workers. The same seed against the same starting
+    ids gives the same rows.
+
+    Chunks of `chunk_size` workers are generated and bulk inserted by
+    `processes` worker processes (default: one per CPU, or 1 on SQLite, which
+    allows a single writer). Rows go in through Core inserts, so write-time
+    hooks (geo fields excepted, they are filled in here) do not run; rebuild
+    the derived tables afterwards (see the README).
+    """
+    started = time.perf_counter()
+    url = db.engine.url
+    if processes is None:
+        processes = 1 if url.get_backend_name() == "sqlite" else (os.cpu_count() or 1)
+    today = date.today()
+    password_hash = generate_password_hash(password)
+
+    # Facilities first: every chunk spreads its checkups and visits over them
+    first_user_id, first_facility_id = _next_id(User), _next_id(HealthcareFacility)
+    n_facilities = max(1, n_workers // WORKERS_PER_FACILITY)
+    db.session.execute(insert(User), [
+        dict(id=first_user_id + i, username=f"syn{first_user_id + i}", email=f"syn{first_user_id + i}@synthetic.local",
+             password_hash=password_hash, role=UserRoleEnum.HEALTH_OFFICIAL)
+        for i in range(n_facilities)
+    ])
+    site_names = [name for name, _, _ in SITES]
+    db.session.execute(insert(HealthcareFacility), [
+        dict(id=first_facility_id + i, registered_by_user_id=first_user_id + i,
+             facility_name=f"{site_names[i % len(site_names)]} Migrant Health Centre {i + 1}",
+             facility_type="Primary Health Centre", facility_license_number=f"SYN-FAC-{first_facility_id + i}",
+             facility_city=site_names[i % len(site_names)])
+        for i in range(n_facilities)
+    ])
+    db.session.commit()
+
+    # Size every chunk's id ranges from the skeletons alone
+    first_ids = {name: _next_id(model) for name, model in _RECORD_TABLES}
+    next_user_id, next_worker_id = first_user_id + n_facilities, _next_id(Worker)
+    specs = []
+    for chunk_index, start in enumerate(range(0, n_workers, chunk_size)):
+        size = min(chunk_size, n_workers - start)
+        specs.append(dict(
+            seed=seed, chunk_index=chunk_index, size=size, years=years, today=today, password_hash=password_hash,
+            first_user_id=next_user_id + start, first_worker_id=next_worker_id + start, first_ids=dict(first_ids),
+            facility_ids=list(range(first_facility_id, first_facility_id + n_facilities)),
+        ))
+        for skeleton in _chunk_skeletons(seed, chunk_index, size, years, today):
+            for name, count in _counts(skeleton).items():
+                first_ids[name] += count
+
+    done = 0
+    if processes == 1:
+        for spec in specs:
+            with db.engine.begin() as connection:
+                _write(connection, _build_chunk(spec))
+            done += spec["size"]
+            if progress:
+                progress(done, n_workers)
+    else:
+        db.session.remove()
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for size in pool.map(_generate_chunk, [url.render_as_string(hide_password=False)] * len(specs), specs):
+                done += size
+                if progress:
+                    progress(done, n_workers)
+
+    totals = dict(workers=n_workers, facilities=n_facilities)
+    if specs:
+        totals.update({name: first_ids[name] - specs[0]["first_ids"][name] for name, _ in _RECORD_TABLES})
+    logging.info(f"Generated {totals} in {time.perf_counter() - started:.1f}s with {processes} process(es)")
+    return totals
@@ -0,0 +1,116 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+FRAGMENT_CACHE_SIZE = 20000
+# Template preprocessing (see i18n.TranslateKeyExtension) changes the compiled
+# code without changing the template source, so its module is part of the key.
+_PREPROCESSORS = ("i18n.py",)
+
+
+def bytecode_cache(directory: str | None = None) -> FileSystemBytecodeCache:
+    """
+    Compiled templates persisted across processes, so a fresh gunicorn worker
+    loads bytecode instead of recompiling every template on its first hits.
+    Defaults to a per-user directory under the system temp dir; set
+    JINJA_BYTECODE_CACHE_DIR to share one between deploys or containers.
+    """
+    directory = directory or os.getenv("JINJA_BYTECODE_CACHE_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha1()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in _PREPROCESSORS:
+        with open(os.path.join(base, name), "rb") as f:
+            digest.update(f.read())
+    return FileSystemBytecodeCache(directory, pattern=f"__curavie_{digest.hexdigest()[:10]}_%s.cache")
+
+
+_column_keys = {}
+
+
+def row_state(row) -> tuple | None:
+    """
+    Every column value of a row (None for a missing row), used as the version
+    of a cached fragment: any edit to the row gives a new key, in this process
+    or another, so cached HTML is never stale and needs no invalidation.
+    """
+    if row is None:
+        return None
+    keys = _column_keys.get(type(row))
+    if keys is None:
+        keys = _column_keys[type(row)] = tuple(column.key for column in row.__table__.columns)
+    loaded = row.__dict__
+    try:
+        return tuple([loaded[key] for key in keys])
+    except KeyError:
+        # Expired or deferred attributes: load them through the ORM
+        return tuple(getattr(row, key) for key in keys)
+
+
+class FragmentCache:
+    """Rendered template fragments by key, least recently used evicted first."""
+
+    def __init__(self, max_entries: int = FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: tuple, render):
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+                return html
+        html = render()
+        with self._lock:
+            self.misses += 1
+            self._fragments[key] = html
+            if len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return html
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def init_app(self, app):
+        app.jinja_env.bytecode_cache = bytecode_cache()
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.jinja_env.filters["row_state"] = row_state
+
+
+fragment_cache = FragmentCache()
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache "checkup-card", checkup.id, checkup|row_state %} ... {% endcache %}
+
+    Renders the body once per distinct key and reuses the HTML afterwards.
+    Put everything the body shows into the key (usually the row ids and their
+    row_state); request-dependent output such as CSRF tokens does not belong
+    inside a cached block.
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method("_render", [nodes.Tuple(parts, "load")]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        return fragment_cache.get_or_render(key, caller)
@@ -0,0 +1,230 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import select, func, event
+
+from database import db
+from models import Vaccination, Worker
+from sharding import shard_router
+
+# Default catalog. `doses` are the minimum days after the previous dose for
+# dose 2, 3, ...; `booster_days` repeats after the primary series; `required`
+# vaccines count as not started for workers with no dose on record.
+# Override with a JSON file of the same shape via VACCINATION_SCHEDULE_FILE.
+DEFAULT_SCHEDULE = {
+    "Tetanus": {"aliases": ["tt", "td", "tdap", "tetanus toxoid", "tetanus diphtheria"],
+                "doses": [28, 180], "booster_days": 3650, "required": True},
+    "Hepatitis B": {"aliases": ["hep b", "hepb", "hbv"], "doses": [30, 150], "booster_days": None, "required": False},
+    "Typhoid": {"aliases": ["tcv", "typhoid conjugate"], "doses": [], "booster_days": 1095, "required": False},
+    "Influenza": {"aliases": ["flu"], "doses": [], "booster_days": 365, "required": False},
+    "COVID-19": {"aliases": ["covid", "covishield", "covaxin"], "doses": [28], "booster_days": None, "required": False},
+}
+
+DUE_SOON_DAYS = 30
+CACHE_TTL_SECONDS = 600
+
+UP_TO_DATE = "up_to_date"
+DUE_SOON = "due_soon"
+OVERDUE = "overdue"
+NOT_STARTED = "not_started"
+COMPLETE = "complete"
+
+
+def load_catalog(path: str | None = None) -> dict:
+    path = path or os.getenv("VACCINATION_SCHEDULE_FILE")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return DEFAULT_SCHEDULE
+
+
+def _normalise(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", " ", (name or "").lower()).strip()
+
+
+class VaccinationScheduleEngine:
+    """
+    Due/overdue status of every worker against the schedule catalog.
+
+    A single grouped query per shard collapses `vaccinations` to one row per
+    worker and vaccine (doses received, last date); that compact state is
+    cached and statuses are derived from it on read, so the cache stays
+    valid across days. Writes through add_vaccination update the state for
+    that worker in place, and the whole state is rebuilt every
+    CACHE_TTL_SECONDS to pick up writes made by other processes.
+    """
+
+    def __init__(self, catalog: dict | None = None):
+        self.set_catalog(catalog or load_catalog())
+        self._lock = threading.Lock()
+        self._state = {}        # worker_id -> {vaccine: (doses, last_date)}
+        self._worker_ids = []   # every worker, for required vaccines
+        self._built_at = 0.0
+        self._version = 0
+        self._evaluated = None  # (today, version, summary, results)
+
+    def set_catalog(self, catalog: dict):
+        self.catalog = catalog
+        self._canonical = {}
+        self._lookup = {}
+        for vaccine, entry in catalog.items():
+            self._lookup[_normalise(vaccine)] = vaccine
+            for alias in entry.get("aliases", []):
+                self._lookup[_normalise(alias)] = vaccine
+
+    def canonical(self, vaccine_name: str) -> str | None:
+        """Catalog name for a free-text vaccine_name (None if it is not scheduled)."""
+        if vaccine_name in self._canonical:
+            return self._canonical[vaccine_name]
+        key = _normalise(vaccine_name)
+        vaccine = self._lookup.get(key)
+        if vaccine is None:
+            for alias, candidate in self._lookup.items():
+                if alias and re.search(rf"\b{re.escape(alias)}\b", key):
+                    vaccine = candidate
+                    break
+        self._canonical[vaccine_name] = vaccine
+        return vaccine
+
+    # State
+
+    @staticmethod
+    def _fetch():
+        rows = db.session.execute(
+            select(Vaccination.worker_id, Vaccination.vaccine_name,
+                   func.max(Vaccination.dose_number), func.max(Vaccination.date_administered), func.count())
+            .group_by(Vaccination.worker_id, Vaccination.vaccine_name)
+        ).all()
+        return rows, db.session.scalars(select(Worker.id)).all()
+
+    def rebuild(self):
+        started = time.perf_counter()
+        state, worker_ids = {}, []
+        for rows, shard_worker_ids in shard_router.fan_out(self._fetch).values():
+            for worker_id, name, max_dose, last_date, n in rows:
+                self._merge(state, worker_id, name, max(max_dose or 0, n), last_date)
+            worker_ids.extend(shard_worker_ids)
+        worker_ids.sort()
+        with self._lock:
+            self._state = state
+            self._worker_ids = worker_ids
+            self._built_at = time.time()
+            self._version += 1
+        logging.info(f"Vaccination schedule rebuilt for {len(worker_ids)} workers in {time.perf_counter() - started:.2f}s")
+
+    def _merge(self, state, worker_id, name, doses, last_date):
+        vaccine = self.canonical(name)
+        if vaccine is None:
+            return
+        per_worker = state.setdefault(worker_id, {})
+        prev_doses, prev_date = per_worker.get(vaccine, (0, None))
+        dates = [d for d in (prev_date, last_date) if d]
+        per_worker[vaccine] = (max(prev_doses, doses), max(dates) if dates else None)
+
+    def record(self, worker_id: int, vaccine_name: str, dose_number: int | None, date_administered: date):
+        """Incremental update for one newly written vaccination row."""
+        if not self._built_at:
+            return
+        with self._lock:
+            # Replace rather than mutate the worker's entry so readers iterating it are unaffected
+            updated = {worker_id: dict(self._state.get(worker_id, {}))}
+            doses = updated[worker_id].get(self.canonical(vaccine_name), (0, None))[0]
+            self._merge(updated, worker_id, vaccine_name, max(dose_number or 0, doses + 1), date_administered)
+            self._state[worker_id] = updated[worker_id]
+            self._version += 1
+            # Shards mint ids in their own blocks, so a new worker is not always the last
+            at = bisect.bisect_left(self._worker_ids, worker_id)
+            if self._worker_ids[at:at + 1] != [worker_id]:
+                self._worker_ids.insert(at, worker_id)
+
+    def invalidate(self):
+        """Forces a full rebuild on next use (after changes the incremental path cannot see)."""
+        self._built_at = 0.0
+
+    def ensure_fresh(self):
+        if time.time() - self._built_at > CACHE_TTL_SECONDS:
+            self.rebuild()
+
+    # Status
+
+    def status_for(self, vaccine: str, doses: int, last_date: date | None, today: date) -> dict:
+        entry = self.catalog[vaccine]
+        intervals = entry.get("doses", [])
+        if doses == 0 or last_date is None:
+            return dict(vaccine=vaccine, doses_received=0, next_dose=1, due_date=None, status=NOT_STARTED)
+
+        if doses <= len(intervals):
+            next_dose, due_date = doses + 1, last_date + timedelta(days=intervals[doses - 1])
+        elif entry.get("booster_days"):
+            next_dose, due_date = doses + 1, last_date + timedelta(days=entry["booster_days"])
+        else:
+            return dict(vaccine=vaccine, doses_received=doses, next_dose=None, due_date=None, status=COMPLETE)
+
+        if due_date < today:
+            status = OVERDUE
+        elif due_date <= today + timedelta(days=DUE_SOON_DAYS):
+            status = DUE_SOON
+        else:
+            status = UP_TO_DATE
+        return dict(vaccine=vaccine, doses_received=doses, next_dose=next_dose, due_date=due_date.isoformat(), status=status)
+
+    def worker_status(self, worker_id: int, today: date | None = None) -> list[dict]:
+        self.ensure_fresh()
+        today = today or date.today()
+        per_worker = self._state.get(worker_id, {})
+        statuses = []
+        for vaccine, entry in self.catalog.items():
+            if vaccine in per_worker:
+                statuses.append(self.status_for(vaccine, *per_worker[vaccine], today))
+            elif entry.get("required"):
+                statuses.append(self.status_for(vaccine, 0, None, today))
+        return statuses
+
+    def population_status(self, statuses=(OVERDUE, NOT_STARTED), vaccine: str | None = None, today: date | None = None):
+        """
+        Every (worker, vaccine) whose status is in `statuses`, ordered by
+        worker id, plus a summary count per vaccine and status. The full
+        evaluation is kept until the state changes or the day rolls over, so
+        repeated calls only filter it.
+        """
+        self.ensure_fresh()
+        today = today or date.today()
+        with self._lock:
+            cached = self._evaluated
+            if cached is None or cached[0] != today or cached[1] != self._version:
+                cached = self._evaluated = (today, self._version, *self._evaluate(today))
+        summary, results = cached[2], cached[3]
+        if vaccine:
+            summary = {vaccine: summary.get(vaccine, {})}
+        matches = [r for r in results if r["status"] in statuses and vaccine in (None, r["vaccine"])]
+        return summary, matches
+
+    def _evaluate(self, today):
+        required = [v for v, e in self.catalog.items() if e.get("required")]
+        summary, results = {}, []
+        for worker_id in self._worker_ids:
+            per_worker = self._state.get(worker_id, {})
+            for name, (doses, last_date) in per_worker.items():
+                results.append(dict(worker_id=worker_id, **self.status_for(name, doses, last_date, today)))
+            for name in required:
+                if name not in per_worker:
+                    results.append(dict(worker_id=worker_id, **self.status_for(name, 0, None, today)))
+        for result in results:
+            per_vaccine = summary.setdefault(result["vaccine"], {})
+            per_vaccine[result["status"]] = per_vaccine.get(result["status"], 0) + 1
+        return summary, results
+
+
+vaccination_schedule = VaccinationScheduleEngine()
+
+
+@event.listens_for(Vaccination, "after_insert")
+def _record_vaccination(mapper, connection, vaccination):
+    vaccination_schedule.record(vaccination.worker_id, vaccination.vaccine_name,
+                                vaccination.dose_number, vaccination.date_administered)
@@ -0,0 +1,129 @@
+import math
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, union_all
+
+from database import db
+from models import (
+    MedicalCheckup, LabResults,
+    ArchivedMedicalCheckup, ArchivedLabResults
+)
+
+# Series name -> (checkup/lab model attribute, which table it lives on)
+VITALS_SERIES = {
+    "bp_systolic": ("blood_pressure_systolic", "checkup"),
+    "bp_diastolic": ("blood_pressure_diastolic", "checkup"),
+    "bmi": ("bmi", "checkup"),
+    "blood_sugar_fasting": ("blood_sugar_fasting", "lab"),
+    "blood_sugar_postprandial": ("blood_sugar_postprandial", "lab"),
+    "hemoglobin": ("hemoglobin_g_dl", "lab"),
+}
+
+DEFAULT_MAX_POINTS = 100
+
+
+def _series_select(checkup_model, lab_model, worker_id, names, since, until):
+    columns = [checkup_model.date_of_checkup.label("day")]
+    for name in names:
+        attr, table = VITALS_SERIES[name]
+        model = checkup_model if table == "checkup" else lab_model
+        columns.append(getattr(model, attr).label(name))
+
+    query = (
+        select(*columns)
+        .select_from(checkup_model)
+        .outerjoin(lab_model, lab_model.checkup_id == checkup_model.id)
+        .where(checkup_model.worker_id == worker_id)
+    )
+    if since:
+        query = query.where(checkup_model.date_of_checkup >= since)
+    if until:
+        query = query.where(checkup_model.date_of_checkup <= until)
+    return query
+
+
+def load_vitals(worker_id: int, names: list[str], since: date | None = None, until: date | None = None):
+    """
+    One round trip for the whole history: hot and archived checkups are
+    unioned in SQL, joined to their lab results and sorted by date.
+    Returns (days as int ordinals, float matrix with NaN for missing values).
+    """
+    hot = _series_select(MedicalCheckup, LabResults, worker_id, names, since, until)
+    cold = _series_select(ArchivedMedicalCheckup, ArchivedLabResults, worker_id, names, since, until)
+    combined = union_all(hot, cold).subquery()
+    rows = db.session.execute(select(combined).order_by(combined.c.day)).all()
+
+    days = np.array([row[0].toordinal() for row in rows], dtype=np.int64)
+    values = np.array(
+        [[np.nan if v is None else float(v) for v in row[1:]] for row in rows],
+        dtype=np.float64
+    ).reshape(len(rows), len(names))
+    return days, values
+
+
+def downsample(days, values, max_points: int):
+    """
+    Buckets the points into at most `max_points` equal-width time buckets and
+    returns, per bucket: its start day, and the min, max and last non-missing
+    value of each column. Everything is done with reduceat over the sorted
+    arrays, so it is a single pass regardless of history length.
+    """
+    if len(days) == 0:
+        return 0, days, values, values, values
+
+    span = int(days[-1] - days[0]) + 1
+    bucket_days = max(1, math.ceil(span / max_points))
+    bucket_ids = (days - days[0]) // bucket_days
+    starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+
+    mins = np.fmin.reduceat(values, starts, axis=0)
+    maxs = np.fmax.reduceat(values, starts, axis=0)
+
+    # Index of the last non-missing value per bucket and column (-1 if none)
+    positions = np.where(np.isnan(values), -1, np.arange(len(days))[:, None])
+    last_pos = np.maximum.reduceat(positions, starts, axis=0)
+    lasts = np.where(last_pos >= 0, values[np.clip(last_pos, 0, None), np.arange(values.shape[1])], np.nan)
+
+    bucket_start = days[0] + bucket_ids[starts] * bucket_days
+    return bucket_days, bucket_start, mins, maxs, lasts
+
+
+def _num(v):
+    return None if np.isnan(v) else round(float(v), 2)
+
+
+def vitals_trend(worker_id: int, names: list[str] | None = None, max_points: int = DEFAULT_MAX_POINTS,
+                 since: date | None = None, until: date | None = None) -> dict:
+    """
+    Per-worker vitals time series for charts. Raw points are returned when
+    the history fits in `max_points`; otherwise the series are downsampled
+    server-side to min/max/last per time bucket.
+    """
+    names = names or list(VITALS_SERIES)
+    days, values = load_vitals(worker_id, names, since, until)
+
+    series = {name: [] for name in names}
+    if len(days) <= max_points:
+        bucket_days = None
+        for i, day in enumerate(days):
+            t = date.fromordinal(int(day)).isoformat()
+            for col, name in enumerate(names):
+                v = _num(values[i, col])
+                if v is not None:
+                    series[name].append({"t": t, "min": v, "max": v, "last": v})
+    else:
+        bucket_days, starts, mins, maxs, lasts = downsample(days, values, max_points)
+        for i, day in enumerate(starts):
+            t = date.fromordinal(int(day)).isoformat()
+            for col, name in enumerate(names):
+                last = _num(lasts[i, col])
+                if last is not None:
+                    series[name].append({"t": t, "min": _num(mins[i, col]), "max": _num(maxs[i, col]), "last": last})
+
+    return {
+        "worker_id": worker_id,
+        "checkups": int(len(days)),
+        "bucket_days": bucket_days,
+        "series": series,
+    }
@@ -0,0 +1,4 @@
+from app import create_app
+
+# The application gunicorn (Procfile) and the flask command load
+app = create_app()